@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+"""
+ADB Server 协议客户端 (纯 Python)
+
+直接与本机 adb server (默认 127.0.0.1:5037) 的 socket 通信，不再每条命令 fork/exec 一次 adb:
+  - host:devices                  设备列表
+  - host:transport:<serial>       切换到指定设备
+  - shell,v2,raw: / shell: / exec: 执行命令 (v2 协议可分离 stdout/stderr 并拿到退出码)
+  - sync:                         SEND / RECV / STAT / LIST 实现 push / pull
+协议参考 AOSP packages/modules/adb 下的 SERVICES.TXT 与 SYNC.TXT。
+"""
+import os
+import socket
+import stat as stat_mod
+import struct
+import threading
+import time
+
+from config import ADB_SERVER_HOST, ADB_SERVER_PORT
+
+SYNC_DATA_MAX = 64 * 1024
+
+# shell v2 包类型
+_SHELL_STDIN = 0
+_SHELL_STDOUT = 1
+_SHELL_STDERR = 2
+_SHELL_EXIT = 3
+_SHELL_CLOSE_STDIN = 4
+
+
+class AdbError(Exception):
+    """adb server 返回 FAIL 或连接异常"""
+
+
+class _Connection:
+    """对单条 adb server socket 连接的最小封装"""
+
+    def __init__(self, host, port, timeout):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        # SYNC 协议是大量小包的请求/应答，关闭 Nagle 避免延迟确认带来的 ~40ms 停顿
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send_request(self, payload):
+        data = payload.encode('utf-8')
+        self.sock.sendall(b"%04x" % len(data) + data)
+        self._read_status()
+
+    def _read_status(self):
+        status = self.recv_exact(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbError(self.read_length_prefixed().decode('utf-8', 'replace'))
+        raise AdbError(f"未知响应: {status!r}")
+
+    def recv_exact(self, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise AdbError("连接被 adb server 关闭")
+            buf.extend(chunk)
+        return bytes(buf)
+
+    def read_length_prefixed(self):
+        length = int(self.recv_exact(4), 16)
+        return self.recv_exact(length)
+
+    def read_all(self):
+        chunks = []
+        while True:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+
+class AdbClient:
+    def __init__(self, host=ADB_SERVER_HOST, port=ADB_SERVER_PORT, timeout=60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._features = {}
+        self._features_lock = threading.Lock()
+
+    def _connect(self, timeout=None):
+        return _Connection(self.host, self.port, timeout or self.timeout)
+
+    def _transport(self, serial, timeout=None):
+        conn = self._connect(timeout)
+        try:
+            conn.send_request(f"host:transport:{serial}")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    # ==================== host 服务 ====================
+    def devices(self):
+        """返回 [(serial, state), ...]，state 如 device / offline / unauthorized"""
+        with self._connect() as conn:
+            conn.send_request("host:devices")
+            text = conn.read_length_prefixed().decode('utf-8', 'replace')
+        result = []
+        for line in text.splitlines():
+            parts = line.split()
+            if len(parts) >= 2:
+                result.append((parts[0], parts[1]))
+        return result
+
+    def features(self, serial):
+        with self._features_lock:
+            if serial in self._features:
+                return self._features[serial]
+        with self._connect() as conn:
+            conn.send_request(f"host-serial:{serial}:features")
+            feats = set(conn.read_length_prefixed().decode('utf-8', 'replace').split(","))
+        with self._features_lock:
+            self._features[serial] = feats
+        return feats
+
+    # ==================== 设备服务 ====================
+    def shell(self, serial, cmd, timeout=None):
+        """执行 shell 命令，返回 (stdout, stderr, returncode)"""
+        if "shell_v2" not in self.features(serial):
+            return self._shell_v1(serial, cmd, timeout)
+
+        out, err, rc = bytearray(), bytearray(), -1
+        with self._transport(serial, timeout) as conn:
+            conn.send_request(f"shell,v2,raw:{cmd}")
+            # 不向远端提供 stdin，避免读取 stdin 的命令挂起
+            conn.sock.sendall(struct.pack("<BI", _SHELL_CLOSE_STDIN, 0))
+            while True:
+                try:
+                    header = conn.recv_exact(5)
+                except AdbError:
+                    break
+                pkt_id, length = struct.unpack("<BI", header)
+                data = conn.recv_exact(length) if length else b""
+                if pkt_id == _SHELL_STDOUT:
+                    out.extend(data)
+                elif pkt_id == _SHELL_STDERR:
+                    err.extend(data)
+                elif pkt_id == _SHELL_EXIT:
+                    rc = data[0] if data else 0
+                    break
+        return out.decode('utf-8', 'replace'), err.decode('utf-8', 'replace'), rc
+
+    def _shell_v1(self, serial, cmd, timeout=None):
+        """旧设备不支持 shell v2: stdout/stderr 合并，退出码通过尾部标记取回"""
+        marker = "__ADB_RC__:"
+        with self._transport(serial, timeout) as conn:
+            # 用换行而不是 "; " 拼接: ShellScript.compile() 的输出以换行结尾，"\n; echo" 是语法错误
+            conn.send_request(f"shell:{cmd}\necho {marker}$?")
+            text = conn.read_all().decode('utf-8', 'replace')
+        rc = -1
+        idx = text.rfind(marker)
+        if idx >= 0:
+            tail = text[idx + len(marker):].strip()
+            rc = int(tail) if tail.isdigit() else -1
+            text = text[:idx]
+        return text, "", rc
+
+    def exec_out(self, serial, cmd, timeout=None):
+        """exec: 服务，返回原始字节 (无 PTY、无换行转换)"""
+        with self._transport(serial, timeout) as conn:
+            conn.send_request(f"exec:{cmd}")
+            return conn.read_all()
+
+    def exec_in(self, serial, cmd, data, timeout=None):
+        """exec: 服务，把 data (bytes 或文件对象) 写入远端命令的 stdin，返回其输出"""
+        with self._transport(serial, timeout) as conn:
+            conn.send_request(f"exec:{cmd}")
+            if isinstance(data, (bytes, bytearray)):
+                conn.sock.sendall(data)
+            else:
+                while True:
+                    chunk = data.read(SYNC_DATA_MAX)
+                    if not chunk:
+                        break
+                    conn.sock.sendall(chunk)
+            conn.sock.shutdown(socket.SHUT_WR)
+            return conn.read_all()
+
+    def root(self, serial, timeout=None):
+        with self._transport(serial, timeout) as conn:
+            conn.send_request("root:")
+            out = conn.read_all().decode('utf-8', 'replace')
+        # adbd 重启后特性集可能变化
+        with self._features_lock:
+            self._features.pop(serial, None)
+        return out
+
+    # ==================== SYNC 协议 ====================
+    def _sync(self, serial, timeout=None):
+        conn = self._transport(serial, timeout)
+        try:
+            conn.send_request("sync:")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    @staticmethod
+    def _sync_request(conn, cmd_id, path):
+        data = path.encode('utf-8')
+        conn.sock.sendall(cmd_id + struct.pack("<I", len(data)) + data)
+
+    def _stat(self, conn, path):
+        self._sync_request(conn, b"STAT", path)
+        resp = conn.recv_exact(16)
+        if resp[:4] != b"STAT":
+            raise AdbError(f"STAT 响应异常: {resp[:4]!r}")
+        mode, size, mtime = struct.unpack("<III", resp[4:])
+        return mode, size, mtime
+
+    def _list(self, conn, path):
+        self._sync_request(conn, b"LIST", path)
+        entries = []
+        while True:
+            header = conn.recv_exact(20)
+            if header[:4] == b"DONE":
+                return entries
+            if header[:4] != b"DENT":
+                raise AdbError(f"LIST 响应异常: {header[:4]!r}")
+            mode, size, mtime, namelen = struct.unpack("<IIII", header[4:])
+            name = conn.recv_exact(namelen).decode('utf-8', 'replace')
+            if name not in (".", ".."):
+                entries.append((name, mode, size, mtime))
+
+    def _send_file(self, conn, local_path, remote_path):
+        st = os.stat(local_path)
+        mode = stat_mod.S_IMODE(st.st_mode) | stat_mod.S_IFREG
+        self._sync_request(conn, b"SEND", f"{remote_path},{mode}")
+        size = 0
+        with open(local_path, "rb") as f:
+            while True:
+                chunk = f.read(SYNC_DATA_MAX)
+                if not chunk:
+                    break
+                conn.sock.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                size += len(chunk)
+        conn.sock.sendall(b"DONE" + struct.pack("<I", int(st.st_mtime)))
+        resp = conn.recv_exact(8)
+        if resp[:4] == b"FAIL":
+            length = struct.unpack("<I", resp[4:])[0]
+            raise AdbError(conn.recv_exact(length).decode('utf-8', 'replace'))
+        if resp[:4] != b"OKAY":
+            raise AdbError(f"SEND 响应异常: {resp[:4]!r}")
+        return size
+
+    def _recv_file(self, conn, remote_path, local_path):
+        self._sync_request(conn, b"RECV", remote_path)
+        size = 0
+        with open(local_path, "wb") as f:
+            while True:
+                header = conn.recv_exact(8)
+                cmd_id, length = header[:4], struct.unpack("<I", header[4:])[0]
+                if cmd_id == b"DATA":
+                    f.write(conn.recv_exact(length))
+                    size += length
+                elif cmd_id == b"DONE":
+                    return size
+                elif cmd_id == b"FAIL":
+                    raise AdbError(conn.recv_exact(length).decode('utf-8', 'replace'))
+                else:
+                    raise AdbError(f"RECV 响应异常: {cmd_id!r}")
+
+    def push(self, serial, local_path, remote_path, timeout=None):
+        """语义同 `adb push`: 远端为已存在目录时推送到 目录/文件名；本地为目录时递归推送"""
+        pushed, total = 0, 0
+        with self._sync(serial, timeout) as conn:
+            mode, _, _ = self._stat(conn, remote_path)
+            if stat_mod.S_ISDIR(mode):
+                remote_path = f"{remote_path.rstrip('/')}/{os.path.basename(local_path.rstrip(os.sep))}"
+            if os.path.isdir(local_path):
+                for root, _, files in os.walk(local_path):
+                    rel = os.path.relpath(root, local_path)
+                    for name in files:
+                        sub = name if rel == "." else f"{rel.replace(os.sep, '/')}/{name}"
+                        total += self._send_file(conn, os.path.join(root, name), f"{remote_path}/{sub}")
+                        pushed += 1
+            else:
+                total += self._send_file(conn, local_path, remote_path)
+                pushed += 1
+            self._sync_request(conn, b"QUIT", "")
+        return pushed, total
+
+    def pull(self, serial, remote_path, local_path, timeout=None):
+        """语义同 `adb pull`: 本地为已存在目录时拉取到 目录/远端名；远端为目录时递归拉取"""
+        pulled, total = 0, 0
+        with self._sync(serial, timeout) as conn:
+            mode, _, _ = self._stat(conn, remote_path)
+            if mode == 0:
+                raise AdbError(f"remote object '{remote_path}' does not exist")
+            if os.path.isdir(local_path):
+                local_path = os.path.join(local_path, os.path.basename(remote_path.rstrip('/')))
+
+            if stat_mod.S_ISDIR(mode):
+                stack = [(remote_path.rstrip('/'), local_path)]
+                while stack:
+                    rdir, ldir = stack.pop()
+                    os.makedirs(ldir, exist_ok=True)
+                    for name, emode, _, _ in self._list(conn, rdir):
+                        if stat_mod.S_ISDIR(emode):
+                            stack.append((f"{rdir}/{name}", os.path.join(ldir, name)))
+                        elif stat_mod.S_ISREG(emode):
+                            total += self._recv_file(conn, f"{rdir}/{name}", os.path.join(ldir, name))
+                            pulled += 1
+            else:
+                total += self._recv_file(conn, remote_path, local_path)
+                pulled += 1
+            self._sync_request(conn, b"QUIT", "")
+        return pulled, total
+
+
+_DEFAULT_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def default_client():
+    global _DEFAULT_CLIENT
+    with _CLIENT_LOCK:
+        if _DEFAULT_CLIENT is None:
+            _DEFAULT_CLIENT = AdbClient()
+        return _DEFAULT_CLIENT
+
+
+def run_command(serial, command_list, timeout=60, data=None):
+    """
+    将 run_adb 风格的参数映射到 socket 协议，返回 (stdout, stderr, returncode)。
+    不支持的命令 (如 emu、带选项的 push/pull) 返回 None，由调用方回退到 adb 二进制。
+    data: exec-in 的输入 (bytes 或文件对象)。
+    """
+    client = default_client()
+    if not command_list:
+        return None
+    verb, args = command_list[0], command_list[1:]
+
+    if verb == "exec-in" and args:
+        out = client.exec_in(serial, " ".join(args), data if data is not None else b"", timeout=timeout)
+        return out.decode('utf-8', 'replace'), "", 0
+
+    if verb == "shell" and args:
+        return client.shell(serial, " ".join(args), timeout=timeout)
+    if verb == "exec-out" and args:
+        return client.exec_out(serial, " ".join(args), timeout=timeout).decode('utf-8', 'replace'), "", 0
+    if verb == "root" and not args:
+        out = client.root(serial, timeout=timeout)
+        # 与 adb 二进制一致: 等待 adbd 重启后设备重新上线
+        _wait_for_device(client, serial, timeout)
+        return out, "", 0
+    if verb in ("push", "pull") and len(args) == 2 and not any(a.startswith("-") for a in args):
+        start = time.time()
+        try:
+            if verb == "push":
+                count, size = client.push(serial, args[0], args[1], timeout=timeout)
+            else:
+                count, size = client.pull(serial, args[0], args[1], timeout=timeout)
+        except AdbError as e:
+            return "", f"adb: error: {e}", 1
+        cost = max(time.time() - start, 1e-6)
+        word = "pushed" if verb == "push" else "pulled"
+        return f"{args[0]}: {count} file{'s' if count != 1 else ''} {word}. {size / cost / 1024 / 1024:.1f} MB/s ({size} bytes in {cost:.3f}s)", "", 0
+    return None
+
+
+def _wait_for_device(client, serial, timeout):
+    deadline = time.time() + (timeout or 60)
+    time.sleep(0.5)
+    while time.time() < deadline:
+        try:
+            if (serial, "device") in client.devices():
+                return
+        except (OSError, AdbError):
+            pass
+        time.sleep(0.5)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+adb 调用的超时 / 重试策略
+
+- 超时按命令类别 (见 tracing.command_class) 自适应: 积累足够样本后取
+  p99 × ADB_TIMEOUT_MULTIPLIER，并夹在 [ADB_TIMEOUT_MIN, 类别上限] 之间；
+  push / exec-in 额外按送入的字节数放宽，pull 大小未知只用上限。
+- device offline / not found 等传输层错误 (命令尚未到达设备) 做有限次重试，
+  退避时间带随机抖动，避免多台设备同时重试。
+- 超时只对只读 / 幂等的命令类别重试，其余命令超时后不重放，以免重复执行。
+"""
+import collections
+import os
+import random
+import re
+import threading
+
+from config import (ADB_TIMEOUT_DEFAULT, ADB_TIMEOUT_MIN, ADB_TIMEOUT_MULTIPLIER, ADB_TIMEOUT_CLASS_MAX,
+                    ADB_RETRIES, ADB_RETRY_BACKOFF, ADB_MIN_TRANSFER_BPS)
+
+# 自适应所需的最少样本数与滑动窗口大小
+MIN_SAMPLES = 20
+WINDOW = 200
+
+# 传输层的瞬时错误: 出现时命令还没有在设备上执行，可以安全重试
+TRANSIENT_ERROR_RE = re.compile(
+    r"device offline|device '[^']*' not found|device not found|no devices/emulators found|"
+    r"cannot connect to daemon|daemon not running|error: closed|protocol fault|"
+    r"Connection refused|Connection reset",
+    re.IGNORECASE,
+)
+
+# 超时后可以重放的命令类别 (只读或幂等)；push 超时时目标文件可能只写了一半，不重放
+RETRY_ON_TIMEOUT = {
+    "devices", "pull", "shell ls", "shell pidof", "shell dumpsys", "shell wm",
+    "shell getprop", "shell cat",
+}
+
+_lock = threading.Lock()
+_samples = collections.defaultdict(lambda: collections.deque(maxlen=WINDOW))
+
+
+def observe(cls, duration):
+    """记录一次正常完成的命令耗时"""
+    with _lock:
+        _samples[cls].append(duration)
+
+
+def percentile(cls, q):
+    with _lock:
+        data = sorted(_samples.get(cls, ()))
+    if not data:
+        return None
+    idx = min(len(data) - 1, max(0, int(round(q * (len(data) - 1)))))
+    return data[idx]
+
+
+def _class_max(cls):
+    verb = cls.split(" ", 1)[0]
+    return ADB_TIMEOUT_CLASS_MAX.get(cls, ADB_TIMEOUT_CLASS_MAX.get(verb, ADB_TIMEOUT_DEFAULT))
+
+
+def timeout_for(cls, command_list=None, nbytes=None):
+    """给某类命令分配超时 (秒)；nbytes 为 exec-in 需要送入的字节数"""
+    cap = _class_max(cls)
+    if cls == "pull":
+        return cap
+    with _lock:
+        n = len(_samples.get(cls, ()))
+    limit = min(cap, ADB_TIMEOUT_DEFAULT)
+    if n >= MIN_SAMPLES:
+        limit = min(cap, max(ADB_TIMEOUT_MIN, percentile(cls, 0.99) * ADB_TIMEOUT_MULTIPLIER))
+    if cls == "push" and command_list and len(command_list) >= 3 and os.path.isfile(command_list[-2]):
+        # 大文件按最低带宽估算所需时间
+        limit = min(cap, max(limit, ADB_TIMEOUT_MIN + os.path.getsize(command_list[-2]) / ADB_MIN_TRANSFER_BPS))
+    if nbytes:
+        limit = min(cap, max(limit, ADB_TIMEOUT_MIN + nbytes / ADB_MIN_TRANSFER_BPS))
+    return limit
+
+
+def is_transient(text):
+    return bool(text) and TRANSIENT_ERROR_RE.search(text) is not None
+
+
+def retry_on_timeout(cls):
+    return cls in RETRY_ON_TIMEOUT
+
+
+def max_attempts(retries=None):
+    return 1 + (ADB_RETRIES if retries is None else retries)
+
+
+def backoff(attempt):
+    """第 attempt 次重试前的等待时间: 指数退避 + 全抖动"""
+    return random.uniform(0, ADB_RETRY_BACKOFF * (2 ** attempt))
+
+
+def snapshot():
+    """{类别: (样本数, p50, p99, 当前超时)}，用于排查"""
+    with _lock:
+        classes = list(_samples.keys())
+    return {c: (len(_samples[c]), percentile(c, 0.5), percentile(c, 0.99), timeout_for(c)) for c in classes}
+
+
+def reset():
+    with _lock:
+        _samples.clear()
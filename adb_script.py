@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+批量设备脚本编译器
+
+把一串彼此独立的小 shell 命令编译成一个脚本，在一次 adb 往返内执行，
+并通过哨兵标记拆分出每一步的 stdout / stderr / 退出码，失败仍能逐步报告。
+
+    script = ShellScript()
+    script.add(f"pm grant {pkg} android.permission.READ_CALENDAR", name="grant READ_CALENDAR")
+    script.add(f"chown {uid}:{uid} {db_path}")
+    results = script.run(device_id, logger)
+"""
+import os
+import tempfile
+import uuid
+
+import tracing
+from utils import run_adb, run_adb_async
+
+# 超过该长度的脚本先 push 成文件再执行，避免命令行长度限制
+SCRIPT_INLINE_LIMIT = 32 * 1024
+REMOTE_SCRIPT_DIR = "/data/local/tmp"
+
+
+class StepResult:
+    def __init__(self, name, cmd, returncode=None, stdout="", stderr=""):
+        self.name = name
+        self.cmd = cmd
+        self.returncode = returncode  # None 表示未执行 (stop_on_error 跳过或脚本中断)
+        self.stdout = stdout
+        self.stderr = stderr
+
+    @property
+    def skipped(self):
+        return self.returncode is None
+
+    @property
+    def ok(self):
+        return self.returncode == 0
+
+    def __repr__(self):
+        return f"StepResult({self.name!r}, rc={self.returncode})"
+
+
+class ShellScript:
+    def __init__(self, stop_on_error=False):
+        self.stop_on_error = stop_on_error
+        self.steps = []
+
+    def add(self, cmd, name=None):
+        self.steps.append((name or cmd, cmd))
+        return self
+
+    def __len__(self):
+        return len(self.steps)
+
+    def compile(self, token):
+        """生成脚本文本。每步在子 shell 中执行，stdin 置空，前后输出哨兵"""
+        lines = ["__failed=0"]
+        for i, (_, cmd) in enumerate(self.steps):
+            body = (
+                f"printf '\\n{token}:B:{i}\\n'; printf '\\n{token}:B:{i}\\n' >&2; "
+                f"( {cmd}\n) </dev/null; __rc=$?; "
+                f"printf '\\n{token}:E:{i}:%d\\n' $__rc; printf '\\n{token}:E:{i}\\n' >&2; "
+                f"[ $__rc -eq 0 ] || __failed=1"
+            )
+            if self.stop_on_error:
+                body = f"if [ $__failed -eq 0 ]; then {body}; fi"
+            lines.append(body)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _split(text, token):
+        """按哨兵切分输出: 返回 {step_index: (内容, 退出码或 None)}"""
+        sections = {}
+        current, buf = None, []
+        for line in (text or "").splitlines():
+            if line.startswith(f"{token}:B:"):
+                current, buf = int(line.split(":")[2]), []
+            elif line.startswith(f"{token}:E:") and current is not None:
+                parts = line.split(":")
+                rc = int(parts[3]) if len(parts) > 3 and parts[3].lstrip("-").isdigit() else None
+                # 去掉哨兵前补的空行
+                if buf and buf[-1] == "": buf.pop()
+                sections[current] = ("\n".join(buf).strip(), rc)
+                current = None
+            elif current is not None:
+                buf.append(line)
+        return sections
+
+    def _new_token(self):
+        return f"__STEP_{uuid.uuid4().hex[:10]}__"
+
+    def _write_local(self, script):
+        fd, local = tempfile.mkstemp(suffix=".sh")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(script)
+        return local
+
+    def _collect(self, out, err, token, logger):
+        out_sections = self._split(out, token)
+        err_sections = self._split(err, token)
+
+        results = []
+        for i, (name, cmd) in enumerate(self.steps):
+            stdout, rc = out_sections.get(i, ("", None))
+            stderr, _ = err_sections.get(i, ("", None))
+            result = StepResult(name, cmd, rc, stdout, stderr)
+            if logger and result.returncode not in (0, None):
+                logger.warning(f"  [Step FAIL] {name} (Ret: {rc}): {stderr or stdout}")
+            results.append(result)
+        return results
+
+    def _trace_done(self, sp, results):
+        sp.set(steps=len(results), failed=sum(1 for r in results if r.returncode not in (0, None)))
+        return results
+
+    def run(self, device_id, logger=None, timeout=120):
+        """一次往返执行全部步骤，返回与 add 顺序一致的 StepResult 列表"""
+        if not self.steps:
+            return []
+        with tracing.span(device_id, "ShellScript.run", cat="script") as sp:
+            return self._trace_done(sp, self._run(device_id, logger, timeout))
+
+    def _run(self, device_id, logger, timeout):
+        token = self._new_token()
+        script = self.compile(token)
+
+        if len(script) <= SCRIPT_INLINE_LIMIT:
+            out, err = run_adb(device_id, ["shell", script], timeout=timeout, logger=logger)
+        else:
+            remote = f"{REMOTE_SCRIPT_DIR}/{token}.sh"
+            local = self._write_local(script)
+            try:
+                run_adb(device_id, ["push", local, remote], timeout=timeout, logger=logger)
+            finally:
+                os.remove(local)
+            out, err = run_adb(device_id, ["shell", f"sh {remote}; rm -f {remote}"], timeout=timeout, logger=logger)
+
+        return self._collect(out, err, token, logger)
+
+    async def run_async(self, device_id, logger=None, timeout=120):
+        """run 的 asyncio 版本"""
+        if not self.steps:
+            return []
+        with tracing.span(device_id, "ShellScript.run", cat="script") as sp:
+            return self._trace_done(sp, await self._run_async(device_id, logger, timeout))
+
+    async def _run_async(self, device_id, logger, timeout):
+        token = self._new_token()
+        script = self.compile(token)
+
+        if len(script) <= SCRIPT_INLINE_LIMIT:
+            out, err = await run_adb_async(device_id, ["shell", script], timeout=timeout, logger=logger)
+        else:
+            remote = f"{REMOTE_SCRIPT_DIR}/{token}.sh"
+            local = self._write_local(script)
+            try:
+                await run_adb_async(device_id, ["push", local, remote], timeout=timeout, logger=logger)
+            finally:
+                os.remove(local)
+            out, err = await run_adb_async(device_id, ["shell", f"sh {remote}; rm -f {remote}"], timeout=timeout, logger=logger)
+
+        return self._collect(out, err, token, logger)
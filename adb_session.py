@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+常驻 ADB Shell 会话池
+
+每台设备维护一个长连接的 `adb -s <id> shell` 进程，命令通过 stdin 发送，
+再利用哨兵标记 (sentinel) 切分每条命令的 stdout / stderr 与退出码，
+从而省掉每条命令一次 fork/exec adb 的开销。
+"""
+import atexit
+import queue
+import subprocess
+import threading
+import time
+import uuid
+
+from config import ADB_PATH
+
+
+class ShellSessionError(Exception):
+    """
+    会话已断开 / 无法使用。
+    sent=False 表示命令尚未发出，调用方可以安全地回退到一次性 subprocess 模式重试。
+    """
+    def __init__(self, msg, sent=False):
+        super().__init__(msg)
+        self.sent = sent
+
+
+def _quote(cmd):
+    """单引号转义，保证整条命令作为一个 eval 参数送入远端 shell"""
+    return "'" + cmd.replace("'", "'\\''") + "'"
+
+
+class AdbShellSession:
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self._token = f"__ADB_SESSION_{uuid.uuid4().hex[:12]}__"
+        self._lock = threading.Lock()
+        self._proc = subprocess.Popen(
+            [ADB_PATH, "-s", device_id, "shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1,
+        )
+        # stdout / stderr 各用一个读线程，避免任一管道写满造成死锁
+        self._out_q = queue.Queue()
+        self._err_q = queue.Queue()
+        for stream, q in ((self._proc.stdout, self._out_q), (self._proc.stderr, self._err_q)):
+            t = threading.Thread(target=self._pump, args=(stream, q), daemon=True)
+            t.start()
+
+    @staticmethod
+    def _pump(stream, q):
+        try:
+            for line in stream:
+                q.put(line)
+        except (ValueError, OSError):
+            pass
+        finally:
+            q.put(None)  # EOF
+
+    @property
+    def alive(self):
+        return self._proc.poll() is None
+
+    def _collect(self, q, marker, deadline_timer, timeout):
+        """从队列读取直到出现哨兵行，返回 (内容, 哨兵后缀)"""
+        lines = []
+        while True:
+            try:
+                line = q.get(timeout=deadline_timer())
+            except queue.Empty:
+                raise subprocess.TimeoutExpired(f"adb -s {self.device_id} shell (session)", timeout)
+            if line is None:
+                raise ShellSessionError("adb shell 会话意外断开 (EOF)", sent=True)
+            if line.startswith(marker):
+                return "".join(lines), line[len(marker):].strip()
+            lines.append(line)
+
+    def run(self, cmd, timeout=60):
+        """
+        在会话中执行一条命令，返回 (stdout, stderr, returncode)。
+        命令在子 shell 中 eval，cd/exit 等不会污染会话状态，语法错误也不会破坏分帧。
+        """
+        with self._lock:
+            if not self.alive:
+                raise ShellSessionError("adb shell 会话已退出")
+
+            marker = f"{self._token}:"
+            # printf 以换行开头，防止命令输出末尾没有换行时哨兵粘在最后一行
+            line = (
+                f"( eval {_quote(cmd)} ) </dev/null; "
+                f"printf '\\n{marker}%d\\n' $?; printf '\\n{marker}\\n' >&2\n"
+            )
+            try:
+                self._proc.stdin.write(line)
+                self._proc.stdin.flush()
+            except (BrokenPipeError, OSError, ValueError) as e:
+                raise ShellSessionError(f"写入会话失败: {e}")
+
+            deadline = time.time() + timeout
+            remaining = lambda: max(0.0, deadline - time.time())
+            try:
+                stdout, rc = self._collect(self._out_q, marker, remaining, timeout)
+                stderr, _ = self._collect(self._err_q, marker, remaining, timeout)
+            except subprocess.TimeoutExpired:
+                # 卡住的命令无法单独取消，只能整体关闭会话
+                self.close()
+                raise
+
+            # 去掉哨兵前补的换行
+            if stdout.endswith("\n"): stdout = stdout[:-1]
+            if stderr.endswith("\n"): stderr = stderr[:-1]
+            return stdout, stderr, int(rc) if rc.lstrip("-").isdigit() else -1
+
+    def close(self):
+        if self._proc.poll() is None:
+            try:
+                self._proc.stdin.write("exit\n")
+                self._proc.stdin.flush()
+                self._proc.wait(timeout=2)
+            except Exception:
+                self._proc.kill()
+        for stream in (self._proc.stdin, self._proc.stdout, self._proc.stderr):
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+# ==================== 会话池 ====================
+_SESSIONS = {}
+_POOL_LOCK = threading.Lock()
+
+
+def get_shell_session(device_id):
+    """获取 (必要时新建) 设备的常驻 shell 会话"""
+    with _POOL_LOCK:
+        session = _SESSIONS.get(device_id)
+        if session is None or not session.alive:
+            session = AdbShellSession(device_id)
+            _SESSIONS[device_id] = session
+        return session
+
+
+def close_shell_session(device_id):
+    """关闭指定设备的会话 (例如 adb root 导致 adbd 重启后)"""
+    with _POOL_LOCK:
+        session = _SESSIONS.pop(device_id, None)
+    if session:
+        session.close()
+
+
+def close_all_sessions():
+    with _POOL_LOCK:
+        sessions = list(_SESSIONS.values())
+        _SESSIONS.clear()
+    for session in sessions:
+        session.close()
+
+
+atexit.register(close_all_sessions)
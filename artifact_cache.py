@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+注入数据库的本地产物缓存 (内容寻址)
+
+Calendar / Tasks / Expense 的注入都是: pull 应用建好的空库 -> 本地写入 JSON 数据 -> push 回去。
+同一应用版本、同一表结构、同一份 JSON 得到的库完全一样，因此把成品库按
+    (包名, versionCode, 表结构指纹, 数据文件 sha256, 生成逻辑版本)
+的摘要缓存在 ARTIFACT_CACHE_DIR 下；命中时跳过 pull 与本地 SQL，直接 push 缓存文件。
+
+表结构指纹 = sqlite_master 按 (type, name) 排序后的 md5，设备端 (sqlite3 + md5sum) 与本地算法一致，
+设备上只需在 force-stop 的同一次往返里多查一次。
+缓存总大小超过 ARTIFACT_CACHE_MAX_BYTES 时按最近使用时间 (文件 mtime) 淘汰。
+
+多台设备同时运行时，同一产物只构建一次: 第一台未命中的设备登记为构建者，
+其余设备在 lookup 中等待其 store (最多 ARTIFACT_BUILD_WAIT 秒) 后直接推送 (fan-out)；
+构建失败时等待者各自构建。plan_fleet / fleet_table 给出按版本的分组与每组构建 / 分发耗时。
+成品库中的 created / last_updated 等 "$now" 列写为固定时刻，由调用方在推送前换成当前时间 (见 inject_app_db.rebase_now)。
+"""
+import asyncio
+import contextlib
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from config import ARTIFACT_CACHE, ARTIFACT_CACHE_DIR, ARTIFACT_CACHE_MAX_BYTES, ARTIFACT_BUILD_WAIT
+from device_facts import get_device_facts
+
+_SCHEMA_SQL = "SELECT type || ' ' || name || ' ' || coalesce(sql, '') FROM sqlite_master ORDER BY type, name;"
+# md5sum 对空输入的结果 (库不存在或读不到表结构)
+_EMPTY_MD5 = hashlib.md5(b"").hexdigest()
+
+_lock = threading.Lock()
+_stats = {}   # 包名 -> {"hits", "misses", "stores", "evictions"}
+# (路径, mtime, 大小) -> sha256
+_digests = {}
+# 产物键 -> 正在构建的设备 {"device", "event", "start"}
+_inflight = {}
+# 产物键 -> 构建 / 分发记录，见 fleet_table()
+_groups = {}
+
+
+def enabled():
+    return ARTIFACT_CACHE
+
+
+def _count(pkg, field, n=1):
+    with _lock:
+        s = _stats.setdefault(pkg, {"hits": 0, "misses": 0, "stores": 0, "evictions": 0})
+        s[field] += n
+
+# ==================== 指纹 ====================
+
+def schema_command(db_path):
+    """设备端表结构指纹 (输出 "<md5>  -")；库文件不存在时输出空串的 md5"""
+    return f"[ -f {db_path} ] && sqlite3 {db_path} \"{_SCHEMA_SQL}\" | md5sum || echo {_EMPTY_MD5}"
+
+
+def parse_schema(out):
+    fp = (out or "").strip().split(" ", 1)[0]
+    return fp if len(fp) == 32 and fp != _EMPTY_MD5 else None
+
+
+def local_schema(db_file):
+    """与 schema_command 相同算法的本地指纹"""
+    conn = sqlite3.connect(db_file)
+    try:
+        rows = [r[0] for r in conn.execute(_SCHEMA_SQL)]
+    finally:
+        conn.close()
+    fp = hashlib.md5("".join(f"{r}\n" for r in rows).encode("utf-8")).hexdigest()
+    return fp if rows else None
+
+
+def file_digest(path):
+    st = os.stat(path)
+    key = (path, st.st_mtime, st.st_size)
+    if key not in _digests:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        _digests[key] = h.hexdigest()
+    return _digests[key]
+
+
+def cache_key(pkg, version, schema_fp, data_file, recipe):
+    """任一组成部分缺失时返回 None (不缓存)；data_file 为 None 表示产物与数据文件无关"""
+    if not enabled() or not version or not schema_fp:
+        return None
+    digest = ""
+    if data_file:
+        path = os.path.join("data", data_file)
+        if not os.path.exists(path):
+            return None
+        digest = file_digest(path)
+    parts = [pkg, str(version), schema_fp, digest, recipe]
+    key = hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+    with _lock:
+        _groups.setdefault(key, {"pkg": pkg, "version": version, "schema": schema_fp, "builder": None,
+                                 "build_s": 0.0, "waiters": 0, "waited_s": 0.0, "fanout": 0, "fanout_s": 0.0})
+    return key
+
+# ==================== 存取 ====================
+
+def _entry(key):
+    return os.path.join(ARTIFACT_CACHE_DIR, f"{key}.db")
+
+
+def _claim(key, device_id):
+    """已缓存返回 (路径, None)；他人正在构建返回 (None, 事件)；否则登记 device_id 为构建者返回 (None, None)"""
+    with _lock:
+        path = _entry(key)
+        if os.path.exists(path):
+            return path, None
+        flight = _inflight.get(key)
+        if flight:
+            return None, flight["event"]
+        _inflight[key] = {"device": device_id, "event": threading.Event(), "start": time.monotonic()}
+        if key in _groups:
+            _groups[key]["builder"] = device_id
+        return None, None
+
+
+def _touch(pkg, path):
+    try:
+        os.utime(path)
+    except (OSError, TypeError):
+        _count(pkg, "misses")
+        return None
+    _count(pkg, "hits")
+    return path
+
+
+def _waited(key, start):
+    with _lock:
+        if key in _groups:
+            _groups[key]["waiters"] += 1
+            _groups[key]["waited_s"] += time.monotonic() - start
+
+
+def lookup(pkg, key, device_id=None):
+    """
+    命中返回缓存文件路径 (并刷新其使用时间)，否则返回 None。
+    其他设备正在构建同一产物时先等待；未命中且无人构建时登记本设备为构建者，
+    调用方构建结束后 (无论成败) 必须 release(key, device_id)。
+    """
+    if not enabled():
+        return None
+    if not key:
+        _count(pkg, "misses")
+        return None
+    path, event = _claim(key, device_id)
+    if event:
+        start = time.monotonic()
+        event.wait(ARTIFACT_BUILD_WAIT)
+        _waited(key, start)
+        path = _entry(key)
+    return _touch(pkg, path)
+
+
+async def lookup_async(pkg, key, device_id=None):
+    if not enabled():
+        return None
+    if not key:
+        _count(pkg, "misses")
+        return None
+    path, event = _claim(key, device_id)
+    if event:
+        start = time.monotonic()
+        await asyncio.get_running_loop().run_in_executor(None, event.wait, ARTIFACT_BUILD_WAIT)
+        _waited(key, start)
+        path = _entry(key)
+    return _touch(pkg, path)
+
+
+def release(key, device_id):
+    """结束 device_id 对 key 的构建登记并唤醒等待者 (不是构建者时什么也不做)"""
+    with _lock:
+        flight = _inflight.get(key)
+        if not flight or flight["device"] != device_id:
+            return
+        del _inflight[key]
+    flight["event"].set()
+
+
+def store(pkg, key, db_file):
+    if not key:
+        return
+    os.makedirs(ARTIFACT_CACHE_DIR, exist_ok=True)
+    path = _entry(key)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    shutil.copyfile(db_file, tmp)
+    os.replace(tmp, path)
+    _count(pkg, "stores")
+    with _lock:
+        flight = _inflight.pop(key, None)
+        if flight and key in _groups:
+            _groups[key]["build_s"] += time.monotonic() - flight["start"]
+    if flight:
+        flight["event"].set()
+    _evict(pkg)
+
+
+@contextlib.contextmanager
+def fanout(key):
+    """记录一次把缓存产物推送到设备的耗时"""
+    start = time.monotonic()
+    yield
+    with _lock:
+        if key in _groups:
+            _groups[key]["fanout"] += 1
+            _groups[key]["fanout_s"] += time.monotonic() - start
+
+
+def _evict(pkg):
+    with _lock:
+        entries = []
+        for name in os.listdir(ARTIFACT_CACHE_DIR):
+            if not name.endswith(".db"):
+                continue
+            try:
+                st = os.stat(os.path.join(ARTIFACT_CACHE_DIR, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(e[1] for e in entries)
+        evicted = 0
+        for _, size, name in sorted(entries):
+            if total <= ARTIFACT_CACHE_MAX_BYTES:
+                break
+            try:
+                os.remove(os.path.join(ARTIFACT_CACHE_DIR, name))
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+    if evicted:
+        _count(pkg, "evictions", evicted)
+
+# ==================== 统计 ====================
+
+def cache_stats():
+    with _lock:
+        return {k: dict(v) for k, v in _stats.items()}
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+        _groups.clear()
+
+
+def stats_table():
+    rows = cache_stats()
+    header = f"{'artifact':<40}{'hits':>7}{'misses':>8}{'stores':>8}{'evicted':>9}"
+    lines = [header, "-" * len(header)]
+    for pkg, s in sorted(rows.items()):
+        lines.append(f"{pkg[:39]:<40}{s['hits']:>7}{s['misses']:>8}{s['stores']:>8}{s['evictions']:>9}")
+    return "\n".join(lines)
+
+
+# ==================== 设备分组 ====================
+
+def plan_fleet(devices, pkgs, logger=None):
+    """按各包 versionCode 把设备分组 ({(版本, ...): [设备, ...]})，同组设备共享同一批产物"""
+    groups = {}
+    for device_id in devices:
+        facts = get_device_facts(device_id, logger)
+        groups.setdefault(tuple(facts.version_code(p) for p in pkgs), []).append(device_id)
+    return groups
+
+
+def plan_table(plan, pkgs):
+    lines = [f"设备分组 ({', '.join(pkgs)} 的 versionCode):"]
+    for versions, devices in plan.items():
+        lines.append(f"  {'/'.join(str(v) for v in versions)}: {len(devices)} 台 ({', '.join(devices)})")
+    return "\n".join(lines)
+
+
+def fleet_stats():
+    """每个被构建或分发过的产物: 构建者与构建耗时 (pull + 本地 SQL)，分发到其余设备的等待与推送耗时"""
+    with _lock:
+        return {k: dict(g) for k, g in _groups.items() if g["builder"] or g["fanout"]}
+
+
+def fleet_table():
+    rows = fleet_stats().values()
+    header = (f"{'artifact':<36}{'ver':>6}{'schema':>10}{'builder':>16}{'build(s)':>10}"
+              f"{'fanout':>8}{'waited(s)':>11}{'push(s)':>9}")
+    lines = [header, "-" * len(header)]
+    for g in sorted(rows, key=lambda g: (g["pkg"], str(g["version"]))):
+        push = g["fanout_s"] / g["fanout"] if g["fanout"] else 0.0
+        lines.append(f"{g['pkg'][:35]:<36}{str(g['version']):>6}{g['schema'][:8]:>10}{str(g['builder'] or '-')[:15]:>16}"
+                     f"{g['build_s']:>10.2f}{g['fanout']:>8}{g['waited_s']:>11.2f}{push:>9.2f}")
+    return "\n".join(lines)
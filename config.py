@@ -4,6 +4,30 @@ import os
 # ADB 路径
 ADB_PATH = "/home/zzh/Android/Sdk/platform-tools/adb"
 
+# 是否复用每台设备的常驻 `adb shell` 会话执行 shell 命令 (省掉每条命令一次进程创建)
+ADB_SHELL_SESSION = True
+
+# ADB 后端: "binary" = 调用 ADB_PATH 可执行文件; "socket" = 直接与 adb server 通信 (见 adb_client.py)
+ADB_BACKEND = "binary"
+ADB_SERVER_HOST = "127.0.0.1"
+ADB_SERVER_PORT = 5037
+
+# adb 超时 / 重试策略 (见 adb_policy.py)
+# 无历史数据时的超时，也是未单独配置类别的上限
+ADB_TIMEOUT_DEFAULT = 60
+# 自适应超时的下限，以及 p99 的放大倍数
+ADB_TIMEOUT_MIN = 5
+ADB_TIMEOUT_MULTIPLIER = 5
+# 按命令类别 (adb 子命令，或 "shell <程序名>") 的超时上限
+ADB_TIMEOUT_CLASS_MAX = {"push": 300, "pull": 300, "exec-in": 300, "root": 30, "shell monkey": 30}
+# push 估算超时时假设的最低带宽 (字节/秒)
+ADB_MIN_TRANSFER_BPS = 1024 * 1024
+# 传输层瞬时错误的最大重试次数与退避基数 (秒)
+ADB_RETRIES = 2
+ADB_RETRY_BACKOFF = 0.5
+# 设备事实 (device_facts.py) 批量查询失败后，在这段时间 (秒) 内不再重查，各访问器返回空值 / 默认值
+DEVICE_FACTS_RETRY_AFTER = 30
+
 # ==================== 应用配置 ====================
 PKG_CALENDAR = "com.simplemobiletools.calendar.pro"
 DB_CALENDAR_PATH = f"/data/data/{PKG_CALENDAR}/databases/events.db"
@@ -50,7 +74,57 @@ SAFE_PACKAGES_REGEX = [
     # 如果 PKG_CALENDAR 等在 Main 流程中通过 exclude_pkgs 传入，这里不需要列出
 ]
 
+# clean_background_apps 是否把全部 force-stop / pm clear 合并为一次设备端循环 (False 为逐包执行)
+CLEAN_BULK = True
+# 批量重置的超时: 每个包预留的秒数 (pm clear 大应用可能需要数秒)，总超时不少于 120 秒
+CLEAN_BULK_PKG_TIMEOUT = 3
+# 差异重置: 只重置 /data/data 指纹相对上次重置后发生变化的包 (需要 CLEAN_BULK，见 modules/reset_baseline.py)
+CLEAN_DIFF = False
+# 基线保存目录与有效期 (秒)，过期、重启或包列表变化后退回全量重置
+RESET_BASELINE_DIR = "baselines"
+RESET_BASELINE_MAX_AGE = 24 * 3600
+
+# 黄金数据镜像 (见 modules/golden_image.py): main.py --capture-golden 采集，--golden 恢复
+GOLDEN_IMAGE_DIR = "golden"
+GOLDEN_RESTORE = False
+
+# 注入数据库的本地产物缓存 (见 artifact_cache.py): 命中时跳过 pull 与本地 SQL，直接 push 成品库
+ARTIFACT_CACHE = True
+ARTIFACT_CACHE_DIR = os.path.join("cache", "artifacts")
+ARTIFACT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# 其他设备正在构建同一产物时最多等待的秒数，超时后自行构建
+ARTIFACT_BUILD_WAIT = 120
+
+# 模拟器快照快速重置 (见 modules/emu_snapshot.py): 只对 emulator-NNNN 生效，真机或快照无效时走常规流程
+EMU_SNAPSHOT = False
+EMU_SNAPSHOT_NAME = "env_injected"
+EMU_SNAPSHOT_DIR = "snapshots"
+
+# 注入 shared_prefs 模板跳过引导页 (见 modules/prefs_bypass.py): 模板按 包名/versionCode 保存，
+# 没有当前版本的模板时走引导页并在走完后采集
+PREFS_BYPASS = False
+PREFS_TEMPLATE_DIR = "prefs_templates"
+
+# 压力测试环境 (见 modules/inject_app_db.py): {包名: 行数}，以 data/ 中的条目为模板循环生成该数量的行
+# (PKG_TELEPHONY 对应 sms.json 的短信条数，PKG_CONTACTS_STORAGE 对应 contacts.json 的联系人数)
+BULK_ROWS = {}
+# 短信注入在主机上构建 mmssms.db 后一次推送 (见 modules/inject_system.py)；False 或构建失败时在设备上执行单事务 SQL 脚本
+SMS_HOST_BUILD = True
+# 联系人注入直接写 contacts2.db (一个设备端 SQL 脚本) 后重启 ContactsProvider；False 或失败时逐个 content insert
+CONTACTS_BULK = True
+# 本地写库时每次 executemany 的行数与 SQLite 页缓存大小 (KiB)
+BULK_CHUNK_ROWS = 5000
+BULK_CACHE_KB = 64 * 1024
+
 LOG_ROOT_DIR = "logs"
+# 文件日志级别: "DEBUG" 记录每条 adb 命令及其输出; "INFO" 跳过这些逐条记录 (也不会去格式化它们)
+LOG_FILE_LEVEL = "DEBUG"
+# True 时日志写成 {app_context}.log.gz
+LOG_COMPRESS = False
+# DEBUG 级别下记录 adb 输出内容的命令比例 (0~1)，失败的命令始终记录
+LOG_PAYLOAD_SAMPLE = 1.0
+# 单条 stdout 记录的最大长度
+LOG_PAYLOAD_MAX = 500
 PKG_CALENDAR = "com.simplemobiletools.calendar.pro"
 DB_CALENDAR_PATH = f"/data/data/{PKG_CALENDAR}/databases/events.db"
 PKG_TASKS = "org.tasks"
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+设备事实缓存 (只读、幂等的查询结果)
+
+屏幕尺寸、已安装包列表、包 UID / versionCode、时区在一次流水线中基本不变，却被各模块反复查询。
+这里用一次批量查询 (`pm list packages -U --show-versioncode` + `wm size` + `date +%z` + `getprop persist.sys.timezone`)
+填充每台设备的缓存，之后的读取都走内存。
+
+批量查询失败 (设备离线、超时) 后 DEVICE_FACTS_RETRY_AFTER 秒内不再重查，访问器返回空值 / 默认值，
+避免离线或很慢的设备上每次读取都重发一次批量查询；invalidate 会清掉失败记录。
+
+失效规则:
+  - reboot / install / uninstall (含 `pm install` / `pm uninstall`) 以及恢复模拟器快照会使整台设备的缓存失效；
+  - `pm clear` 只清数据，不改变 UID、versionCode 和包列表，因此不触发失效。
+"""
+import datetime
+import re
+import threading
+import time
+
+from config import DEVICE_FACTS_RETRY_AFTER
+from utils import run_adb, run_adb_async, add_command_hook
+
+_SEP = "__DEVICE_FACTS_SEP__"
+# --show-versioncode 在较老的系统上不支持，失败时退回只带 UID 的列表
+_BULK_QUERY = (
+    "pm list packages -U --show-versioncode 2>/dev/null || pm list packages -U; "
+    f"echo {_SEP}; wm size; echo {_SEP}; date +%z; echo {_SEP}; getprop persist.sys.timezone"
+)
+DEFAULT_SCREEN_SIZE = (1080, 1920)
+
+_PKG_LINE_RE = re.compile(r"^package:(\S+)(.*)$")
+_UID_RE = re.compile(r"uid:(\d+)")
+_VERSION_RE = re.compile(r"versionCode:(\d+)")
+_UTC_OFFSET_RE = re.compile(r"^([+-])(\d\d)(\d\d)$", re.M)
+
+
+def _uid_query(pkg):
+    return f"dumpsys package {pkg} | grep userId"
+
+
+class DeviceFacts:
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._packages = {}        # pkg -> {"uid": str|None, "version": str|None}
+        self._screen_size = DEFAULT_SCREEN_SIZE
+        self._utc_offset = None    # 秒，设备本地时间 - UTC (查询时刻)
+        self._timezone = None      # 时区名，例如 Asia/Shanghai
+        self._failed_at = None     # 上次批量查询失败的时刻 (monotonic)，成功或 invalidate 后清除
+        self.loads = 0             # 批量查询次数 (用于观察缓存效果)
+
+    # ==================== 加载 ====================
+    def _parse(self, out):
+        packages = {}
+        screen_size = DEFAULT_SCREEN_SIZE
+        pkg_part, _, rest = (out or "").partition(_SEP)
+        wm_part, _, rest = rest.partition(_SEP)
+        date_part, _, tz_part = rest.partition(_SEP)
+        for line in pkg_part.splitlines():
+            m = _PKG_LINE_RE.match(line.strip())
+            if not m: continue
+            rest = m.group(2)
+            uid = _UID_RE.search(rest)
+            ver = _VERSION_RE.search(rest)
+            packages[m.group(1)] = {
+                "uid": uid.group(1) if uid else None,
+                "version": ver.group(1) if ver else None,
+            }
+        if "Physical size" in wm_part:
+            # 与 wizards 原逻辑一致: 取第一个 WxH (Physical size)
+            m = re.search(r"(\d+)x(\d+)", wm_part)
+            if m: screen_size = (int(m.group(1)), int(m.group(2)))
+        utc_offset = None
+        m = _UTC_OFFSET_RE.search(date_part)
+        if m:
+            utc_offset = (int(m.group(2)) * 3600 + int(m.group(3)) * 60) * (-1 if m.group(1) == "-" else 1)
+        timezone = tz_part.strip() or None
+        return packages, screen_size, utc_offset, timezone
+
+    def _apply(self, out):
+        packages, screen_size, utc_offset, timezone = self._parse(out)
+        if not packages:
+            # 查询失败不写入缓存，DEVICE_FACTS_RETRY_AFTER 秒后再重试
+            self._failed_at = time.monotonic()
+            return False
+        self._failed_at = None
+        self._packages = packages
+        self._screen_size = screen_size
+        self._utc_offset = utc_offset
+        self._timezone = timezone
+        self._loaded = True
+        self.loads += 1
+        return True
+
+    def _needs_load(self):
+        if self._loaded:
+            return False
+        return self._failed_at is None or time.monotonic() - self._failed_at >= DEVICE_FACTS_RETRY_AFTER
+
+    def ensure_loaded(self, logger=None):
+        with self._lock:
+            if self._needs_load():
+                out, _ = run_adb(self.device_id, ["shell", _BULK_QUERY], logger=logger)
+                self._apply(out)
+        return self
+
+    async def ensure_loaded_async(self, logger=None):
+        if self._needs_load():
+            out, _ = await run_adb_async(self.device_id, ["shell", _BULK_QUERY], logger=logger)
+            with self._lock:
+                if self._needs_load():
+                    self._apply(out)
+        return self
+
+    def invalidate(self, reason=None):
+        with self._lock:
+            self._loaded = False
+            self._failed_at = None
+            self._packages = {}
+
+    # ==================== 查询 ====================
+    def packages(self, logger=None):
+        self.ensure_loaded(logger)
+        with self._lock:
+            return list(self._packages.keys())
+
+    def screen_size(self, logger=None):
+        self.ensure_loaded(logger)
+        return self._screen_size
+
+    def utc_offset(self, logger=None):
+        """设备当前时区相对 UTC 的偏移 (秒)；查询失败时为 None。只对当前时刻有效，换算其他时刻用 tzinfo()"""
+        self.ensure_loaded(logger)
+        return self._utc_offset
+
+    def tzinfo(self, logger=None):
+        """
+        设备时区: 优先按 persist.sys.timezone 构造 ZoneInfo (逐个时刻处理夏令时)，
+        主机上没有该时区数据时退回当前偏移的固定时区；都查不到时为 None
+        """
+        self.ensure_loaded(logger)
+        return self._tzinfo(logger)
+
+    async def tzinfo_async(self, logger=None):
+        await self.ensure_loaded_async(logger)
+        return self._tzinfo(logger)
+
+    def _tzinfo(self, logger):
+        if self._timezone:
+            try:
+                from zoneinfo import ZoneInfo
+                return ZoneInfo(self._timezone)
+            except (ImportError, ValueError, KeyError):
+                # ZoneInfoNotFoundError 是 KeyError 的子类
+                if logger:
+                    logger.debug(f"主机上没有时区 {self._timezone} 的数据，按固定偏移换算")
+        if self._utc_offset is None:
+            return None
+        return datetime.timezone(datetime.timedelta(seconds=self._utc_offset))
+
+    def _cached_uid(self, pkg):
+        with self._lock:
+            info = self._packages.get(pkg)
+            return info["uid"] if info else None
+
+    def _store_uid(self, pkg, out):
+        m = re.search(r"userId=(\d+)", out or "")
+        if not m: return None
+        with self._lock:
+            self._packages.setdefault(pkg, {"uid": None, "version": None})["uid"] = m.group(1)
+        return m.group(1)
+
+    def package_uid(self, pkg, logger=None):
+        self.ensure_loaded(logger)
+        uid = self._cached_uid(pkg)
+        if uid:
+            return uid
+        # 缓存中没有 (例如刚安装)，单独查询一次并补进缓存
+        out, _ = run_adb(self.device_id, ["shell", _uid_query(pkg)], logger=logger)
+        return self._store_uid(pkg, out)
+
+    async def package_uid_async(self, pkg, logger=None):
+        await self.ensure_loaded_async(logger)
+        uid = self._cached_uid(pkg)
+        if uid:
+            return uid
+        out, _ = await run_adb_async(self.device_id, ["shell", _uid_query(pkg)], logger=logger)
+        return self._store_uid(pkg, out)
+
+    def version_code(self, pkg, logger=None):
+        self.ensure_loaded(logger)
+        return self._cached_version(pkg)
+
+    async def version_code_async(self, pkg, logger=None):
+        await self.ensure_loaded_async(logger)
+        return self._cached_version(pkg)
+
+    def _cached_version(self, pkg):
+        with self._lock:
+            info = self._packages.get(pkg)
+            return info["version"] if info else None
+
+
+# ==================== 全局注册表 ====================
+_FACTS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_device_facts(device_id, logger=None):
+    with _REGISTRY_LOCK:
+        facts = _FACTS.get(device_id)
+        if facts is None:
+            facts = _FACTS[device_id] = DeviceFacts(device_id)
+    return facts.ensure_loaded(logger)
+
+
+async def get_device_facts_async(device_id, logger=None):
+    with _REGISTRY_LOCK:
+        facts = _FACTS.get(device_id)
+        if facts is None:
+            facts = _FACTS[device_id] = DeviceFacts(device_id)
+    return await facts.ensure_loaded_async(logger)
+
+
+def invalidate_device_facts(device_id, reason=None):
+    with _REGISTRY_LOCK:
+        facts = _FACTS.get(device_id)
+    if facts:
+        facts.invalidate(reason)
+
+
+def _is_invalidating(command_list):
+    if not command_list:
+        return False
+    verb = command_list[0]
+    if verb in ("reboot", "install", "install-multiple", "uninstall"):
+        return True
+    if command_list[:4] == ["emu", "avd", "snapshot", "load"]:
+        return True
+    if verb == "shell":
+        cmd = " ".join(command_list[1:])
+        return re.search(r"\bpm\s+(install|uninstall)\b|\breboot\b", cmd) is not None
+    return False
+
+
+def on_command(device_id, command_list):
+    """每条 adb 命令结束后调用 (注册为 utils 的命令 hook)，安装 / 卸载 / 重启 / 恢复快照时让缓存失效"""
+    if _is_invalidating(command_list):
+        invalidate_device_facts(device_id, reason=" ".join(command_list))
+
+
+add_command_hook(on_command)
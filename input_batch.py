@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+批量输入事件
+
+把一串点击 / 按键 / 滑动 / 等待编译成一个 monkey 脚本，一次 `adb exec-in` 写入设备并由
+同一个 monkey 进程依次注入，代替每个事件一条 `adb shell input ...` (每条都要在设备上启动一次 JVM)，
+事件之间的等待也在设备上完成。
+
+    batch = InputBatch()
+    batch.tap(918, 2160).wait(0.5).key("ENTER").swipe(540, 1800, 540, 600, duration=0.3)
+    batch.run(device_id, logger)
+
+只有一个事件时直接用 input (启动开销相同，省掉写脚本)。
+monkey 执行失败时退回为一条 shell 命令里串行执行 input / sleep (仍是一次往返)。
+"""
+import os
+import tempfile
+
+import tracing
+from utils import run_adb, run_adb_async
+
+REMOTE_SCRIPT_PATH = "/data/local/tmp/input_batch.mks"
+OK_MARK = "__INPUT_OK__"
+# Drag 的插值步数: 每 SWIPE_STEP_MS 毫秒一步
+SWIPE_STEP_MS = 10
+
+
+def keycode(key):
+    """"BACK" / "KEYCODE_BACK" -> "KEYCODE_BACK"；数字键码原样返回"""
+    key = str(key).upper()
+    return key if key.isdigit() or key.startswith("KEYCODE_") else f"KEYCODE_{key}"
+
+
+class InputBatch:
+    def __init__(self):
+        self.events = []   # (类型, 参数元组)
+
+    def tap(self, x, y):
+        self.events.append(("tap", (int(x), int(y))))
+        return self
+
+    def tap_percent(self, x_pct, y_pct, width, height):
+        return self.tap(width * x_pct, height * y_pct)
+
+    def key(self, key):
+        self.events.append(("key", (keycode(key),)))
+        return self
+
+    def swipe(self, x1, y1, x2, y2, duration=0.3):
+        self.events.append(("swipe", (int(x1), int(y1), int(x2), int(y2), int(duration * 1000))))
+        return self
+
+    def wait(self, seconds):
+        self.events.append(("wait", (int(seconds * 1000),)))
+        return self
+
+    def __len__(self):
+        return sum(1 for kind, _ in self.events if kind != "wait")
+
+    # ==================== 编译 ====================
+
+    def monkey_script(self):
+        lines = ["type= raw events", f"count= {len(self.events)}", "speed= 1.0", "start data >>"]
+        for kind, args in self.events:
+            if kind == "tap":
+                lines.append(f"Tap({args[0]},{args[1]})")
+            elif kind == "key":
+                lines.append(f"DispatchPress({args[0]})")
+            elif kind == "swipe":
+                x1, y1, x2, y2, ms = args
+                lines.append(f"Drag({x1},{y1},{x2},{y2},{max(1, ms // SWIPE_STEP_MS)})")
+            else:
+                lines.append(f"UserWait({args[0]})")
+        return "\n".join(lines) + "\n"
+
+    def shell_command(self):
+        """逐个 input 的等价 shell 命令 (单事件与退回路径)"""
+        parts = []
+        for kind, args in self.events:
+            if kind == "tap":
+                parts.append(f"input tap {args[0]} {args[1]}")
+            elif kind == "key":
+                parts.append(f"input keyevent {args[0]}")
+            elif kind == "swipe":
+                parts.append("input swipe {} {} {} {} {}".format(*args))
+            else:
+                parts.append(f"sleep {args[0] / 1000:g}")
+        return "; ".join(parts)
+
+    @staticmethod
+    def monkey_command():
+        return (f"cat > {REMOTE_SCRIPT_PATH} && monkey -v -f {REMOTE_SCRIPT_PATH} 1; __rc=$?; "
+                f"rm -f {REMOTE_SCRIPT_PATH}; [ $__rc -eq 0 ] && echo {OK_MARK}")
+
+    def _write_local(self):
+        fd, local = tempfile.mkstemp(suffix=".mks")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.monkey_script())
+        return local
+
+    @staticmethod
+    def _monkey_ok(out):
+        out = out or ""
+        return OK_MARK in out and "aborted" not in out
+
+    # ==================== 执行 ====================
+
+    def run(self, device_id, logger=None):
+        """按顺序注入全部事件，返回 monkey 是否成功 (False 表示走了 input 退回路径)"""
+        if not self.events:
+            return True
+        with tracing.span(device_id, "InputBatch.run", cat="script", events=len(self)) as sp:
+            if len(self.events) == 1:
+                run_adb(device_id, ["shell", self.shell_command()], logger=logger)
+                return True
+            local = self._write_local()
+            try:
+                out, _ = run_adb(device_id, ["exec-in", self.monkey_command()], logger=logger, stdin_path=local)
+            finally:
+                os.remove(local)
+            ok = self._monkey_ok(out)
+            sp.set(monkey=ok)
+            if not ok:
+                if logger:
+                    logger.warning(f"  monkey 批量注入失败，改用 input 逐个注入 ({len(self)} 个事件)")
+                run_adb(device_id, ["shell", self.shell_command()], logger=logger)
+            return ok
+
+    async def run_async(self, device_id, logger=None):
+        if not self.events:
+            return True
+        with tracing.span(device_id, "InputBatch.run", cat="script", events=len(self)) as sp:
+            if len(self.events) == 1:
+                await run_adb_async(device_id, ["shell", self.shell_command()], logger=logger)
+                return True
+            local = self._write_local()
+            try:
+                out, _ = await run_adb_async(device_id, ["exec-in", self.monkey_command()], logger=logger,
+                                             stdin_path=local)
+            finally:
+                os.remove(local)
+            ok = self._monkey_ok(out)
+            sp.set(monkey=ok)
+            if not ok:
+                if logger:
+                    logger.warning(f"  monkey 批量注入失败，改用 input 逐个注入 ({len(self)} 个事件)")
+                await run_adb_async(device_id, ["shell", self.shell_command()], logger=logger)
+            return ok
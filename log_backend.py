@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+非阻塞日志后端
+
+各设备 / 各应用的 logger 只挂一个 QueueHandler，记录入队后立即返回；
+全部文件与终端输出由唯一的写线程完成，磁盘 / 终端 I/O 不再占用流水线线程。
+
+同时统计每台设备的日志量 (条数、字节数) 以及热路径上的入队耗时，见 log_stats()。
+"""
+import atexit
+import gzip
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+_queue = queue.SimpleQueue()
+_lock = threading.Lock()          # 保护 _targets / _devices，写线程输出期间持有
+_stats_lock = threading.Lock()    # 统计单独加锁，避免热路径等待磁盘写入
+_targets = {}       # logger 名 -> [实际 handler]
+_devices = {}       # logger 名 -> device_id
+_stats = {}         # device_id -> {"records", "bytes", "enqueue_s", "write_s"}
+_listener = None
+
+
+def _stat(device_id):
+    return _stats.setdefault(device_id, {"records": 0, "bytes": 0, "enqueue_s": 0.0, "write_s": 0.0})
+
+
+class _DispatchListener(QueueListener):
+    """按 logger 名把记录分发给该 logger 自己的文件 / 终端 handler"""
+
+    def handle(self, record):
+        start = time.perf_counter()
+        with _lock:
+            handlers = _targets.get(record.name, ())
+            for h in handlers:
+                if record.levelno >= h.level:
+                    h.handle(record)
+            device_id = _devices.get(record.name)
+        if device_id is not None:
+            with _stats_lock:
+                s = _stat(device_id)
+                s["records"] += 1
+                s["bytes"] += len(record.getMessage()) + 1
+                s["write_s"] += time.perf_counter() - start
+
+
+class _TimedQueueHandler(QueueHandler):
+    """记录热路径上的入队耗时 (含消息格式化)"""
+
+    def __init__(self, q, device_id):
+        super().__init__(q)
+        self.device_id = device_id
+
+    def emit(self, record):
+        start = time.perf_counter()
+        super().emit(record)
+        elapsed = time.perf_counter() - start
+        with _stats_lock:
+            _stat(self.device_id)["enqueue_s"] += elapsed
+
+
+def _ensure_listener():
+    global _listener
+    with _lock:
+        if _listener is None:
+            _listener = _DispatchListener(_queue)
+            _listener.start()
+            atexit.register(shutdown)
+
+
+def open_log_stream(path, compress=False):
+    """compress=True 时写 gzip 文本流 ({path}.gz)"""
+    if compress:
+        return logging.StreamHandler(gzip.open(path + ".gz", "wt", encoding="utf-8"))
+    return logging.FileHandler(path, mode="w", encoding="utf-8")
+
+
+def attach(logger, device_id, handlers):
+    """
+    让 logger 通过队列输出到 handlers。
+    同名 logger 重复创建时 (例如同一设备再次运行)，旧的 handler 会被关闭并替换。
+    """
+    _ensure_listener()
+    with _lock:
+        old = _targets.get(logger.name, ())
+        _targets[logger.name] = list(handlers)
+        _devices[logger.name] = device_id
+    for h in old:
+        _close(h)
+    if logger.hasHandlers(): logger.handlers.clear()
+    logger.addHandler(_TimedQueueHandler(_queue, device_id))
+    logger.propagate = False
+    return logger
+
+
+def _close(handler):
+    with _lock:
+        try:
+            handler.flush()
+            if isinstance(handler, logging.StreamHandler) and isinstance(handler.stream, gzip.GzipFile):
+                handler.stream.close()
+            handler.close()
+        except Exception:
+            pass
+
+
+def flush():
+    """等待队列中已有的记录全部写出"""
+    if _listener is None:
+        return
+    done = threading.Event()
+    marker = logging.makeLogRecord({"name": f"__log_backend_flush_{id(done)}__", "levelno": logging.CRITICAL})
+    with _lock:
+        _targets[marker.name] = [_EventHandler(done)]
+    _queue.put(marker)
+    done.wait(timeout=10)
+    with _lock:
+        _targets.pop(marker.name, None)
+
+
+class _EventHandler(logging.Handler):
+    def __init__(self, event):
+        super().__init__()
+        self.event = event
+
+    def emit(self, record):
+        self.event.set()
+
+
+def shutdown():
+    """停止写线程并关闭所有文件 (进程退出时自动调用)"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
+    with _lock:
+        handlers = [h for hs in _targets.values() for h in hs]
+        _targets.clear()
+    for h in handlers:
+        _close(h)
+
+
+def log_stats():
+    """{device_id: {"records", "bytes", "enqueue_s", "write_s"}} 的快照"""
+    with _stats_lock:
+        return {d: dict(s) for d, s in _stats.items()}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -1,33 +1,49 @@
 # -*- coding: utf-8 -*-
+import argparse
+import asyncio
 import os
 import re
 import tempfile
 import concurrent.futures
-import time
-from config import ADB_PATH, PKG_CALENDAR, PKG_TASKS, PKG_EXPENSE, PKG_MARKOR, PKG_CONTACTS, PKG_TELEPHONY, PKG_CONTACTS_STORAGE
-from utils import setup_logger, run_adb
-from modules.system import clean_background_apps, go_home
-from modules.wizards import init_markor, init_expense, init_tasks
+import artifact_cache
+import log_backend
+import readiness
+import tracing
+from config import ADB_PATH, ADB_BACKEND, ARTIFACT_CACHE, GOLDEN_RESTORE, EMU_SNAPSHOT, PREFS_BYPASS, PKG_CALENDAR, PKG_TASKS, PKG_EXPENSE, PKG_MARKOR, PKG_CONTACTS, PKG_TELEPHONY, PKG_CONTACTS_STORAGE
+from utils import setup_logger, run_adb, run_adb_async, list_devices
+from modules.system import clean_background_apps, go_home, clean_background_apps_async, go_home_async
+from modules.system import respawn_probe, SYSTEM_PROVIDER_URIS
+from readiness import wait_for, wait_for_async
+from modules.golden_image import capture_golden_image, restore_golden_image, restore_golden_image_async
+from modules.emu_snapshot import is_emulator, restore_snapshot, save_snapshot, restore_snapshot_async, save_snapshot_async
+from modules import wizards, inject_app_db
+from modules.wizards import init_markor, init_expense, init_tasks, init_markor_async, init_expense_async, init_tasks_async
 
 # 引入各注入模块
-from modules.injector import inject_calendar
-from modules.inject_tasks import inject_tasks_db
-from modules.inject_expense import inject_expense_db
+from modules.inject_app_db import APP_DB_SPECS, inject_all, inject_all_async
 # [修改] 引入新的通用文件注入模块 (替代旧的 Markor 和 Media 注入)
-from modules.inject_files import inject_files_from_manifest
-from modules.inject_system import inject_contacts, inject_sms_msg 
+from modules.inject_files import inject_files_from_manifest, inject_files_from_manifest_async
+from modules.inject_system import inject_contacts, inject_sms_msg, inject_contacts_async, inject_sms_msg_async
+
+# [关键配置] 收尾清理时保护系统数据不被清理
+FINAL_EXCLUDE_PKGS = [
+    PKG_CALENDAR, 
+    PKG_TASKS, 
+    PKG_EXPENSE, 
+    PKG_MARKOR, 
+    PKG_CONTACTS,         # 联系人 UI
+    PKG_TELEPHONY,        # 短信数据库 (必须保留)
+    PKG_CONTACTS_STORAGE, # 联系人数据库 (必须保留)
+    "com.google.android.apps.messaging",
+    "com.android.phone"   # 电话服务 (建议保留)
+]
+
+# 注入时构建数据库产物的应用，多台设备按其版本分组共享产物 (见 artifact_cache.py)
+ARTIFACT_PKGS = list(APP_DB_SPECS)
 
 def find_devices():
-    import subprocess
-    # 获取连接的设备列表
-    res = subprocess.run([ADB_PATH, "devices"], capture_output=True, text=True)
-    devices = []
-    if res.stdout:
-        for line in res.stdout.splitlines()[1:]:
-            if "device" in line: 
-                match = re.match(r"(\S+)\s+device", line)
-                if match: devices.append(match.group(1))
-    return devices
+    # 获取连接的设备列表 (socket 后端下直接解析 host:devices，无需起 adb 进程)
+    return list_devices()
 
 def is_injected(device_id, logger):
     """
@@ -51,12 +67,32 @@ def mark_injected(device_id, logger):
     """
     run_adb(device_id, ["shell", "touch /data/local/tmp/env_injected_flag"], logger=logger)
 
-def process_device_pipeline(device_id):
+def process_device_pipeline(device_id, golden=None, snapshot=None, bypass=None):
+    """
+    golden (默认 GOLDEN_RESTORE): 用黄金镜像恢复 Calendar / Tasks / Expense，镜像不可用时走常规流程
+    snapshot (默认 EMU_SNAPSHOT): 模拟器直接恢复注入完成后的快照，没有可用快照时走常规流程并在结束后保存
+    bypass (默认 PREFS_BYPASS): 注入 shared_prefs 模板跳过引导页，没有当前版本的模板时走引导页并采集
+    """
+    with tracing.span(device_id, "pipeline", cat="pipeline"):
+        _process_device_pipeline(device_id, GOLDEN_RESTORE if golden is None else golden,
+                                 EMU_SNAPSHOT if snapshot is None else snapshot,
+                                 PREFS_BYPASS if bypass is None else bypass)
+
+def _process_device_pipeline(device_id, golden, snapshot, bypass):
     # 1. 设置主 Logger
     logger = setup_logger(device_id, "system")
     logger.info(f"========== 开始处理设备 {device_id} ==========")
     
-    run_adb(device_id, ["root"], logger=logger)
+    snapshot = snapshot and is_emulator(device_id)
+    if snapshot:
+        with tracing.span(device_id, "snapshot", cat="stage"):
+            restored = restore_snapshot(device_id, logger)
+        if restored:
+            logger.info("========== 设备处理完成 (快照恢复) ==========")
+            return
+
+    with tracing.span(device_id, "root", cat="stage"):
+        run_adb(device_id, ["root"], logger=logger)
 
     # [新增] 幂等性检测：如果已经注入过，直接跳过
     # if is_injected(device_id, logger):
@@ -66,9 +102,11 @@ def process_device_pipeline(device_id):
 
     # 2. 环境清理
     logger.info("--- 步骤 1: 清理环境 ---")
-    clean_background_apps(device_id, logger, exclude_pkgs=[])
+    with tracing.span(device_id, "clean", cat="stage"):
+        clean_background_apps(device_id, logger, exclude_pkgs=[])
 
-    time.sleep(2)
+        # 系统存储服务就绪后再开始初始化应用
+        wait_for(device_id, "after clean", respawn_probe(SYSTEM_PROVIDER_URIS), timeout=10, budget=2, logger=logger)
     
     # 3. 初始化应用 (生成基础文件/DB)
     logger.info("--- 步骤 2: 初始化应用 (Wizard Skipping) ---")
@@ -80,23 +118,25 @@ def process_device_pipeline(device_id):
     log_markor = setup_logger(device_id, "markor")
     log_sys = setup_logger(device_id, "system_data")
     
+    restored = False
+    if golden:
+        with tracing.span(device_id, "golden", cat="stage"):
+            restored = restore_golden_image(device_id, logger)
+
     # 执行初始化点击逻辑 (Warm-up)
-    init_markor(device_id, log_markor)
-    init_expense(device_id, log_exp)
-    init_tasks(device_id, log_task)
+    with tracing.span(device_id, "wizards", cat="stage"):
+        init_markor(device_id, log_markor, bypass)
+        if not restored:
+            init_expense(device_id, log_exp, bypass)
+            init_tasks(device_id, log_task, bypass)
     
     # 4. 注入数据
-    with tempfile.TemporaryDirectory() as temp_dir:
+    with tempfile.TemporaryDirectory() as temp_dir, tracing.span(device_id, "inject", cat="stage"):
         logger.info("--- 步骤 3: 注入数据 (From JSON) ---")
         
-        # Calendar (读取 calendar.json)
-        inject_calendar(device_id, temp_dir, log_cal)
-        
-        # Tasks (读取 tasks.json)
-        inject_tasks_db(device_id, temp_dir, log_task)
-        
-        # Expense (读取 expense.json)
-        inject_expense_db(device_id, temp_dir, log_exp)
+        if not restored:
+            # Calendar / Tasks / Expense (按 APP_DB_SPECS 读取 calendar.json / tasks.json / expense.json)
+            inject_all(device_id, temp_dir, {PKG_CALENDAR: log_cal, PKG_TASKS: log_task, PKG_EXPENSE: log_exp})
         
         # Files (Documents, Markor, Photos, etc.) - [修改] 使用新模块读取 files_manifest.json
         inject_files_from_manifest(device_id, temp_dir, log_sys)
@@ -108,30 +148,150 @@ def process_device_pipeline(device_id):
     # 5. 收尾
     logger.info("--- 步骤 4: 收尾 ---")
     
-    # [新增] 标记注入完成
-    mark_injected(device_id, logger)
-    
-    go_home(device_id, logger)
-    
-    # [关键配置] 保护系统数据不被清理
-    exclude_list = [
-        PKG_CALENDAR, 
-        PKG_TASKS, 
-        PKG_EXPENSE, 
-        PKG_MARKOR, 
-        PKG_CONTACTS,         # 联系人 UI
-        PKG_TELEPHONY,        # 短信数据库 (必须保留)
-        PKG_CONTACTS_STORAGE, # 联系人数据库 (必须保留)
-        "com.google.android.apps.messaging",
-        "com.android.phone"   # 电话服务 (建议保留)
-    ]
-    
-    clean_background_apps(device_id, logger, exclude_pkgs=exclude_list)
+    with tracing.span(device_id, "finish", cat="stage"):
+        # [新增] 标记注入完成
+        mark_injected(device_id, logger)
+        
+        go_home(device_id, logger)
+        
+        clean_background_apps(device_id, logger, exclude_pkgs=FINAL_EXCLUDE_PKGS)
     
+    if snapshot:
+        with tracing.span(device_id, "snapshot save", cat="stage"):
+            save_snapshot(device_id, logger)
+
     logger.info("========== 设备处理完成 ==========")
 
-def main():
-    if not os.path.exists(ADB_PATH): 
+async def process_device_pipeline_async(device_id, golden=None, snapshot=None, bypass=None):
+    """
+    process_device_pipeline 的 asyncio 版本。
+    所有 adb 调用与固定等待都是 await，同一事件循环内多台设备的等待可以互相重叠。
+    """
+    with tracing.span(device_id, "pipeline", cat="pipeline"):
+        await _process_device_pipeline_async(device_id, GOLDEN_RESTORE if golden is None else golden,
+                                             EMU_SNAPSHOT if snapshot is None else snapshot,
+                                             PREFS_BYPASS if bypass is None else bypass)
+
+async def _process_device_pipeline_async(device_id, golden, snapshot, bypass):
+    logger = setup_logger(device_id, "system")
+    logger.info(f"========== 开始处理设备 {device_id} ==========")
+
+    snapshot = snapshot and is_emulator(device_id)
+    if snapshot:
+        with tracing.span(device_id, "snapshot", cat="stage"):
+            restored = await restore_snapshot_async(device_id, logger)
+        if restored:
+            logger.info("========== 设备处理完成 (快照恢复) ==========")
+            return
+
+    with tracing.span(device_id, "root", cat="stage"):
+        await run_adb_async(device_id, ["root"], logger=logger)
+
+    logger.info("--- 步骤 1: 清理环境 ---")
+    with tracing.span(device_id, "clean", cat="stage"):
+        await clean_background_apps_async(device_id, logger, exclude_pkgs=[])
+
+        await wait_for_async(device_id, "after clean", respawn_probe(SYSTEM_PROVIDER_URIS), timeout=10, budget=2,
+                             logger=logger)
+
+    logger.info("--- 步骤 2: 初始化应用 (Wizard Skipping) ---")
+    log_cal = setup_logger(device_id, "calendar")
+    log_task = setup_logger(device_id, "tasks")
+    log_exp = setup_logger(device_id, "expense")
+    log_markor = setup_logger(device_id, "markor")
+    log_sys = setup_logger(device_id, "system_data")
+
+    restored = False
+    if golden:
+        with tracing.span(device_id, "golden", cat="stage"):
+            restored = await restore_golden_image_async(device_id, logger)
+
+    with tracing.span(device_id, "wizards", cat="stage"):
+        await init_markor_async(device_id, log_markor, bypass)
+        if not restored:
+            await init_expense_async(device_id, log_exp, bypass)
+            await init_tasks_async(device_id, log_task, bypass)
+
+    with tempfile.TemporaryDirectory() as temp_dir, tracing.span(device_id, "inject", cat="stage"):
+        logger.info("--- 步骤 3: 注入数据 (From JSON) ---")
+        if not restored:
+            await inject_all_async(device_id, temp_dir, {PKG_CALENDAR: log_cal, PKG_TASKS: log_task, PKG_EXPENSE: log_exp})
+        await inject_files_from_manifest_async(device_id, temp_dir, log_sys)
+        await inject_contacts_async(device_id, log_sys)
+        await inject_sms_msg_async(device_id, temp_dir, log_sys)
+
+    logger.info("--- 步骤 4: 收尾 ---")
+    with tracing.span(device_id, "finish", cat="stage"):
+        await run_adb_async(device_id, ["shell", "touch /data/local/tmp/env_injected_flag"], logger=logger)
+        await go_home_async(device_id, logger)
+        await clean_background_apps_async(device_id, logger, exclude_pkgs=FINAL_EXCLUDE_PKGS)
+
+    if snapshot:
+        with tracing.span(device_id, "snapshot save", cat="stage"):
+            await save_snapshot_async(device_id, logger)
+
+    logger.info("========== 设备处理完成 ==========")
+
+async def run_all_async(devices, golden=None, snapshot=None, bypass=None):
+    """单事件循环并发驱动全部设备，单台设备失败不影响其他设备"""
+    results = await asyncio.gather(*(process_device_pipeline_async(d, golden, snapshot, bypass) for d in devices),
+                                   return_exceptions=True)
+    for device_id, res in zip(devices, results):
+        if isinstance(res, Exception):
+            print(f"Pipeline Execution Error [{device_id}]: {res}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Android 环境重置与数据注入")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="使用 asyncio 单事件循环驱动所有设备 (替代每设备一个线程)")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="记录每条 adb 命令 / 注入器 / 流水线步骤的耗时，导出 Chrome trace JSON 并打印阶段汇总表")
+    golden = parser.add_mutually_exclusive_group()
+    golden.add_argument("--golden", action="store_true", default=None,
+                        help="用黄金镜像恢复 Calendar / Tasks / Expense (镜像不可用时自动走常规流程)")
+    golden.add_argument("--capture-golden", nargs="?", const="", metavar="SERIAL",
+                        help="常规流程结束后从 SERIAL (默认第一台设备) 采集黄金镜像")
+    parser.add_argument("--snapshot", action="store_true", default=None,
+                        help="模拟器 (emulator-NNNN) 恢复注入完成后的快照代替整套流程；首次或快照无效时走常规流程并保存快照")
+    parser.add_argument("--prefs-bypass", action="store_true", default=None,
+                        help="注入 shared_prefs 模板跳过引导页；没有当前版本的模板时走引导页并采集模板")
+    return parser.parse_args(argv)
+
+def _capture_golden(devices, serial):
+    device_id = serial or devices[0]
+    if device_id not in devices:
+        print(f"设备 {device_id} 不在线，无法采集黄金镜像。")
+        return
+    capture_golden_image(device_id, setup_logger(device_id, "golden"))
+
+def _export_trace(path):
+    tracing.export_chrome_trace(path)
+    summary = "\n\n".join([tracing.summary_table(), readiness.stats_table(), wizards.stats_table(),
+                           inject_app_db.stats_table(), artifact_cache.stats_table(), artifact_cache.fleet_table()]) + "\n"
+    log_backend.flush()
+    for device_id, st in log_backend.log_stats().items():
+        summary += (f"\n[{device_id}] log: {st['records']} records / {st['bytes']} bytes, "
+                    f"enqueue {st['enqueue_s'] * 1000:.1f} ms, writer {st['write_s'] * 1000:.1f} ms")
+    with open(os.path.splitext(path)[0] + ".summary.txt", "w", encoding="utf-8") as f:
+        f.write(summary + "\n")
+    print(summary)
+    print(f"Trace 已导出: {path}")
+
+def _run_threads(devices, golden, snapshot, bypass):
+    # 使用线程池并发处理所有连接的设备
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(devices)) as executor:
+        try:
+            results = executor.map(lambda d: process_device_pipeline(d, golden, snapshot, bypass), devices)
+            # 迭代结果以触发任何潜在的异常
+            for _ in results: pass 
+        except Exception as e:
+            print(f"Pipeline Execution Error: {e}")
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.trace:
+        tracing.enable()
+    if ADB_BACKEND != "socket" and not os.path.exists(ADB_PATH): 
         print(f"Error: ADB Path not found at {ADB_PATH}")
         return
     
@@ -141,15 +301,22 @@ def main():
     if not devices:
         print("未发现在线设备。")
         return
-    
-    # 使用线程池并发处理所有连接的设备
-    with concurrent.futures.ThreadPoolExecutor(max_workers=len(devices)) as executor:
-        try:
-            results = executor.map(process_device_pipeline, devices)
-            # 迭代结果以触发任何潜在的异常
-            for _ in results: pass 
-        except Exception as e:
-            print(f"Pipeline Execution Error: {e}")
+
+    if ARTIFACT_CACHE and len(devices) > 1:
+        print(artifact_cache.plan_table(artifact_cache.plan_fleet(devices, ARTIFACT_PKGS), ARTIFACT_PKGS))
+
+    # 采集镜像前必须走完整的常规流程
+    golden = False if args.capture_golden is not None else args.golden
+    try:
+        if args.use_async:
+            asyncio.run(run_all_async(devices, golden, args.snapshot, args.prefs_bypass))
+        else:
+            _run_threads(devices, golden, args.snapshot, args.prefs_bypass)
+        if args.capture_golden is not None:
+            _capture_golden(devices, args.capture_golden)
+    finally:
+        if args.trace:
+            _export_trace(args.trace)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+模拟器快照快速重置 (只对 emulator-NNNN 序列号生效)
+
+首次: 常规流程 (清理 -> 引导页 -> 注入 -> 收尾) 结束后写入随机令牌文件，
+      `adb emu avd snapshot save <name>` 保存快照，删除设备上的令牌后再 load 一次，
+      确认令牌确实由快照恢复。
+之后: `adb emu avd snapshot load <name>` + 核对令牌，代替整套流程。
+
+快照元数据按 AVD 名保存在 EMU_SNAPSHOT_DIR/<avd>.json (令牌、data/ 签名、创建时间)。
+以下情况视为快照无效，由调用方退回常规流程并在结束后重新保存:
+  - 没有元数据 / 控制台返回 KO / 快照列表中没有该快照；
+  - data/ 下的注入数据已变化；
+  - 恢复后设备上的令牌与元数据不一致。
+"""
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+
+from config import EMU_SNAPSHOT_DIR, EMU_SNAPSHOT_NAME
+from readiness import wait_for, wait_for_async, boot_completed
+from utils import run_adb, run_adb_async, run_blocking
+from tracing import traced
+
+EMULATOR_SERIAL_RE = re.compile(r"^emulator-\d+$")
+TOKEN_PATH = "/data/local/tmp/env_snapshot_token"
+DATA_DIR = "data"
+# 恢复快照后等待系统可用的最长时间 (秒)
+LOAD_READY_TIMEOUT = 60
+
+
+def is_emulator(device_id):
+    return bool(EMULATOR_SERIAL_RE.match(device_id or ""))
+
+
+def _parse_console(out):
+    """控制台输出以 OK 结尾表示成功，KO: 开头的行是错误；返回 (是否成功, 去掉 OK 的正文行)"""
+    lines = [l.strip() for l in (out or "").splitlines() if l.strip()]
+    if any(l.startswith("KO") for l in lines) or "OK" not in lines:
+        return False, lines
+    return True, [l for l in lines if l != "OK"]
+
+
+def _console_error(lines, err):
+    return next((l for l in lines if l.startswith("KO")), err or "无输出")
+
+
+def data_signature():
+    """data/ 下全部注入数据文件的摘要"""
+    h = hashlib.sha1()
+    for name in sorted(os.listdir(DATA_DIR)):
+        path = os.path.join(DATA_DIR, name)
+        if os.path.isfile(path):
+            h.update(name.encode("utf-8"))
+            with open(path, "rb") as f:
+                h.update(hashlib.sha1(f.read()).digest())
+    return h.hexdigest()
+
+
+def _meta_path(avd):
+    return os.path.join(EMU_SNAPSHOT_DIR, f"{avd}.json")
+
+
+def load_meta(avd):
+    try:
+        with open(_meta_path(avd), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_meta(avd, meta):
+    os.makedirs(EMU_SNAPSHOT_DIR, exist_ok=True)
+    path = _meta_path(avd)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def drop_meta(avd):
+    try:
+        os.remove(_meta_path(avd))
+    except OSError:
+        pass
+
+
+def invalid_reason(meta, name=EMU_SNAPSHOT_NAME):
+    """元数据层面快照不可用的原因；可用时返回 None"""
+    if not meta or meta.get("name") != name:
+        return "没有快照记录"
+    if meta.get("data_sig") != data_signature():
+        return "data/ 注入数据已变化"
+    return None
+
+
+def _check_token(out, meta):
+    return bool(meta) and (out or "").strip() == meta.get("token")
+
+
+def _write_token_cmd(meta):
+    return f"echo {meta['token']} > {TOKEN_PATH}"
+
+
+def _drop_token_cmd():
+    # 保存后删除令牌: 验证 load 时只有快照真正恢复了设备状态，令牌才会回来
+    return f"rm -f {TOKEN_PATH}"
+
+
+def _console_failure(out, err):
+    """控制台命令失败时返回错误信息，成功返回 None"""
+    ok, lines = _parse_console(out)
+    return None if ok else _console_error(lines, err)
+
+
+def _parse_avd(out, err, logger):
+    ok, lines = _parse_console(out)
+    if not ok or not lines:
+        logger.warning(f"无法通过模拟器控制台获取 AVD 名: {_console_error(lines, err)}")
+        return None
+    return lines[0]
+
+
+def _usable_meta(avd, name, logger):
+    """读取并检查元数据 (要对 data/ 求摘要，异步版本放到线程池)，可用时返回元数据"""
+    meta = load_meta(avd)
+    reason = invalid_reason(meta, name)
+    if reason:
+        logger.info(f"快照不可用 ({reason})，使用常规流程。")
+        return None
+    return meta
+
+
+def _new_meta(name, device_id):
+    return {"name": name, "token": uuid.uuid4().hex, "data_sig": data_signature(),
+            "source_device": device_id, "created": time.time()}
+
+
+def _report_restore(ok, avd, name, logger):
+    if not ok:
+        drop_meta(avd)
+        logger.info("快照无效，使用常规流程。")
+        return False
+    logger.info(f"已从快照 {name} 恢复 ({avd})")
+    return True
+
+
+def _report_save(ok, avd, name, meta, logger):
+    if not ok:
+        logger.error(f"快照 {name} 保存后验证失败，不启用。")
+        return False
+    _save_meta(avd, meta)
+    logger.info(f"快照 {name} 已保存并验证 ({avd})")
+    return True
+
+# ==================== 同步 ====================
+
+def avd_name(device_id, logger):
+    out, err = run_adb(device_id, ["emu", "avd", "name"], logger=logger)
+    return _parse_avd(out, err, logger)
+
+
+def _load(device_id, logger, name, meta):
+    out, err = run_adb(device_id, ["emu", "avd", "snapshot", "load", name], logger=logger)
+    error = _console_failure(out, err)
+    if error:
+        logger.warning(f"加载快照 {name} 失败: {error}")
+        return False
+    run_adb(device_id, ["wait-for-device"], logger=logger)
+    if not wait_for(device_id, "snapshot load", boot_completed(), timeout=LOAD_READY_TIMEOUT, logger=logger):
+        return False
+    out, _ = run_adb(device_id, ["shell", f"cat {TOKEN_PATH}"], logger=logger)
+    if not _check_token(out, meta):
+        logger.warning(f"快照 {name} 恢复后令牌不一致")
+        return False
+    return True
+
+
+@traced("injector")
+def restore_snapshot(device_id, logger, name=EMU_SNAPSHOT_NAME):
+    """恢复注入完成后的快照；非模拟器、快照无效或恢复失败时返回 False"""
+    if not is_emulator(device_id):
+        return False
+    avd = avd_name(device_id, logger)
+    if not avd:
+        return False
+    meta = _usable_meta(avd, name, logger)
+    if not meta:
+        return False
+    return _report_restore(_load(device_id, logger, name, meta), avd, name, logger)
+
+
+@traced("injector")
+def save_snapshot(device_id, logger, name=EMU_SNAPSHOT_NAME):
+    """常规流程结束后保存快照并立即验证，成功返回 True"""
+    if not is_emulator(device_id):
+        return False
+    avd = avd_name(device_id, logger)
+    if not avd:
+        return False
+    meta = _new_meta(name, device_id)
+    run_adb(device_id, ["shell", _write_token_cmd(meta)], logger=logger)
+    out, err = run_adb(device_id, ["emu", "avd", "snapshot", "save", name], logger=logger)
+    error = _console_failure(out, err)
+    if error:
+        logger.error(f"保存快照 {name} 失败: {error}")
+        return False
+    run_adb(device_id, ["shell", _drop_token_cmd()], logger=logger)
+    return _report_save(_load(device_id, logger, name, meta), avd, name, meta, logger)
+
+# ==================== 异步 ====================
+
+async def avd_name_async(device_id, logger):
+    out, err = await run_adb_async(device_id, ["emu", "avd", "name"], logger=logger)
+    return _parse_avd(out, err, logger)
+
+
+async def _load_async(device_id, logger, name, meta):
+    out, err = await run_adb_async(device_id, ["emu", "avd", "snapshot", "load", name], logger=logger)
+    error = _console_failure(out, err)
+    if error:
+        logger.warning(f"加载快照 {name} 失败: {error}")
+        return False
+    await run_adb_async(device_id, ["wait-for-device"], logger=logger)
+    if not await wait_for_async(device_id, "snapshot load", boot_completed(), timeout=LOAD_READY_TIMEOUT,
+                                logger=logger):
+        return False
+    out, _ = await run_adb_async(device_id, ["shell", f"cat {TOKEN_PATH}"], logger=logger)
+    if not _check_token(out, meta):
+        logger.warning(f"快照 {name} 恢复后令牌不一致")
+        return False
+    return True
+
+
+@traced("injector")
+async def restore_snapshot_async(device_id, logger, name=EMU_SNAPSHOT_NAME):
+    if not is_emulator(device_id):
+        return False
+    avd = await avd_name_async(device_id, logger)
+    if not avd:
+        return False
+    meta = await run_blocking(_usable_meta, avd, name, logger)
+    if not meta:
+        return False
+    ok = await _load_async(device_id, logger, name, meta)
+    return await run_blocking(_report_restore, ok, avd, name, logger)
+
+
+@traced("injector")
+async def save_snapshot_async(device_id, logger, name=EMU_SNAPSHOT_NAME):
+    if not is_emulator(device_id):
+        return False
+    avd = await avd_name_async(device_id, logger)
+    if not avd:
+        return False
+    meta = await run_blocking(_new_meta, name, device_id)
+    await run_adb_async(device_id, ["shell", _write_token_cmd(meta)], logger=logger)
+    out, err = await run_adb_async(device_id, ["emu", "avd", "snapshot", "save", name], logger=logger)
+    error = _console_failure(out, err)
+    if error:
+        logger.error(f"保存快照 {name} 失败: {error}")
+        return False
+    await run_adb_async(device_id, ["shell", _drop_token_cmd()], logger=logger)
+    ok = await _load_async(device_id, logger, name, meta)
+    return await run_blocking(_report_save, ok, avd, name, meta, logger)
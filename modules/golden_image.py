@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+黄金数据镜像: 把注入完成的应用数据目录整体打包，之后一次传输恢复
+
+采集 (一次，从已知正常的设备):
+    /data/data/<pkg>/{databases,shared_prefs,files} -> GOLDEN_IMAGE_DIR/<name>.tar + <name>.json
+恢复 (每次流水线):
+    一条 `adb exec-in` 把 tar 流送进设备，在同一条命令里解包、按本机 UID chown、restorecon，
+    代替 启动 -> 引导页 -> pull -> 本地改库 -> push -> cat -> chown 的整套流程。
+
+清单 (<name>.json) 记录各包的 versionCode 与注入数据文件的哈希；
+设备上的版本或 data/ 下的 JSON 与采集时不一致时视为不可用，由调用方退回常规流程。
+注意: 镜像中的 created / modified 等时间戳停留在采集时刻。
+"""
+import hashlib
+import json
+import os
+import tarfile
+import time
+
+from adb_script import ShellScript
+from config import GOLDEN_IMAGE_DIR
+from device_facts import get_device_facts, get_device_facts_async
+from modules.inject_app_db import APP_DB_SPECS
+from utils import run_adb, run_adb_async, run_blocking
+from tracing import traced
+
+# 包 -> 该包注入所用的数据文件 (data/ 目录下)，与数据库注入规格一致
+GOLDEN_PKGS = {pkg: spec["data"] for pkg, spec in APP_DB_SPECS.items()}
+GOLDEN_SUBDIRS = ("databases", "shared_prefs", "files")
+DEFAULT_NAME = "apps"
+REMOTE_CAPTURE_PATH = "/data/local/tmp/golden_capture.tar"
+OK_MARK = "__GOLDEN_OK__"
+
+# (路径, mtime) -> sha256，避免每台设备恢复前都重新计算
+_hash_cache = {}
+
+
+def _paths(name):
+    base = os.path.join(GOLDEN_IMAGE_DIR, name)
+    return base + ".tar", base + ".json"
+
+
+def _sha256(path):
+    key = (path, os.path.getmtime(path))
+    if key not in _hash_cache:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        _hash_cache[key] = h.hexdigest()
+    return _hash_cache[key]
+
+
+def _data_hash(filename):
+    path = os.path.join("data", filename)
+    return _sha256(path) if os.path.exists(path) else None
+
+# ==================== 采集 ====================
+
+def _capture_script(pkgs):
+    members = " ".join(f"{p}/{d}" for p in pkgs for d in GOLDEN_SUBDIRS)
+    script = ShellScript(stop_on_error=True)
+    script.add(f"for p in {' '.join(pkgs)}; do am force-stop $p; done", name="force-stop")
+    # 只打包存在的子目录，WAL 已随 force-stop 合并
+    script.add(f"cd /data/data && tar -cf {REMOTE_CAPTURE_PATH} $(for m in {members}; do [ -e $m ] && echo $m; done)",
+               name="tar")
+    return script
+
+
+def capture_golden_image(device_id, logger, pkgs=None, name=DEFAULT_NAME):
+    """从 device_id 采集镜像，成功返回清单 dict，失败返回 None"""
+    pkgs = list(pkgs or GOLDEN_PKGS)
+    logger.info(f">>> 采集黄金镜像 {name}: {', '.join(pkgs)} <<<")
+    facts = get_device_facts(device_id, logger)
+    installed = set(facts.packages(logger))
+    missing = [p for p in pkgs if p not in installed]
+    if missing:
+        logger.error(f"设备上未安装: {', '.join(missing)}，放弃采集。")
+        return None
+
+    steps = _capture_script(pkgs).run(device_id, logger)
+    if not all(s.ok for s in steps):
+        logger.error(f"打包失败: {steps[-1].stderr}")
+        return None
+
+    archive, manifest_path = _paths(name)
+    os.makedirs(GOLDEN_IMAGE_DIR, exist_ok=True)
+    try:
+        run_adb(device_id, ["pull", REMOTE_CAPTURE_PATH, archive + ".tmp"], logger=logger, check=True)
+    except Exception:
+        return None
+    finally:
+        run_adb(device_id, ["shell", f"rm -f {REMOTE_CAPTURE_PATH}"], logger=logger)
+
+    with tarfile.open(archive + ".tmp") as tar:
+        names = tar.getnames()
+    packages = {}
+    for pkg in pkgs:
+        subdirs = [d for d in GOLDEN_SUBDIRS if f"{pkg}/{d}" in names]
+        if "databases" not in subdirs:
+            logger.error(f"{pkg} 没有 databases 目录，请先在该设备上完成注入。")
+            os.remove(archive + ".tmp")
+            return None
+        data = GOLDEN_PKGS.get(pkg)
+        packages[pkg] = {"version": facts.version_code(pkg), "subdirs": subdirs,
+                         "data": data, "data_sha256": _data_hash(data) if data else None}
+    os.replace(archive + ".tmp", archive)
+
+    manifest = {
+        "name": name,
+        "source_device": device_id,
+        "captured_at": time.time(),
+        "size": os.path.getsize(archive),
+        "sha256": _sha256(archive),
+        "packages": packages,
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    logger.info(f"黄金镜像已保存: {archive} ({manifest['size'] / 1024:.1f} KiB, {len(names)} 个条目)")
+    return manifest
+
+# ==================== 恢复 ====================
+
+def load_manifest(name=DEFAULT_NAME):
+    _, manifest_path = _paths(name)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def unusable_reason(manifest, facts, name=DEFAULT_NAME):
+    """镜像不能用于该设备的原因；可用时返回 None"""
+    if not manifest:
+        return "没有镜像"
+    archive, _ = _paths(name)
+    if not os.path.exists(archive) or os.path.getsize(archive) != manifest.get("size"):
+        return "镜像文件缺失或大小不符"
+    if _sha256(archive) != manifest.get("sha256"):
+        return "镜像文件校验失败"
+    installed = set(facts.packages())
+    for pkg, info in manifest["packages"].items():
+        if pkg not in installed:
+            return f"{pkg} 未安装"
+        if str(facts.version_code(pkg)) != str(info.get("version")):
+            return f"{pkg} 版本 {facts.version_code(pkg)} 与镜像 ({info.get('version')}) 不一致"
+        if info.get("data") and _data_hash(info["data"]) != info.get("data_sha256"):
+            return f"data/{info['data']} 已变化"
+    return None
+
+
+def restore_command(manifest, uids):
+    """停止应用、清掉旧数据、从 stdin 解包、修正属主与 SELinux 标签，全部成功才输出 OK_MARK"""
+    pkgs = list(manifest["packages"])
+    old = " ".join(f"/data/data/{p}/{d}" for p in pkgs for d in GOLDEN_SUBDIRS)
+    parts = [f"for p in {' '.join(pkgs)}; do am force-stop $p; done", f"rm -rf {old}",
+             "tar -xf - -C /data/data"]
+    for pkg in pkgs:
+        parts.append(f"chown -R {uids[pkg]}:{uids[pkg]} /data/data/{pkg}")
+    parts.append(f"restorecon -R {' '.join(f'/data/data/{p}' for p in pkgs)}")
+    parts.append(f"echo {OK_MARK}")
+    return " && ".join(parts)
+
+
+def _usable(manifest, facts, logger, name):
+    """镜像可用于该设备 (要对镜像文件求 sha256，异步版本放到线程池)"""
+    reason = unusable_reason(manifest, facts, name)
+    if reason:
+        logger.info(f"黄金镜像不可用 ({reason})，使用常规流程。")
+        return False
+    return True
+
+
+def _prepare_restore(manifest, uids, logger):
+    if not all(uids.values()):
+        logger.warning("无法获取应用 UID，使用常规流程。")
+        return None
+    return restore_command(manifest, uids)
+
+
+def _check_restore(out, err, logger, manifest):
+    if OK_MARK not in (out or ""):
+        logger.error(f"黄金镜像恢复失败: {err or out}")
+        return False
+    logger.info(f"黄金镜像恢复完成: {', '.join(manifest['packages'])}")
+    return True
+
+
+@traced("injector")
+def restore_golden_image(device_id, logger, name=DEFAULT_NAME):
+    """一次 exec-in 恢复全部应用数据；镜像不可用或失败时返回 False"""
+    manifest = load_manifest(name)
+    facts = get_device_facts(device_id, logger)
+    if not _usable(manifest, facts, logger, name):
+        return False
+    uids = {p: facts.package_uid(p, logger) for p in manifest["packages"]}
+    cmd = _prepare_restore(manifest, uids, logger)
+    if not cmd:
+        return False
+    archive, _ = _paths(name)
+    out, err = run_adb(device_id, ["exec-in", cmd], logger=logger, stdin_path=archive)
+    return _check_restore(out, err, logger, manifest)
+
+
+@traced("injector")
+async def restore_golden_image_async(device_id, logger, name=DEFAULT_NAME):
+    manifest = await run_blocking(load_manifest, name)
+    facts = await get_device_facts_async(device_id, logger)
+    if not await run_blocking(_usable, manifest, facts, logger, name):
+        return False
+    uids = {p: await facts.package_uid_async(p, logger) for p in manifest["packages"]}
+    cmd = _prepare_restore(manifest, uids, logger)
+    if not cmd:
+        return False
+    archive, _ = _paths(name)
+    out, err = await run_adb_async(device_id, ["exec-in", cmd], logger=logger, stdin_path=archive)
+    return _check_restore(out, err, logger, manifest)
@@ -0,0 +1,709 @@
+# -*- coding: utf-8 -*-
+"""
+应用数据库注入引擎 (由 APP_DB_SPECS 描述，新增应用只需加一项配置)
+
+每个应用的流程相同:
+  1. 一次往返: force-stop + 授权 + 表结构指纹 + 目标表是否存在；
+  2. 库或表不存在时按 init 让应用自己建库 (引导页 / 启动后点一下)，以获得正确的 SELinux 上下文；
+  3. 产物缓存命中 (见 artifact_cache.py) 时直接推送；
+  4. 否则 pull 基准库 -> 本地一个事务内 DELETE + 预编译 INSERT (分批 executemany) -> 存入缓存 -> 推送；
+     缓存产物中 "$now" 类默认值写为固定的 CACHE_EPOCH，推送前在副本上换成当前时间 (见 rebase_now)；
+  5. 推送: push 到临时路径，一次往返内清 WAL、cat 覆盖 (保留原文件的 SELinux 标签)、chown。
+
+规格字段:
+  label / title    统计与日志中的简称 / 全称；log 为 logger 上下文
+  db_path / table  设备上的库文件与要写入的表；data 为 data/ 下的 JSON
+  recipe           写入逻辑版本，修改规格中影响写入内容的部分时递增以作废旧的缓存产物
+  grants           注入前授予的权限 (android.permission.*)
+  init             库不存在时的建库方式: "wizard" (走引导页) / "launch_tap" (启动后点击 init_tap 处)
+  columns          {列名: JSON 键}；passthrough=True 时 JSON 中其余与表列同名的键也原样写入
+  defaults         {列名: 默认值}，JSON 中没有该键时使用；"$now" / "$now_ms" 为当前时间，
+                   "$<列名>+N" 取同一行已确定的列值加 N (按声明顺序求值)
+  transforms       {列名: TRANSFORMS 中的转换名}
+  seed             {表名: [行, ...]}，该表为空时先写入 (例如外键依赖的默认分类)
+  chown_dir        推送后是否对整个 databases 目录 chown
+  bulk             批量生成时如何区分副本: text 中的键追加 " #k"，step 中的键 (非 0 时) 加 k * 步长
+表中不存在的列自动忽略，因此同一规格可覆盖应用的多个版本。
+
+压力测试: config.BULK_ROWS 中配置了行数的应用，以 JSON 条目为模板惰性生成该数量的行 (见 generate_items)，
+逐行流式写入，每 BULK_CHUNK_ROWS 行一次 executemany；离线建库时关闭 fsync、加大页缓存、独占锁。
+每个应用的写入行数与速率见 stats_table()。
+"""
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import artifact_cache
+import tracing
+from adb_script import ShellScript
+from config import (PKG_CALENDAR, DB_CALENDAR_PATH, PKG_TASKS, DB_TASKS_PATH, PKG_EXPENSE, DB_EXPENSE_PATH,
+                    BULK_ROWS, BULK_CHUNK_ROWS, BULK_CACHE_KB)
+from device_facts import get_device_facts, get_device_facts_async
+from input_batch import InputBatch
+from modules.wizards import init_app, init_app_async
+from readiness import wait_for, wait_for_async, focused_activity, file_exists
+from utils import run_adb, run_adb_async, run_blocking, load_json_data, setup_logger
+
+APP_DB_SPECS = {
+    PKG_CALENDAR: {
+        "label": "Calendar", "title": "Simple Calendar Pro", "log": "calendar",
+        "db_path": DB_CALENDAR_PATH, "table": "events", "data": "calendar.json", "recipe": "calendar-v3",
+        "grants": ["READ_CALENDAR", "WRITE_CALENDAR", "POST_NOTIFICATIONS"],
+        "init": "launch_tap", "init_tap": (0.85, 0.90),
+        "passthrough": True,
+        "columns": {},
+        "defaults": {
+            "event_type": 1,              # 必须对应 event_types 表中的 id
+            "last_updated": "$now",
+            "source": "imported-ics",
+            "repeat_interval": 0, "repeat_rule": 0, "repeat_limit": 0,
+            "reminder_1_minutes": -1, "reminder_2_minutes": -1, "reminder_3_minutes": -1,
+            "reminder_1_type": 0, "reminder_2_type": 0, "reminder_3_type": 0,
+            "repetition_exceptions": "[]",
+            "attendees": "",
+            "time_zone": "Asia/Shanghai",
+            "availability": 0, "color": 0, "import_id": "0", "flags": 0, "type": 0, "parent_id": 0,
+            "start_ts": "$now",
+            "end_ts": "$start_ts+3600",
+        },
+        # 补全默认分类，防止新安装设备打开详情闪退
+        "seed": {"event_types": [{"id": 1, "title": "Regular", "color": -11823966, "type": 0,
+                                  "caldav_calendar_id": 0, "caldav_display_name": "", "caldav_email": ""}]},
+        "chown_dir": True,
+        "bulk": {"text": ["title"], "step": {"start_ts": 3600, "end_ts": 3600}},
+    },
+    PKG_TASKS: {
+        "label": "Tasks", "title": "Tasks (Org.Tasks)", "log": "tasks",
+        "db_path": DB_TASKS_PATH, "table": "tasks", "data": "tasks.json", "recipe": "tasks-v3",
+        "init": "wizard",
+        "columns": {"title": "title", "importance": "importance", "dueDate": "dueDate", "notes": "notes",
+                    "completed": "completed"},
+        "defaults": {
+            "importance": 0, "dueDate": 0, "notes": "", "completed": 0, "deleted": 0,
+            "created": "$now_ms", "modified": "$now_ms",
+            "hideUntil": 0, "estimatedSeconds": 0, "elapsedSeconds": 0, "timerStart": 0,
+            "notificationFlags": 0, "lastNotified": 0, "recurrence": "", "repeat_from": 0,
+            "collapsed": 0, "parent": 0, "order": 0, "read_only": 0,
+        },
+        "bulk": {"text": ["title"], "step": {"dueDate": 3600 * 1000}},
+    },
+    PKG_EXPENSE: {
+        "label": "Expense", "title": "Expense (Pro Expense)", "log": "expense",
+        "db_path": DB_EXPENSE_PATH, "table": "expense", "data": "expense.json", "recipe": "expense-v2",
+        "init": "wizard",
+        "columns": {"name": "name", "amount": "amount", "category": "category", "note": "note",
+                    "created_date": "date", "modified_date": "date"},
+        "defaults": {"note": ""},
+        # APP 以分为单位存储金额 (100 代表 1.00)，否则显示为 1/100
+        "transforms": {"amount": "cents"},
+        "bulk": {"text": ["name"], "step": {"date": 3600 * 1000}},
+    },
+}
+
+
+def _to_cents(value):
+    try:
+        return int(float(value) * 100)
+    except (ValueError, TypeError):
+        return 0
+
+
+TRANSFORMS = {
+    "cents": _to_cents,
+    "int": lambda v: int(v or 0),
+}
+
+# 缓存产物中 "$now" / "$now_ms" 写入的固定时刻 (2000-01-01 UTC)，推送前换成当前时间
+CACHE_EPOCH = 946684800
+
+_TABLE_MARK = "__TABLE__"
+_NO_DB_MARK = "__NO_DB__"
+
+_lock = threading.Lock()
+_stats = {}   # label -> {"runs", "rows", "seconds"}
+
+
+def _temp_remote_path(pkg):
+    return f"/data/local/tmp/{pkg}_inject.db"
+
+# ==================== 本地写入 ====================
+
+def _resolve_default(value, row, now):
+    if not (isinstance(value, str) and value.startswith("$")):
+        return value
+    expr = value[1:]
+    if expr == "now":
+        return int(now)
+    if expr == "now_ms":
+        return int(now * 1000)
+    col, _, offset = expr.partition("+")
+    base = row.get(col)
+    return base + int(offset) if base is not None and offset else base
+
+
+def now_columns(spec):
+    """defaults 中由 "$now" / "$now_ms" 求得的列: {列名: (倍数, 偏移)}，列值 = int(now * 倍数) + 偏移"""
+    cols = {}
+    for col, value in spec.get("defaults", {}).items():
+        if not (isinstance(value, str) and value.startswith("$")):
+            continue
+        expr = value[1:]
+        if expr == "now":
+            cols[col] = (1, 0)
+        elif expr == "now_ms":
+            cols[col] = (1000, 0)
+        else:
+            base, _, offset = expr.partition("+")
+            if base in cols:
+                scale, base_offset = cols[base]
+                cols[col] = (scale, base_offset + int(offset or 0))
+    return cols
+
+
+def build_row(spec, item, now):
+    """JSON 条目 -> {列名: 值} (尚未按表结构过滤)"""
+    row = {}
+    if spec.get("passthrough"):
+        row.update({k: v for k, v in item.items() if not k.startswith("__")})
+    for col, key in spec.get("columns", {}).items():
+        row[col] = item.get(key)
+        if key not in item and col in spec.get("defaults", {}):
+            row.pop(col)
+    for col, value in spec.get("defaults", {}).items():
+        if col not in row:
+            row[col] = _resolve_default(value, row, now)
+    for col, name in spec.get("transforms", {}).items():
+        row[col] = TRANSFORMS[name](row.get(col))
+    return row
+
+
+def _table_columns(cursor, table):
+    return [r[1] for r in cursor.execute(f'PRAGMA table_info("{table}")')]
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def generate_items(spec, items, total):
+    """以 items 为模板循环惰性生成 total 条；第 k 轮 (k >= 1) 的副本按规格中的 bulk 区分"""
+    bulk = spec.get("bulk", {})
+    text, step = bulk.get("text", ()), bulk.get("step", {})
+    for i in range(total):
+        k, item = i // len(items), items[i % len(items)]
+        if k:
+            item = dict(item)
+            for key in text:
+                if item.get(key) is not None:
+                    item[key] = f"{item[key]} #{k}"
+            for key, delta in step.items():
+                if item.get(key):
+                    item[key] += k * delta
+        yield item
+
+
+def _insert_many(cursor, table, rows, valid, chunk=BULK_CHUNK_ROWS):
+    """
+    流式写入: 每种列组合只算一次与表列的交集并生成一条预编译 INSERT，
+    攒够 chunk 行执行一次 executemany；缺失的列交给表的默认值。返回写入行数
+    """
+    statements = {}   # 行的键 -> (写入列, SQL)
+    pending = {}      # SQL -> 待写入的值
+    count = 0
+    for row in rows:
+        keys = tuple(row)
+        if keys not in statements:
+            cols = tuple(c for c in keys if c in valid)
+            sql = f'INSERT INTO "{table}" ({", ".join(_quote(c) for c in cols)}) VALUES ({", ".join("?" * len(cols))})'
+            statements[keys] = (cols, sql)
+        cols, sql = statements[keys]
+        values = pending.setdefault(sql, [])
+        values.append(tuple(row[c] for c in cols))
+        if len(values) >= chunk:
+            cursor.executemany(sql, values)
+            values.clear()
+        count += 1
+    for sql, values in pending.items():
+        if values:
+            cursor.executemany(sql, values)
+    return count
+
+
+def tune_offline(cursor):
+    """只作用于本次连接: 离线建库不需要 fsync，失败时库文件直接丢弃重新 pull"""
+    cursor.execute("PRAGMA synchronous=OFF;")
+    cursor.execute(f"PRAGMA cache_size=-{BULK_CACHE_KB};")
+    cursor.execute("PRAGMA locking_mode=EXCLUSIVE;")
+    cursor.execute("PRAGMA temp_store=MEMORY;")
+
+
+def record_write(label, rows, seconds):
+    with _lock:
+        s = _stats.setdefault(label, {"runs": 0, "rows": 0, "seconds": 0.0})
+        s["runs"] += 1
+        s["rows"] += rows
+        s["seconds"] += seconds
+
+
+def write_rows(db_file, spec, items, logger, now=None):
+    """在一个事务内清空目标表并写入 items (可以是生成器)，返回写入行数；失败返回 None。now 缺省为当前时间"""
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        # 合并 WAL (防止推送后数据回滚或损坏)
+        cursor.execute("PRAGMA journal_mode=DELETE;")
+        tune_offline(cursor)
+        valid = set(_table_columns(cursor, spec["table"]))
+        if not valid:
+            logger.error(f"无法读取 {spec['table']} 表结构，数据库可能损坏")
+            return None
+        now = time.time() if now is None else now
+        rows = (build_row(spec, item, now) for item in items)
+
+        start = time.perf_counter()
+        cursor.execute("BEGIN")
+        for table, seed_rows in spec.get("seed", {}).items():
+            seed_valid = set(_table_columns(cursor, table))
+            if not seed_valid:
+                logger.warning(f"没有 {table} 表，跳过默认数据")
+                continue
+            if cursor.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0] == 0:
+                logger.info(f"补全 {table} 表 (插入默认数据)...")
+                _insert_many(cursor, table, seed_rows, seed_valid)
+        cursor.execute(f'DELETE FROM "{spec["table"]}"')
+        count = _insert_many(cursor, spec["table"], rows, valid)
+        cursor.execute("COMMIT")
+        seconds = time.perf_counter() - start
+        record_write(spec["label"], count, seconds)
+        logger.info(f"写入 {spec['table']} 表 {count} 行，用时 {seconds:.2f}s ({count / max(seconds, 1e-6):.0f} 行/秒)")
+        return count
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        logger.error(f"SQL执行致命错误: {e}", exc_info=True)
+        return None
+    finally:
+        conn.close()
+
+def rebase_now(db_file, spec, now):
+    """把按 CACHE_EPOCH 写入的 "$now" 类列换成 now，返回更新的行数 (JSON 中显式给出的值不受影响)"""
+    table = spec["table"]
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        valid = set(_table_columns(cursor, table))
+        count = 0
+        cursor.execute("BEGIN")
+        for col, (scale, offset) in now_columns(spec).items():
+            if col in valid:
+                cursor.execute(f'UPDATE "{table}" SET {_quote(col)} = ? WHERE {_quote(col)} = ?',
+                               (int(now * scale) + offset, int(CACHE_EPOCH * scale) + offset))
+                count += cursor.rowcount
+        cursor.execute("COMMIT")
+        return count
+    finally:
+        conn.close()
+
+# ==================== 设备端命令 ====================
+
+def _table_command(spec):
+    db, table = spec["db_path"], spec["table"]
+    return (f"if [ -f {db} ]; then sqlite3 {db} \"SELECT '{_TABLE_MARK}' || count(*) FROM sqlite_master "
+            f"WHERE type='table' AND name='{table}';\"; else echo {_NO_DB_MARK}; fi")
+
+
+def _prep_script(pkg, spec):
+    # force-stop、授权、表结构指纹与目标表检查合并为一次往返
+    prep = ShellScript()
+    prep.add(f"am force-stop {pkg}")
+    for p in spec.get("grants", []):
+        prep.add(f"pm grant {pkg} android.permission.{p}", name=f"grant {p}")
+    prep.add(_table_command(spec), name="table")
+    if artifact_cache.enabled():
+        prep.add(artifact_cache.schema_command(spec["db_path"]), name="schema")
+    return prep
+
+
+def _check_script(spec):
+    check = ShellScript()
+    check.add(_table_command(spec), name="table")
+    if artifact_cache.enabled():
+        check.add(artifact_cache.schema_command(spec["db_path"]), name="schema")
+    return check
+
+
+def _step_out(results, name):
+    return next((r.stdout for r in results if r.name == name), None)
+
+
+def _db_ready(results):
+    """库与目标表都存在；设备上没有 sqlite3 (查不到结果) 时只要库文件存在就交给本地校验"""
+    out = _step_out(results, "table") or ""
+    if _NO_DB_MARK in out:
+        return False
+    if _TABLE_MARK in out:
+        count = out.split(_TABLE_MARK, 1)[1].split()
+        return bool(count) and count[0].isdigit() and int(count[0]) > 0
+    return True
+
+
+def _finish_script(spec, uid):
+    # 清理 WAL + 覆盖 + 修正属主，一次往返完成
+    db, tmp = spec["db_path"], spec["tmp_path"]
+    finish = ShellScript()
+    finish.add(f"rm -f {db}-wal {db}-shm")
+    finish.add(f"cat {tmp} > {db}", name="overwrite")
+    finish.add(f"rm {tmp}")
+    if uid:
+        finish.add(f"chown {uid}:{uid} {db}")
+        if spec.get("chown_dir"):
+            finish.add(f"chown -R {uid}:{uid} {os.path.dirname(db)}")
+    return finish
+
+
+def _check_overwrite(results, logger):
+    overwrite = next(r for r in results if r.name == "overwrite")
+    if not overwrite.ok:
+        logger.error(f"写入失败: {overwrite.stderr or overwrite.stdout}")
+        return False
+    return True
+
+
+def _cache_key(pkg, spec, facts, schema_fp):
+    return artifact_cache.cache_key(pkg, facts.version_code(pkg), schema_fp, spec["data"], spec["recipe"])
+
+
+def _reset_local_dir(temp_dir, pkg, device_id):
+    local_db_dir = os.path.join(temp_dir, f"{pkg}_{device_id}")
+    if os.path.exists(local_db_dir):
+        shutil.rmtree(local_db_dir)
+    os.makedirs(local_db_dir, exist_ok=True)
+    return local_db_dir
+
+
+def _find_local_db(local_db_dir, spec):
+    name = os.path.basename(spec["db_path"])
+    for root, dirs, files in os.walk(local_db_dir):
+        if name in files:
+            return os.path.join(root, name)
+    return None
+
+
+def _stage_cached(cached, pkg, spec, temp_dir, device_id):
+    """缓存产物含 "$now" 类列时复制到本地目录并换成当前时间，返回要推送的文件"""
+    if not now_columns(spec):
+        return cached
+    local_db = os.path.join(_reset_local_dir(temp_dir, pkg, device_id), os.path.basename(spec["db_path"]))
+    shutil.copyfile(cached, local_db)
+    rebase_now(local_db, spec, time.time())
+    return local_db
+
+
+def _write_for_cache(local_db, pkg, key, spec, items, logger):
+    """本地写入并存入缓存；缓存的副本中 "$now" 类列为 CACHE_EPOCH，本次推送的库换成当前时间"""
+    fixed = bool(key and now_columns(spec))
+    count = write_rows(local_db, spec, items, logger, now=CACHE_EPOCH if fixed else None)
+    if count is None:
+        logger.error("本地数据库修改失败")
+        return None
+    artifact_cache.store(pkg, key, local_db)
+    if fixed:
+        rebase_now(local_db, spec, time.time())
+    return count
+
+
+def verify_table_exists(db_path, table_name):
+    if not db_path or not os.path.exists(db_path):
+        return False
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            cnt = conn.execute("SELECT count(*) FROM sqlite_master WHERE type='table' AND name=?",
+                               (table_name,)).fetchone()[0]
+        finally:
+            conn.close()
+        return cnt > 0
+    except sqlite3.Error:
+        return False
+
+
+def _spec(pkg):
+    spec = dict(APP_DB_SPECS[pkg])
+    spec["tmp_path"] = _temp_remote_path(pkg)
+    spec["rows"] = BULK_ROWS.get(pkg, 0)
+    if spec["rows"]:
+        # 生成的行数不同，产物也不同
+        spec["recipe"] = f"{spec['recipe']}+bulk{spec['rows']}"
+    return spec
+
+
+def _load_items(spec, logger):
+    """返回 (条目, 条数)；配置了 BULK_ROWS 时条目为生成器"""
+    items = load_json_data(spec["data"])
+    if not items or not spec["rows"]:
+        return items, len(items or [])
+    logger.info(f"批量模式: 以 {len(items)} 条为模板生成 {spec['rows']} 条")
+    return generate_items(spec, items, spec["rows"]), spec["rows"]
+
+
+def write_stats():
+    """每个应用本地写库的次数、行数与耗时"""
+    with _lock:
+        return {k: dict(v) for k, v in _stats.items()}
+
+
+def stats_table():
+    rows = write_stats()
+    header = f"{'db write':<14}{'runs':>6}{'rows':>11}{'seconds':>10}{'rows/s':>11}"
+    lines = [header, "-" * len(header)]
+    for label, s in sorted(rows.items()):
+        rate = s["rows"] / s["seconds"] if s["seconds"] else 0.0
+        lines.append(f"{label:<14}{s['runs']:>6}{s['rows']:>11}{s['seconds']:>10.2f}{rate:>11.0f}")
+    return "\n".join(lines)
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+# ==================== 同步 ====================
+
+def _launch_tap(device_id, pkg, spec, logger):
+    """启动应用并在 init_tap 处点击一次，等待建库"""
+    label = spec["label"]
+    run_adb(device_id, ["shell", "monkey", "-p", pkg, "-c", "android.intent.category.LAUNCHER", "1"], logger=logger)
+    wait_for(device_id, f"{label} launch", focused_activity(pkg), timeout=9, budget=3, settle=0.5, logger=logger)
+    width, height = get_device_facts(device_id, logger).screen_size(logger)
+    x_pct, y_pct = spec["init_tap"]
+    logger.debug(f"点击坐标: {int(width * x_pct)},{int(height * y_pct)}")
+    InputBatch().tap_percent(x_pct, y_pct, width, height).run(device_id, logger)
+    wait_for(device_id, f"{label} db", file_exists(spec["db_path"]), timeout=9, budget=3, logger=logger)
+    InputBatch().key("BACK").run(device_id, logger)
+
+
+def _create_db(device_id, pkg, spec, logger):
+    """让应用自己建库，返回库与表是否已就绪以及新的表结构查询结果"""
+    logger.info("触发应用建库流程...")
+    if spec["init"] == "launch_tap":
+        _launch_tap(device_id, pkg, spec, logger)
+    else:
+        init_app(device_id, pkg, logger)
+    run_adb(device_id, ["shell", "am", "force-stop", pkg], logger=logger)
+    if not wait_for(device_id, f"{spec['label']} db check", file_exists(spec["db_path"]), timeout=3, budget=1,
+                    logger=logger):
+        return False, []
+    results = _check_script(spec).run(device_id, logger)
+    return _db_ready(results), results
+
+
+def _deploy(device_id, pkg, spec, db_file, facts, logger):
+    run_adb(device_id, ["push", db_file, spec["tmp_path"]], logger=logger, check=True)
+    results = _finish_script(spec, facts.package_uid(pkg, logger)).run(device_id, logger)
+    return _check_overwrite(results, logger)
+
+
+def _pull(device_id, pkg, spec, temp_dir, logger):
+    local_db_dir = _reset_local_dir(temp_dir, pkg, device_id)
+    run_adb(device_id, ["pull", os.path.dirname(spec["db_path"]), local_db_dir], logger=logger)
+    return _find_local_db(local_db_dir, spec)
+
+
+def _build(device_id, pkg, spec, temp_dir, items, facts, key, logger):
+    """pull 基准库 -> 本地写入 -> 按 key (与 lookup 登记的是同一个) 存入产物缓存 -> push"""
+    logger.info("拉取基准数据库...")
+    local_db = _pull(device_id, pkg, spec, temp_dir, logger)
+    if not verify_table_exists(local_db, spec["table"]):
+        logger.warning(f"{spec['label']} DB 不完整，重新建库...")
+        _create_db(device_id, pkg, spec, logger)
+        local_db = _pull(device_id, pkg, spec, temp_dir, logger)
+        if not verify_table_exists(local_db, spec["table"]):
+            logger.error(f"{spec['label']} 初始化失败，跳过。")
+            return None
+
+    count = _write_for_cache(local_db, pkg, key, spec, items, logger)
+    if count is None:
+        return None
+    return count if _deploy(device_id, pkg, spec, local_db, facts, logger) else None
+
+
+def inject_app_db(device_id, temp_dir, logger, pkg):
+    """按 APP_DB_SPECS[pkg] 注入应用数据库，成功返回 True"""
+    spec = _spec(pkg)
+    label = spec["label"]
+    with tracing.span(device_id, f"inject {label}", cat="injector") as sp:
+        ok = _inject(device_id, temp_dir, logger, pkg, spec)
+        sp.set(ok=ok)
+        return ok
+
+
+def _inject(device_id, temp_dir, logger, pkg, spec):
+    label = spec["label"]
+    logger.info(f">>> 注入 {spec['title']} 数据 <<<")
+    items, total = _load_items(spec, logger)
+    if not total:
+        logger.error(f"无 {label} 数据，跳过注入。")
+        return False
+
+    facts = get_device_facts(device_id, logger)
+    results = _prep_script(pkg, spec).run(device_id, logger)
+    if not _db_ready(results):
+        logger.warning("未检测到数据库，正在初始化以获取正确的 SELinux 上下文...")
+        ready, results = _create_db(device_id, pkg, spec, logger)
+        if not ready:
+            logger.error("初始化失败：无法生成基准数据库。")
+            return False
+
+    key = _cache_key(pkg, spec, facts, artifact_cache.parse_schema(_step_out(results, "schema")))
+    # 其他设备正在构建同一产物时先等待，随后直接推送
+    cached = artifact_cache.lookup(pkg, key, device_id)
+    if cached:
+        try:
+            with artifact_cache.fanout(key):
+                db_file = _stage_cached(cached, pkg, spec, temp_dir, device_id)
+                ok = _deploy(device_id, pkg, spec, db_file, facts, logger)
+            if ok:
+                logger.info(f"{label} 数据注入完成 (缓存产物, {total} 条)。")
+                return True
+            logger.warning("推送缓存产物失败，改为常规注入。")
+        except Exception as e:
+            logger.warning(f"推送缓存产物失败，改为常规注入: {e}")
+
+    try:
+        count = _build(device_id, pkg, spec, temp_dir, items, facts, key, logger)
+    except Exception as e:
+        logger.error(f"{label} 注入异常: {e}", exc_info=True)
+        return False
+    finally:
+        artifact_cache.release(key, device_id)
+    if count is None:
+        return False
+    logger.info(f"{label} 数据注入完成 ({count} 条)。")
+    return True
+
+
+def inject_all(device_id, temp_dir, loggers=None):
+    """依次注入全部规格中的应用；loggers 为 {包名: logger}，缺省按规格中的 log 创建"""
+    loggers = loggers or {}
+    return {pkg: inject_app_db(device_id, temp_dir, loggers.get(pkg) or setup_logger(device_id, spec["log"]), pkg)
+            for pkg, spec in APP_DB_SPECS.items()}
+
+# ==================== 异步 ====================
+
+async def _launch_tap_async(device_id, pkg, spec, logger):
+    label = spec["label"]
+    await run_adb_async(device_id, ["shell", "monkey", "-p", pkg, "-c", "android.intent.category.LAUNCHER", "1"],
+                        logger=logger)
+    await wait_for_async(device_id, f"{label} launch", focused_activity(pkg), timeout=9, budget=3, settle=0.5,
+                         logger=logger)
+    facts = await get_device_facts_async(device_id, logger)
+    width, height = facts.screen_size(logger)
+    x_pct, y_pct = spec["init_tap"]
+    logger.debug(f"点击坐标: {int(width * x_pct)},{int(height * y_pct)}")
+    await InputBatch().tap_percent(x_pct, y_pct, width, height).run_async(device_id, logger)
+    await wait_for_async(device_id, f"{label} db", file_exists(spec["db_path"]), timeout=9, budget=3, logger=logger)
+    await InputBatch().key("BACK").run_async(device_id, logger)
+
+
+async def _create_db_async(device_id, pkg, spec, logger):
+    logger.info("触发应用建库流程...")
+    if spec["init"] == "launch_tap":
+        await _launch_tap_async(device_id, pkg, spec, logger)
+    else:
+        await init_app_async(device_id, pkg, logger)
+    await run_adb_async(device_id, ["shell", "am", "force-stop", pkg], logger=logger)
+    if not await wait_for_async(device_id, f"{spec['label']} db check", file_exists(spec["db_path"]), timeout=3,
+                                budget=1, logger=logger):
+        return False, []
+    results = await _check_script(spec).run_async(device_id, logger)
+    return _db_ready(results), results
+
+
+async def _deploy_async(device_id, pkg, spec, db_file, facts, logger):
+    await run_adb_async(device_id, ["push", db_file, spec["tmp_path"]], logger=logger, check=True)
+    results = await _finish_script(spec, await facts.package_uid_async(pkg, logger)).run_async(device_id, logger)
+    return _check_overwrite(results, logger)
+
+
+async def _pull_async(device_id, pkg, spec, temp_dir, logger):
+    local_db_dir = _reset_local_dir(temp_dir, pkg, device_id)
+    await run_adb_async(device_id, ["pull", os.path.dirname(spec["db_path"]), local_db_dir], logger=logger)
+    return _find_local_db(local_db_dir, spec)
+
+
+async def _build_async(device_id, pkg, spec, temp_dir, items, facts, key, logger):
+    logger.info("拉取基准数据库...")
+    local_db = await _pull_async(device_id, pkg, spec, temp_dir, logger)
+    if not verify_table_exists(local_db, spec["table"]):
+        logger.warning(f"{spec['label']} DB 不完整，重新建库...")
+        await _create_db_async(device_id, pkg, spec, logger)
+        local_db = await _pull_async(device_id, pkg, spec, temp_dir, logger)
+        if not verify_table_exists(local_db, spec["table"]):
+            logger.error(f"{spec['label']} 初始化失败，跳过。")
+            return None
+
+    # 批量模式下本地写库耗时较长，放到线程池中执行，不阻塞其他设备
+    count = await run_blocking(_write_for_cache, local_db, pkg, key, spec, items, logger)
+    if count is None:
+        return None
+    return count if await _deploy_async(device_id, pkg, spec, local_db, facts, logger) else None
+
+
+async def inject_app_db_async(device_id, temp_dir, logger, pkg):
+    spec = _spec(pkg)
+    with tracing.span(device_id, f"inject {spec['label']}", cat="injector") as sp:
+        ok = await _inject_async(device_id, temp_dir, logger, pkg, spec)
+        sp.set(ok=ok)
+        return ok
+
+
+async def _inject_async(device_id, temp_dir, logger, pkg, spec):
+    label = spec["label"]
+    logger.info(f">>> 注入 {spec['title']} 数据 <<<")
+    items, total = _load_items(spec, logger)
+    if not total:
+        logger.error(f"无 {label} 数据，跳过注入。")
+        return False
+
+    facts = await get_device_facts_async(device_id, logger)
+    results = await _prep_script(pkg, spec).run_async(device_id, logger)
+    if not _db_ready(results):
+        logger.warning("未检测到数据库，正在初始化以获取正确的 SELinux 上下文...")
+        ready, results = await _create_db_async(device_id, pkg, spec, logger)
+        if not ready:
+            logger.error("初始化失败：无法生成基准数据库。")
+            return False
+
+    key = _cache_key(pkg, spec, facts, artifact_cache.parse_schema(_step_out(results, "schema")))
+    cached = await artifact_cache.lookup_async(pkg, key, device_id)
+    if cached:
+        try:
+            with artifact_cache.fanout(key):
+                db_file = await run_blocking(_stage_cached, cached, pkg, spec, temp_dir, device_id)
+                ok = await _deploy_async(device_id, pkg, spec, db_file, facts, logger)
+            if ok:
+                logger.info(f"{label} 数据注入完成 (缓存产物, {total} 条)。")
+                return True
+            logger.warning("推送缓存产物失败，改为常规注入。")
+        except Exception as e:
+            logger.warning(f"推送缓存产物失败，改为常规注入: {e}")
+
+    try:
+        count = await _build_async(device_id, pkg, spec, temp_dir, items, facts, key, logger)
+    except Exception as e:
+        logger.error(f"{label} 注入异常: {e}", exc_info=True)
+        return False
+    finally:
+        artifact_cache.release(key, device_id)
+    if count is None:
+        return False
+    logger.info(f"{label} 数据注入完成 ({count} 条)。")
+    return True
+
+
+async def inject_all_async(device_id, temp_dir, loggers=None):
+    loggers = loggers or {}
+    return {pkg: await inject_app_db_async(device_id, temp_dir,
+                                           loggers.get(pkg) or setup_logger(device_id, spec["log"]), pkg)
+            for pkg, spec in APP_DB_SPECS.items()}
@@ -1,52 +1,186 @@
 # -*- coding: utf-8 -*-
+"""
+通用文件注入 (data/files_manifest.json)
+
+整个清单打成一个 tar 流，一次 `adb exec-in` 在设备上解包，代替每个文件 mkdir -p / push / touch -t 三次往返:
+  - 成员路径相对于所有目标目录的公共根目录，解包时由 tar 建立目录结构；
+  - touch_time 按设备时区 (逐个时刻处理夏令时) 换算后写入成员头的 mtime，解包时由 tar 还原，
+    没有 touch_time 的文件沿用本地 mtime。
+归档直接从源文件写入临时文件 (exec-in 从文件读取 stdin)，不复制源文件。
+解包失败时退回逐个文件 push；两种方式都只在写入完成后刷新一次媒体库。
+"""
+import datetime
 import os
-from utils import run_adb, load_json_data
+import posixpath
+import tarfile
+import tempfile
+import threading
+import time
 
-def inject_files_from_manifest(device_id, temp_dir, logger):
-    logger.info(">>> 注入通用文件 (Source -> Device) <<<")
-    
-    # 读取 data/files_manifest.json
-    manifest = load_json_data("files_manifest.json")
-    if not manifest:
-        logger.warning("未找到文件清单 files_manifest.json，跳过文件注入。")
-        return
+from device_facts import get_device_facts, get_device_facts_async
+from utils import run_adb, run_adb_async, run_blocking, load_json_data
+from tracing import traced
 
+MEDIA_SCAN_CMD = "am broadcast -a android.intent.action.MEDIA_SCANNER_SCAN_FILE -d file:///sdcard/"
+OK_MARK = "__FILES_OK__"
+
+def _iter_manifest(manifest, logger):
+    """遍历清单，生成 (本地源文件, 远程路径, 元数据)，缺失的源文件会被跳过"""
     for item in manifest:
         src_rel = item.get("source")
         remote_path = item.get("remote_path")
         metadata = item.get("metadata", {})
-        
+
         if not src_rel or not remote_path:
             continue
-            
+
         # 本地 source 目录
         src_path = os.path.join("source", src_rel)
-        
+
         # 特殊处理：如果是 installer.zip 且需要生成大小
         if "installer.zip" in src_rel and metadata.get("size_mb") and not os.path.exists(src_path):
             logger.info(f"生成虚拟文件: {src_path}")
             os.makedirs(os.path.dirname(src_path), exist_ok=True)
             size = metadata["size_mb"] * 1024 * 1024
-            with open(src_path, "wb") as f: f.write(os.urandom(size))
+            # 先写临时文件再改名，并行的其他设备不会读到写了一半的文件
+            tmp = f"{src_path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f: f.write(os.urandom(size))
+            os.replace(tmp, src_path)
 
         if not os.path.exists(src_path):
             logger.warning(f"源文件缺失: {src_path} -> {remote_path}")
             continue
-            
+
+        yield src_path, remote_path, metadata
+
+def touch_mtime(ts, tz):
+    """touch -t 的 [[CC]YY]MMDDhhmm[.ss] -> epoch 秒 (按设备时区 tz，见 DeviceFacts.tzinfo)；无法解析返回 None"""
+    ts = str(ts)
+    stamp, _, sec = ts.partition(".")
+    if not stamp.isdigit() or len(stamp) not in (8, 10, 12) or (sec and not sec.isdigit()):
+        return None
+    if len(stamp) == 8:
+        stamp = time.strftime("%Y") + stamp
+    elif len(stamp) == 10:
+        # 两位年份与 touch 一致: 69-99 -> 19xx, 00-68 -> 20xx
+        stamp = ("19" if int(stamp[:2]) >= 69 else "20") + stamp
+    try:
+        st = time.strptime(stamp + (sec or "00"), "%Y%m%d%H%M%S")
+    except ValueError:
+        return None
+    # 查不到设备时区时按主机时区换算
+    if tz is None:
+        return int(time.mktime(st))
+    return int(datetime.datetime(*st[:6], tzinfo=tz).timestamp())
+
+def _extract_root(entries):
+    """所有目标文件所在目录的公共根目录"""
+    return posixpath.commonpath([posixpath.dirname(remote) for _, remote, _ in entries])
+
+def build_archive(entries, root, tz, logger):
+    """把 (源文件, 远程路径, 元数据) 写成一个 tar (成员路径相对 root)，返回 (临时文件路径, 字节数)，调用方删除"""
+    fd, path = tempfile.mkstemp(prefix="files_", suffix=".tar")
+    os.close(fd)
+    size = 0
+    with tarfile.open(path, "w") as tar:
+        for src_path, remote_path, metadata in entries:
+            info = tar.gettarinfo(src_path, arcname=posixpath.relpath(remote_path, root))
+            info.uid = info.gid = 0
+            info.uname = info.gname = ""
+            info.mtime = int(info.mtime)
+            if "touch_time" in metadata:
+                mtime = touch_mtime(metadata["touch_time"], tz)
+                if mtime is None:
+                    logger.warning(f"无法解析 touch_time {metadata['touch_time']}: {remote_path}")
+                else:
+                    info.mtime = mtime
+            with open(src_path, "rb") as f:
+                tar.addfile(info, f)
+            size += info.size
+    return path, size
+
+def extract_command(root):
+    """建根目录、从 stdin 解包 (不还原属主)，成功后输出 OK_MARK 并刷新媒体库 (失败时由逐个 push 的路径刷新)"""
+    return f"mkdir -p {root} && tar -xof - -C {root} && echo {OK_MARK} && {MEDIA_SCAN_CMD} > /dev/null"
+
+def _check_extract(out, err, count, size, start, logger):
+    if OK_MARK not in (out or ""):
+        logger.error(f"文件解包失败: {err or out}")
+        return False
+    seconds = time.perf_counter() - start
+    logger.info(f"一次 exec-in 写入 {count} 个文件 ({size / 1024 / 1024:.1f} MiB)，用时 {seconds:.2f}s "
+                f"({size / 1024 / 1024 / max(seconds, 1e-6):.1f} MiB/s)")
+    return True
+
+def _load_entries(logger):
+    # 读取 data/files_manifest.json
+    manifest = load_json_data("files_manifest.json")
+    if not manifest:
+        logger.warning("未找到文件清单 files_manifest.json，跳过文件注入。")
+        return []
+    return list(_iter_manifest(manifest, logger))
+
+def _push_commands(entries):
+    """逐个文件 mkdir -p / push / touch -t 的 adb 命令，最后刷新媒体库"""
+    for src_path, remote_path, metadata in entries:
         # 创建远程目录
-        remote_dir = os.path.dirname(remote_path)
-        run_adb(device_id, ["shell", f"mkdir -p {remote_dir}"], logger=logger)
-        
+        yield ["shell", f"mkdir -p {os.path.dirname(remote_path)}"]
         # 推送文件
-        run_adb(device_id, ["push", src_path, remote_path], logger=logger)
-        
-        # 处理元数据 (修改时间戳)
+        yield ["push", src_path, remote_path]
+        # 处理元数据 (修改时间戳): touch -t [[CC]YY]MMDDhhmm[.ss]
         if "touch_time" in metadata:
-            # touch -t [[CC]YY]MMDDhhmm[.ss]
-            ts = metadata["touch_time"]
-            run_adb(device_id, ["shell", f"touch -t {ts} {remote_path}"], logger=logger)
-            
-    # 刷新媒体库
-    logger.info("刷新媒体扫描...")
-    run_adb(device_id, ["shell", "am broadcast -a android.intent.action.MEDIA_SCANNER_SCAN_FILE -d file:///sdcard/"], logger=logger)
-    logger.info("文件注入完成。")
\ No newline at end of file
+            yield ["shell", f"touch -t {metadata['touch_time']} {remote_path}"]
+    yield ["shell", MEDIA_SCAN_CMD]
+
+def _push_each(device_id, entries, logger):
+    for cmd in _push_commands(entries):
+        run_adb(device_id, cmd, logger=logger)
+
+@traced("injector")
+def inject_files_from_manifest(device_id, temp_dir, logger):
+    logger.info(">>> 注入通用文件 (Source -> Device) <<<")
+
+    entries = _load_entries(logger)
+    if not entries:
+        return
+
+    start = time.perf_counter()
+    root = _extract_root(entries)
+    tz = get_device_facts(device_id, logger).tzinfo(logger)
+    archive, size = build_archive(entries, root, tz, logger)
+    try:
+        out, err = run_adb(device_id, ["exec-in", extract_command(root)], logger=logger, stdin_path=archive)
+    finally:
+        os.remove(archive)
+    if not _check_extract(out, err, len(entries), size, start, logger):
+        logger.warning("改为逐个文件 push，完成后刷新媒体扫描。")
+        _push_each(device_id, entries, logger)
+    logger.info("文件注入完成。")
+
+async def _push_each_async(device_id, entries, logger):
+    for cmd in _push_commands(entries):
+        await run_adb_async(device_id, cmd, logger=logger)
+
+@traced("injector")
+async def inject_files_from_manifest_async(device_id, temp_dir, logger):
+    """inject_files_from_manifest 的 asyncio 版本"""
+    logger.info(">>> 注入通用文件 (Source -> Device) <<<")
+
+    # 可能生成数 MB 的虚拟文件，与打包一样放到线程池
+    entries = await run_blocking(_load_entries, logger)
+    if not entries:
+        return
+
+    start = time.perf_counter()
+    root = _extract_root(entries)
+    facts = await get_device_facts_async(device_id, logger)
+    archive, size = await run_blocking(build_archive, entries, root, await facts.tzinfo_async(logger), logger)
+    try:
+        out, err = await run_adb_async(device_id, ["exec-in", extract_command(root)], logger=logger,
+                                       stdin_path=archive)
+    finally:
+        os.remove(archive)
+    if not _check_extract(out, err, len(entries), size, start, logger):
+        logger.warning("改为逐个文件 push，完成后刷新媒体扫描。")
+        await _push_each_async(device_id, entries, logger)
+    logger.info("文件注入完成。")
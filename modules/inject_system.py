@@ -1,10 +1,21 @@
 # modules/inject_system.py
 # -*- coding: utf-8 -*-
+import math
+import os
+import shutil
+import sqlite3
 import time
 import re
-from utils import run_adb
-from config import PKG_TELEPHONY
-from utils import run_adb, load_json_data # 导入 load_json_data
+import artifact_cache
+from config import (PKG_TELEPHONY, PKG_CONTACTS, PKG_CONTACTS_STORAGE, SMS_HOST_BUILD, CONTACTS_BULK, BULK_ROWS,
+                    BULK_CHUNK_ROWS)
+from device_facts import get_device_facts, get_device_facts_async
+from modules.inject_app_db import generate_items, tune_offline, record_write
+from utils import run_adb, run_adb_async, run_blocking, load_json_data # 导入 load_json_data
+from tracing import traced
+from adb_script import ShellScript
+from sql_script import SqlScript
+from readiness import wait_for, wait_for_async, focused_activity, process_alive, tables_exist
 
 # ==============================================================================
 # 配置与常量
@@ -15,32 +26,37 @@ REMOTE_DB_DIR = f"/data/data/{PKG_TELEPHONY}/databases"
 REMOTE_DB_PATH = f"{REMOTE_DB_DIR}/mmssms.db"
 PKG_PHONE = "com.android.phone"
 PKG_MSG = "com.google.android.apps.messaging"
+REQUIRED_TABLES = ['sms', 'threads', 'canonical_addresses']
+# 重建后等待建库的上限 (秒)
+REBUILD_TIMEOUT = 15
 
 # ==============================================================================
 # 基础工具
 # ==============================================================================
 
+def _single_sql(sql, query=False):
+    # 单条语句也走 SqlScript: 经 stdin 送入 sqlite3，不需要 shell 转义
+    script = SqlScript(REMOTE_DB_PATH, transaction=False)
+    return script.query("result", sql) if query else script.exec(sql)
+
+def _query_text(result):
+    if not result.ok:
+        return None
+    return "\n".join("|".join(row) for row in result.rows("result")) or None
+
 def db_exec(device_id, sql, logger):
     """通过 ADB 在设备上直接执行 SQL"""
-    safe_sql = sql.replace('"', '\\"')
-    cmd = f"sqlite3 {REMOTE_DB_PATH} \"{safe_sql}\""
-    out, err = run_adb(device_id, ["shell", cmd], logger=logger)
-    if "Error" in (out or "") or "Error" in (err or ""):
-        logger.error(f"SQL Error: {err or out} | SQL: {sql}")
-        return False
-    return True
+    return _single_sql(sql).run(device_id, logger).ok
 
 def db_query(device_id, sql, logger):
-    safe_sql = sql.replace('"', '\\"')
-    cmd = f"sqlite3 {REMOTE_DB_PATH} \"{safe_sql}\""
-    out, _ = run_adb(device_id, ["shell", cmd], logger=logger)
-    return out.strip() if out else None
+    return _query_text(_single_sql(sql, query=True).run(device_id, logger))
+
+def _parse_pid(out):
+    return out.split()[0] if out and out.split() else None
 
 def get_pid(device_id, pkg_name, logger):
     out, _ = run_adb(device_id, ["shell", f"pidof {pkg_name}"], logger=logger)
-    if out:
-        return out.split()[0]
-    return None
+    return _parse_pid(out)
 
 def kill_softly(device_id, pkg_name, logger):
     """软杀进程，触发自动重启"""
@@ -53,12 +69,31 @@ def kill_softly(device_id, pkg_name, logger):
 # 环境健康检查与自愈
 # ==============================================================================
 
-def check_db_schema(device_id, logger):
-    out = db_query(device_id, "SELECT name FROM sqlite_master WHERE type='table';", logger)
+_TABLES_SQL = "SELECT name FROM sqlite_master WHERE type='table';"
+
+def _has_required_tables(out):
     if not out: return False
     tables = out.splitlines()
-    required = ['sms', 'threads', 'canonical_addresses']
-    return all(t in tables for t in required)
+    return all(t in tables for t in REQUIRED_TABLES)
+
+def check_db_schema(device_id, logger):
+    return _has_required_tables(db_query(device_id, _TABLES_SQL, logger))
+
+def _rebuild_script():
+    rebuild = ShellScript()
+    # 1. 清理目录
+    rebuild.add(f"rm -rf {REMOTE_DB_DIR}")
+    rebuild.add(f"mkdir -p {REMOTE_DB_DIR}")
+    # 2. 初始权限
+    rebuild.add(f"chown -R 1001:1001 {REMOTE_DB_DIR}")
+    rebuild.add(f"chmod 771 {REMOTE_DB_DIR}")
+    rebuild.add(f"restorecon -R {REMOTE_DB_DIR}")
+    # 3. 杀进程释放锁
+    rebuild.add(f"killall {PKG_PHONE}")
+    return rebuild
+
+def _rebuild_budget(elapsed):
+    return min(REBUILD_TIMEOUT, max(1, math.ceil(elapsed)))
 
 def ensure_sms_environment(device_id, logger):
     logger.info(">>> [SMS] 检查环境健康度...")
@@ -68,30 +103,20 @@ def ensure_sms_environment(device_id, logger):
         return
 
     logger.warning("  🚨 环境异常，执行强制重建...")
-    
-    # 1. 清理目录
-    run_adb(device_id, ["shell", f"rm -rf {REMOTE_DB_DIR}"], logger=logger)
-    run_adb(device_id, ["shell", f"mkdir -p {REMOTE_DB_DIR}"], logger=logger)
-    # 2. 初始权限
-    run_adb(device_id, ["shell", f"chown -R 1001:1001 {REMOTE_DB_DIR}"], logger=logger)
-    run_adb(device_id, ["shell", f"chmod 771 {REMOTE_DB_DIR}"], logger=logger)
-    run_adb(device_id, ["shell", f"restorecon -R {REMOTE_DB_DIR}"], logger=logger)
-    
-    # 3. 杀进程释放锁
-    run_adb(device_id, ["shell", f"killall {PKG_PHONE}"], logger=logger)
+    _rebuild_script().run(device_id, logger)
     
     # 4. 触发建库
     logger.info("  激活系统建库...")
     run_adb(device_id, ["shell", f"monkey -p {PKG_MSG} -c android.intent.category.LAUNCHER 1"], logger=logger)
-    time.sleep(2)
+    wait_for(device_id, "SMS app launch", focused_activity(PKG_MSG), timeout=6, budget=2, logger=logger)
     run_adb(device_id, ["emu", "sms", "send", "10086", "System_Init_Trigger"], logger=logger)
     
-    # 5. 等待
-    for i in range(15):
-        time.sleep(1)
-        if check_db_schema(device_id, logger):
-            logger.info(f"  ✅ 数据库重建成功 (耗时 {i+1}s)")
-            return
+    # 5. 等待建库 (原先每秒检查一次，预算按整秒向上取整计)
+    start = time.monotonic()
+    if wait_for(device_id, "SMS rebuild", tables_exist(REMOTE_DB_PATH, REQUIRED_TABLES), timeout=REBUILD_TIMEOUT,
+                budget=_rebuild_budget, logger=logger):
+        logger.info(f"  ✅ 数据库重建成功 (耗时 {time.monotonic() - start:.1f}s)")
+        return
             
     logger.error("  ❌ 重建超时。")
 
@@ -102,106 +127,342 @@ def fix_sms_permissions_recursive(device_id, logger):
     从而导致 APP 看起来是空的。
     """
     logger.info("  [Permission] 递归修复数据库权限 (Owner: 1001:1001)...")
+    return _permission_script().run(device_id, logger)
+
+def _script_finish_script():
+    # [核心修复] 使用递归修复，确保 -journal 等文件也被归属给 radio
+    finish = ShellScript()
+    finish.add(f"rm -f {REMOTE_DB_PATH}-wal {REMOTE_DB_PATH}-shm")
+    return _permission_script(finish)
+
+def _permission_script(script=None):
+    script = script or ShellScript()
     # 1001 是 radio 用户，TelephonyProvider 运行在此用户下
-    run_adb(device_id, ["shell", f"chown -R 1001:1001 {REMOTE_DB_DIR}"], logger=logger)
-    run_adb(device_id, ["shell", f"chmod 771 {REMOTE_DB_DIR}"], logger=logger)
+    script.add(f"chown -R 1001:1001 {REMOTE_DB_DIR}")
+    script.add(f"chmod 771 {REMOTE_DB_DIR}")
     # 数据库文件通常是 660
-    run_adb(device_id, ["shell", f"chmod 660 {REMOTE_DB_PATH}"], logger=logger) 
-    run_adb(device_id, ["shell", f"restorecon -R {REMOTE_DB_DIR}"], logger=logger)
+    script.add(f"chmod 660 {REMOTE_DB_PATH}")
+    script.add(f"restorecon -R {REMOTE_DB_DIR}")
+    return script
 
 # ==============================================================================
 # 数据注入
 # ==============================================================================
 
-def get_or_create_thread(device_id, addr, logger):
-    # 1. Canonical Address
-    res = db_query(device_id, f"SELECT _id FROM canonical_addresses WHERE address = '{addr}'", logger)
-    if not (res and res.isdigit()):
-        db_exec(device_id, f"INSERT INTO canonical_addresses (address) VALUES ('{addr}')", logger)
-        res = db_query(device_id, f"SELECT _id FROM canonical_addresses WHERE address = '{addr}'", logger)
-    
-    recipient_id = res
-    if not recipient_id: return None
-    
-    # 2. Thread
-    res = db_query(device_id, f"SELECT _id FROM threads WHERE recipient_ids = '{recipient_id}'", logger)
-    if not (res and res.isdigit()):
-        now = int(time.time() * 1000)
-        # 完整字段插入，防止 NULL 错误
-        db_exec(device_id, f"INSERT INTO threads (date, message_count, recipient_ids, read, type, error, has_attachment) VALUES ({now}, 0, '{recipient_id}', 1, 0, 0, 0)", logger)
-        res = db_query(device_id, f"SELECT _id FROM threads WHERE recipient_ids = '{recipient_id}'", logger)
-        
-    return res
+# 系统进程持有 mmssms.db 时无法在主机上重建，改为整个注入一个设备端 SQL 脚本 (一个事务、一个 sqlite3 进程)
+_SCRIPT_SQL_ADDRESS = ("INSERT INTO canonical_addresses (address) SELECT ? "
+                       "WHERE NOT EXISTS (SELECT 1 FROM canonical_addresses WHERE address = ?)")
+# 完整字段插入，防止 NULL 错误；新会话的 _id 用 last_insert_rowid() 记入临时表
+_SCRIPT_SQL_THREAD = ("INSERT INTO threads (date, message_count, recipient_ids, read, type, error, has_attachment) "
+                      "SELECT ?, 0, CAST(min(_id) AS TEXT), 1, 0, 0, 0 FROM canonical_addresses WHERE address = ?")
+_SCRIPT_SQL_SMS = ("INSERT INTO sms (address, body, date, read, type, thread_id) "
+                   "SELECT ?, ?, ?, 1, ?, thread_id FROM temp.inject_threads WHERE address = ?")
+_SCRIPT_SQL_SUMMARY = ("UPDATE threads SET snippet = ?, date = ?, "
+                       "message_count = (SELECT count(*) FROM sms WHERE sms.thread_id = threads._id) "
+                       "WHERE _id = (SELECT thread_id FROM temp.inject_threads WHERE address = ?)")
 
-def verify_data(device_id, logger):
+def sms_sql_script(items, now_ms, db_path=REMOTE_DB_PATH):
+    """
+    生成整个注入的 SqlScript。一个事务内: 清空 sms / threads -> 每个地址补全 canonical_addresses 并建会话
+    -> 插入短信 -> 回填会话摘要 (取该会话最后一条)；最后查询 sms / threads 条数
+    """
+    script = SqlScript(db_path)
+    script.exec("DELETE FROM sms")
+    script.exec("DELETE FROM threads")
+    script.exec("CREATE TEMP TABLE inject_threads (address TEXT PRIMARY KEY, thread_id INTEGER)")
+    summary = {}   # 地址 -> (snippet, date)
+    for item in items:
+        addr = item.get("address")
+        if addr is None:
+            continue
+        if addr not in summary:
+            script.exec(_SCRIPT_SQL_ADDRESS, addr, addr)
+            script.exec(_SCRIPT_SQL_THREAD, now_ms, addr)
+            script.exec("INSERT INTO temp.inject_threads VALUES (?, last_insert_rowid())", addr)
+        ts = now_ms + item.get("date_offset", 0)
+        script.exec(_SCRIPT_SQL_SMS, addr, item.get("body"), ts, item.get("type", 1), addr)
+        summary[addr] = (item.get("body"), ts)
+    for addr, (snippet, date) in summary.items():
+        script.exec(_SCRIPT_SQL_SUMMARY, snippet, date, addr)
+    script.exec("DROP TABLE temp.inject_threads")
+    script.query("sms", "SELECT count(*) FROM sms")
+    script.query("threads", "SELECT count(*) FROM threads")
+    return script
+
+def _check_script_result(result, logger):
     """验证数据是否真的写入了数据库"""
-    sms_count = db_query(device_id, "SELECT count(*) FROM sms;", logger)
-    thread_count = db_query(device_id, "SELECT count(*) FROM threads;", logger)
-    
+    sms_count, thread_count = result.value("sms"), result.value("threads")
     logger.info(f"  [Verify] DB Rows -> SMS: {sms_count}, Threads: {thread_count}")
-    
-    if sms_count and sms_count.isdigit() and int(sms_count) > 0:
-        return True
-    return False
+    return result.ok and bool(sms_count) and sms_count.isdigit() and int(sms_count) > 0
+
+def _log_script_rate(result, start, logger):
+    seconds = time.perf_counter() - start
+    count = int(result.value("sms") or 0)
+    record_write("SMS (script)", count, seconds)
+    logger.info(f"  SQL 脚本执行完成，写入 {count} 条，用时 {seconds:.2f}s ({count / max(seconds, 1e-6):.0f} 条/秒)。")
+
+# ==============================================================================
+# 主机端建库 (SMS_HOST_BUILD)
+# ==============================================================================
+# pull (或复用缓存的模板) mmssms.db -> 本地一个事务内重建 threads / sms -> 一次 push + 一次收尾往返，
+# 代替每条短信约 6 次 adb shell sqlite3。
+# 模板 = 注入前设备上的 mmssms.db，按 (versionCode, 表结构指纹) 存放在 artifact_cache 中，可能被另一台设备使用，
+# 所以存入缓存时清空一次全部用户数据表 (SMS_USER_TABLES)，只保留表结构与系统记录；刚 pull 下来的本机库照常使用。
+# 建库只重建 sms / threads；短信时间按注入时刻计算，所以只缓存模板，不缓存成品库。
+
+REMOTE_TMP_DB = "/data/local/tmp/mmssms_inject.db"
+# 模板的生成逻辑版本 (模板是注入前的空库，与 sms.json 无关)
+SMS_TEMPLATE_RECIPE = "mmssms-template-v2"
+# BULK_ROWS[PKG_TELEPHONY] 生成短信时如何区分副本 (见 inject_app_db.generate_items)
+SMS_BULK_SPEC = {"bulk": {"text": ["body"], "step": {"date_offset": -60 * 1000}}}
+_SMS_COUNT_MARK = "__SMS__"
+# 模板中属于用户数据的表 (彩信、地址、搜索索引 ...)，存入缓存前清空；不存在的表跳过
+SMS_USER_TABLES = ("part", "pdu", "addr", "pending_msgs", "rate", "drm", "raw", "attachments", "sr_pending",
+                   "words", "canonical_addresses")
+
+_SQL_THREAD = ("INSERT INTO threads (date, message_count, recipient_ids, read, type, error, has_attachment) "
+               "VALUES (?, 0, ?, 1, 0, 0, 0)")
+_SQL_SMS = "INSERT INTO sms (address, body, date, read, type, thread_id) VALUES (?, ?, ?, 1, ?, ?)"
+# 摘要取该会话最后写入的一条；条数按 sms 表统计，不受系统库中 sms 触发器的影响
+_SQL_THREAD_SUMMARY = ("UPDATE threads SET snippet = ?, date = ?, "
+                       "message_count = (SELECT count(*) FROM sms WHERE sms.thread_id = threads._id) WHERE _id = ?")
+
+def _load_sms(logger):
+    """返回 (短信条目, 条数)；配置了 BULK_ROWS[PKG_TELEPHONY] 时条目为生成器"""
+    items = load_json_data("sms.json")
+    rows = BULK_ROWS.get(PKG_TELEPHONY, 0)
+    if not items or not rows:
+        return items, len(items or [])
+    logger.info(f"  批量模式: 以 {len(items)} 条为模板生成 {rows} 条短信")
+    return generate_items(SMS_BULK_SPEC, items, rows), rows
+
+def build_sms_db(db_file, items, now_ms, logger):
+    """
+    在本地 mmssms.db 上一个事务内清空并重建 threads / sms，沿用已有的 canonical_addresses，
+    最后删除没有会话引用的地址。地址与会话的 _id 在内存中解析，短信分批 executemany。返回写入条数，失败返回 None
+    """
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA journal_mode=DELETE;")
+        tune_offline(cursor)
+        cursor.execute("BEGIN")
+        cursor.execute("DELETE FROM sms")
+        cursor.execute("DELETE FROM threads")
+        addresses = {addr: _id for _id, addr in cursor.execute("SELECT _id, address FROM canonical_addresses")}
+        threads = {}   # recipient_ids -> 会话 _id
+        summary = {}   # 会话 _id -> (snippet, date)
+        values, count = [], 0
+        for item in items:
+            addr = item.get("address")
+            if addr not in addresses:
+                cursor.execute("INSERT INTO canonical_addresses (address) VALUES (?)", (addr,))
+                addresses[addr] = cursor.lastrowid
+            recipient = str(addresses[addr])
+            if recipient not in threads:
+                cursor.execute(_SQL_THREAD, (now_ms, recipient))
+                threads[recipient] = cursor.lastrowid
+            tid = threads[recipient]
+            ts = now_ms + item.get("date_offset", 0)
+            values.append((addr, item.get("body"), ts, item.get("type", 1), tid))
+            summary[tid] = (item.get("body"), ts)
+            if len(values) >= BULK_CHUNK_ROWS:
+                cursor.executemany(_SQL_SMS, values)
+                count += len(values)
+                values.clear()
+        cursor.executemany(_SQL_SMS, values)
+        count += len(values)
+        cursor.executemany(_SQL_THREAD_SUMMARY, [(snippet, date, tid) for tid, (snippet, date) in summary.items()])
+        # 重建的会话都只有一个收件人，recipient_ids 即地址 _id
+        cursor.execute("DELETE FROM canonical_addresses "
+                       "WHERE _id NOT IN (SELECT CAST(recipient_ids AS INTEGER) FROM threads)")
+        cursor.execute("COMMIT")
+        return count
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        logger.error(f"  本地构建 mmssms.db 失败: {e}")
+        return None
+    finally:
+        conn.close()
 
+def _template_script():
+    script = ShellScript()
+    script.add(artifact_cache.schema_command(REMOTE_DB_PATH), name="schema")
+    return script
+
+def _template_key(facts, results, logger):
+    out = next((r.stdout for r in results if r.name == "schema"), None)
+    return artifact_cache.cache_key(PKG_TELEPHONY, facts.version_code(PKG_TELEPHONY, logger),
+                                    artifact_cache.parse_schema(out), None, SMS_TEMPLATE_RECIPE)
+
+def _reset_local_dir(temp_dir, device_id):
+    local_dir = os.path.join(temp_dir, f"{PKG_TELEPHONY}_{device_id}")
+    shutil.rmtree(local_dir, ignore_errors=True)
+    os.makedirs(local_dir)
+    return local_dir
+
+def _find_pulled_db(local_dir):
+    name = os.path.basename(REMOTE_DB_PATH)
+    for root, _, files in os.walk(local_dir):
+        if name in files:
+            return os.path.join(root, name)
+    return None
+
+def _merge_wal(db_file):
+    """把一起 pull 下来的 -wal 合并进主文件，之后只需推送单个文件"""
+    conn = sqlite3.connect(db_file)
+    try:
+        conn.execute("PRAGMA journal_mode=DELETE;")
+    finally:
+        conn.close()
+
+def _clear_user_data(db_file):
+    """清空 sms / threads 与 SMS_USER_TABLES，只留下表结构与系统记录 (存入缓存的模板)"""
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conn.execute("BEGIN")
+        for table in ("sms", "threads") + SMS_USER_TABLES:
+            if table in tables:
+                conn.execute(f'DELETE FROM "{table}"')
+        conn.execute("COMMIT")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+def _store_template(local_db, key):
+    """把清空用户数据后的副本存为模板，local_db 本身不变"""
+    if not key:
+        return
+    template = f"{local_db}.template"
+    shutil.copyfile(local_db, template)
+    try:
+        _clear_user_data(template)
+        artifact_cache.store(PKG_TELEPHONY, key, template)
+    finally:
+        os.remove(template)
+
+def _stage_local_db(template, local_dir, key):
+    """
+    主机端准备要改写的本地库 (阻塞的文件操作，异步版本放到线程池): 有模板时复制模板，
+    否则整理刚 pull 到 local_dir 的库 (合并 WAL) 并把清空用户数据的副本存为模板。
+    返回本地库路径，没有 pull 到库时返回 None
+    """
+    if template:
+        local_db = os.path.join(local_dir, os.path.basename(REMOTE_DB_PATH))
+        shutil.copyfile(template, local_db)
+        return local_db
+    local_db = _find_pulled_db(local_dir)
+    if local_db:
+        _merge_wal(local_db)
+        _store_template(local_db, key)
+    return local_db
+
+def _host_finish_script():
+    # 停掉持有 mmssms.db 的进程 + 覆盖 (保留原文件的 SELinux 标签) + 递归修复权限 + 设备端核对条数，一次往返完成。
+    # TelephonyProvider 仍打开着旧库时会把旧 WAL / shm 中的页写回新文件，必须先结束它 (之后由 restart_sms_services 拉起)
+    finish = ShellScript()
+    finish.add(f"killall {PKG_PHONE}", name="stop provider")
+    finish.add(f"rm -f {REMOTE_DB_PATH}-wal {REMOTE_DB_PATH}-shm")
+    finish.add(f"cat {REMOTE_TMP_DB} > {REMOTE_DB_PATH}", name="overwrite")
+    finish.add(f"rm -f {REMOTE_TMP_DB}")
+    _permission_script(finish)
+    finish.add(f"echo {_SMS_COUNT_MARK}$(sqlite3 {REMOTE_DB_PATH} 'SELECT count(*) FROM sms;')", name="verify")
+    return finish
+
+def _check_host_finish(results, count, logger):
+    overwrite = next((r for r in results if r.name == "overwrite"), None)
+    if not overwrite or not overwrite.ok:
+        logger.error(f"  写入 mmssms.db 失败: {overwrite.stderr if overwrite else '无结果'}")
+        return False
+    out = next((r.stdout for r in results if r.name == "verify"), "") or ""
+    device_count = out.split(_SMS_COUNT_MARK, 1)[-1].strip()
+    logger.info(f"  [Verify] DB Rows -> SMS: {device_count or '?'} (本地写入 {count})")
+    # 设备上没有 sqlite3 时无法核对，以本地结果为准
+    if device_count.isdigit() and int(device_count) != count:
+        logger.error("  ❌ 数据验证失败：设备上的短信条数与本地不一致！")
+        return False
+    return True
+
+def _log_host_rate(count, start, logger):
+    seconds = time.perf_counter() - start
+    record_write("SMS", count, seconds)
+    logger.info(f"  主机端建库写入 {count} 条短信，用时 {seconds:.2f}s ({count / max(seconds, 1e-6):.0f} 条/秒)")
+
+def inject_sms_host(device_id, temp_dir, items, logger):
+    """主机端构建 mmssms.db 并一次推送，返回写入条数；失败返回 None (由调用方改为逐条 SQL)"""
+    start = time.perf_counter()
+    key = None
+    if artifact_cache.enabled():
+        key = _template_key(get_device_facts(device_id, logger), _template_script().run(device_id, logger), logger)
+    local_dir = _reset_local_dir(temp_dir, device_id)
+    # 其他设备正在 pull 同一模板时先等待
+    template = artifact_cache.lookup(PKG_TELEPHONY, key, device_id)
+    try:
+        if not template:
+            run_adb(device_id, ["pull", REMOTE_DB_DIR, local_dir], logger=logger)
+        local_db = _stage_local_db(template, local_dir, key)
+    finally:
+        artifact_cache.release(key, device_id)
+    if not local_db:
+        logger.warning("  拉取 mmssms.db 失败")
+        return None
+
+    count = build_sms_db(local_db, items, int(time.time() * 1000), logger)
+    if count is None:
+        return None
+    run_adb(device_id, ["push", local_db, REMOTE_TMP_DB], logger=logger, check=True)
+    if not _check_host_finish(_host_finish_script().run(device_id, logger), count, logger):
+        return None
+    _log_host_rate(count, start, logger)
+    return count
+
+def _try_host_build(device_id, temp_dir, items, logger):
+    try:
+        return inject_sms_host(device_id, temp_dir, items, logger)
+    except Exception as e:
+        logger.warning(f"  主机端建库异常: {e}")
+        return None
+
+@traced("injector")
 def inject_sms_msg(device_id, temp_dir, logger):
     logger.info(">>> 注入 SMS (V12.4) <<<")
     ensure_sms_environment(device_id, logger)
     
-    sms_data = load_json_data("sms.json")
-    if not sms_data:
+    sms_data, total = _load_sms(logger)
+    if not total:
         logger.error("无 SMS 数据配置。")
         return
 
-    logger.info("  [Inject] 清空短信与会话表...")
-    db_exec(device_id, "DELETE FROM sms;", logger)
-    db_exec(device_id, "DELETE FROM threads;", logger)
-    
-    now_ms = int(time.time() * 1000)
-    count = 0
-    
-    logger.info("  [Inject] 正在插入数据...")
-    for item in sms_data:
-        addr = item.get("address")
-        body = item.get("body")
-        offset = item.get("date_offset", 0)
-        type_ = item.get("type", 1)
-        
-        tid = get_or_create_thread(device_id, addr, logger)
-        if not tid: continue
-        
-        ts = now_ms + offset
-        safe_body = body.replace("'", "''")
-        
-        sql_sms = (
-            f"INSERT INTO sms (address, body, date, read, type, thread_id) "
-            f"VALUES ('{addr}', '{safe_body}', {ts}, 1, {type_}, {tid})"
-        )
-        
-        if db_exec(device_id, sql_sms, logger):
-            count += 1
-            sql_update = (
-                f"UPDATE threads SET snippet = '{safe_body}', date = {ts}, message_count = message_count + 1 "
-                f"WHERE _id = {tid}"
-            )
-            db_exec(device_id, sql_update, logger)
-            
-    logger.info(f"  SQL 执行完成，插入 {count} 条。")
+    if SMS_HOST_BUILD:
+        if _try_host_build(device_id, temp_dir, sms_data, logger):
+            restart_sms_services(device_id, logger)
+            logger.info("✅ SMS 注入全部完成 (主机端建库)。")
+            return
+        logger.warning("  主机端建库失败，改为设备端 SQL 脚本注入。")
+        sms_data, total = _load_sms(logger)
+
+    logger.info("  [Inject] 单事务 SQL 脚本: 清空短信与会话表并插入数据...")
+    start = time.perf_counter()
+    result = sms_sql_script(sms_data, int(time.time() * 1000)).run(device_id, logger)
     
     # 3. 验证数据 (防止假注入)
-    if not verify_data(device_id, logger):
+    if not _check_script_result(result, logger):
         logger.error("  ❌ 数据验证失败：数据库为空！")
         return
+    _log_script_rate(result, start, logger)
 
-    # 4. 刷新缓存与修复权限
+    # 4. 刷新缓存与修复权限 (清理 WAL + 递归修复，一次往返)
     logger.info("  [Inject] 刷新 WAL 并递归修复权限...")
-    # 清理 WAL
-    run_adb(device_id, ["shell", f"rm -f {REMOTE_DB_PATH}-wal {REMOTE_DB_PATH}-shm"], logger=logger)
-    
-    # [核心修复] 使用递归修复，确保 -journal 等文件也被归属给 radio
-    fix_sms_permissions_recursive(device_id, logger)
+    logger.info("  [Permission] 递归修复数据库权限 (Owner: 1001:1001)...")
+    _script_finish_script().run(device_id, logger)
     
     # 5. 重启服务与清除 UI 缓存
+    restart_sms_services(device_id, logger)
+    logger.info("✅ SMS 注入全部完成 (已执行 verify 与 pm clear)。")
+
+def restart_sms_services(device_id, logger):
     logger.info("  [Restart] 重启服务与 UI...")
     
     # 软杀 TelephonyProvider 宿主
@@ -212,18 +473,41 @@ def inject_sms_msg(device_id, temp_dir, logger):
     run_adb(device_id, ["shell", f"pm clear {PKG_MSG}"], logger=logger)
     # 注意：pm clear com.google.android.apps.messaging 不会删除 mmssms.db，只会删除 APP 自己的设置和视图缓存
     
-    # 启动 APP
-    time.sleep(1)
+    # 等电话进程 (TelephonyProvider 宿主) 重生后再启动 APP
+    wait_for(device_id, "phone respawn", process_alive(PKG_PHONE), timeout=5, budget=1, logger=logger)
     run_adb(device_id, ["shell", f"monkey -p {PKG_MSG} -c android.intent.category.LAUNCHER 1"], logger=logger)
-    
-    logger.info("✅ SMS 注入全部完成 (已执行 verify 与 pm clear)。")
 
-# ==========================================
-# 联系人注入 (保持不变)
-# ==========================================
+# ==============================================================================
+# 联系人注入
+# ==============================================================================
+# CONTACTS_BULK: 直接写 contacts2.db，整个注入一个设备端 SQL 脚本 (一个事务、一个 sqlite3 进程)，
+# 之后重启 android.process.acore 让 ContactsProvider 重新加载；往返次数与联系人数量无关。
+# 各版本的 contacts2.db 表结构不同 (mimetype / mimetype_id、accounts、phone_lookup ...)，
+# 先用一个只读脚本探测列，只写存在的列。
+# 删除 aggregation_v2 属性后 Provider 启动时会重新聚合全部原始联系人 (生成 contacts 表中的条目)。
+# 探测或写入失败时退回逐个 content insert。
+
+CONTACTS_DB_DIR = f"/data/data/{PKG_CONTACTS_STORAGE}/databases"
+CONTACTS_DB_PATH = f"{CONTACTS_DB_DIR}/contacts2.db"
+PROC_ACORE = "android.process.acore"
+MIME_NAME = "vnd.android.cursor.item/name"
+MIME_PHONE = "vnd.android.cursor.item/phone_v2"
+# BULK_ROWS[PKG_CONTACTS_STORAGE] 生成联系人时如何区分副本 (见 inject_app_db.generate_items)
+CONTACTS_BULK_SPEC = {"bulk": {"text": ["name"]}}
+# DisplayNameSources.STRUCTURED_NAME / Phone.TYPE_MOBILE
+_NAME_SOURCE_STRUCTURED = 40
+_PHONE_TYPE_MOBILE = 2
+_PHONE_MIN_MATCH = 7
+_LOCAL_ACCOUNT = "account_name IS NULL AND account_type IS NULL AND data_set IS NULL"
+
+def _id_query(uri):
+    return f'content query --uri {uri} --projection _id'
+
 def get_last_insert_id(device_id, uri, logger):
-    cmd = f'content query --uri {uri} --projection _id'
-    out, _ = run_adb(device_id, ["shell", cmd], logger=logger)
+    out, _ = run_adb(device_id, ["shell", _id_query(uri)], logger=logger)
+    return _parse_max_id(out)
+
+def _parse_max_id(out):
     if not out: return None
     ids = []
     for line in out.splitlines():
@@ -232,11 +516,11 @@ def get_last_insert_id(device_id, uri, logger):
     if ids: return str(max(ids))
     return None
 
-def inject_contacts(device_id, logger):
-    logger.info(">>> 注入系统联系人 (Fixed) <<<")
-    
-    run_adb(device_id, ["shell", "content query --uri content://com.android.contacts/raw_contacts --projection _id"], logger=logger)
-    
+CMD_RAW_CONTACT_INSERT = 'content insert --uri content://com.android.contacts/raw_contacts --bind account_name:n: --bind account_type:n:'
+CMD_RAW_CONTACT_QUERY = "content query --uri content://com.android.contacts/raw_contacts --projection _id"
+
+def _load_contacts(logger):
+    """返回 (联系人条目, 条数)；配置了 BULK_ROWS[PKG_CONTACTS_STORAGE] 时条目为生成器"""
     # [修改] 改为从 JSON 文件读取
     contacts_data = load_json_data("contacts.json")
     if not contacts_data:
@@ -246,30 +530,378 @@ def inject_contacts(device_id, logger):
             {"name": "Zheng Zihan", "phone": "13912345678"}, 
             {"name": "Bob", "phone": "987654321"}
         ]
-        
-    for item in contacts_data:
+    rows = BULK_ROWS.get(PKG_CONTACTS_STORAGE, 0)
+    if not rows:
+        return contacts_data, len(contacts_data)
+    logger.info(f"  批量模式: 以 {len(contacts_data)} 个为模板生成 {rows} 个联系人")
+    return generate_items(CONTACTS_BULK_SPEC, contacts_data, rows), rows
+
+def _parse_insert_id(out):
+    """content insert 输出中的 _id；部分系统不输出，返回 None (再查询最大 _id)"""
+    m = re.search(r"_id=(\d+)", out or "")
+    return m.group(1) if m else None
+
+def _contact_data_cmds(raw_id, name, phone):
+    cmd_name = (f'content insert --uri content://com.android.contacts/data --bind raw_contact_id:i:{raw_id} --bind mimetype:s:{MIME_NAME} --bind data1:s:"{name}"')
+    cmd_phone = (f'content insert --uri content://com.android.contacts/data --bind raw_contact_id:i:{raw_id} --bind mimetype:s:{MIME_PHONE} --bind data1:s:"{phone}"')
+    return cmd_name, cmd_phone
+
+def normalize_phone(phone):
+    """只保留数字与开头的 + (PhoneNumberUtils.normalizeNumber 的简化版)"""
+    digits = re.sub(r"\D", "", phone)
+    return f"+{digits}" if phone.strip().startswith("+") else digits
+
+def phone_min_match(normalized):
+    """反转后取前 7 位，与 PhoneNumberUtils.toCallerIDMinMatch 一致"""
+    return normalized.lstrip("+")[::-1][:_PHONE_MIN_MATCH]
+
+def contacts_probe_script(db_path=CONTACTS_DB_PATH):
+    probe = SqlScript(db_path, transaction=False)
+    probe.query("tables", "SELECT name FROM sqlite_master WHERE type = 'table'")
+    for table in ("raw_contacts", "data", "accounts"):
+        probe.query(table, "SELECT name FROM pragma_table_info(?)", table)
+    return probe
+
+def parse_contacts_schema(result):
+    """探测结果 -> {表名: 列集合} (只含存在的表)；探测失败或缺少必需表返回 None"""
+    if not result.ok:
+        return None
+    tables = {row[0] for row in result.rows("tables")}
+    if not {"raw_contacts", "data"} <= tables:
+        return None
+    schema = {t: set() for t in tables}
+    for table in ("raw_contacts", "data", "accounts"):
+        if table in tables:
+            schema[table] = {row[0] for row in result.rows(table)}
+    return schema
+
+def _mimetype_sql(schema):
+    """返回 (data 表中的 mimetype 列, 取值 SQL 模板)"""
+    if "mimetype_id" in schema["data"] and "mimetypes" in schema:
+        return "mimetype_id", "(SELECT _id FROM mimetypes WHERE mimetype = '{}')"
+    return "mimetype", "'{}'"
+
+def _insert_select(table, values, source="temp.inject_cur"):
+    """返回 SqlScript.exec 的参数: INSERT INTO table (列...) SELECT 值... FROM source；值为 (SQL 片段, 参数...) 或参数"""
+    cols, exprs, params = [], [], []
+    for col, value in values.items():
+        cols.append(col)
+        if isinstance(value, tuple):
+            exprs.append(value[0])
+            params.extend(value[1:])
+        else:
+            exprs.append("?")
+            params.append(value)
+    return (f"INSERT INTO {table} ({', '.join(cols)}) SELECT {', '.join(exprs)} FROM {source}", *params)
+
+def contacts_sql_script(items, schema, db_path=CONTACTS_DB_PATH):
+    """
+    生成整个注入的 SqlScript (追加，不删除已有联系人)。每个联系人: 原始联系人 -> 姓名 / 电话两条 data
+    (-> phone_lookup)；新行的 _id 经 last_insert_rowid() 记入临时表。最后查询写入的联系人数
+    """
+    raw_cols, data_cols = schema["raw_contacts"], schema["data"]
+    mime_col, mime_expr = _mimetype_sql(schema)
+    local_account = "accounts" in schema and "account_id" in raw_cols and {"account_name", "account_type",
+                                                                              "data_set"} <= schema["accounts"]
+    script = SqlScript(db_path)
+    script.exec("CREATE TEMP TABLE inject_cur (account_id INTEGER, raw_id INTEGER, data_id INTEGER, "
+                "added INTEGER DEFAULT 0)")
+    if mime_col == "mimetype_id":
+        for mime in (MIME_NAME, MIME_PHONE):
+            script.exec("INSERT INTO mimetypes (mimetype) SELECT ? "
+                        "WHERE NOT EXISTS (SELECT 1 FROM mimetypes WHERE mimetype = ?)", mime, mime)
+    if local_account:
+        # 本地 (无账号) 联系人挂在 accounts 中全为 NULL 的那一行，联系人视图按 account_id 关联
+        script.exec(f"INSERT INTO accounts (account_name, account_type, data_set) SELECT NULL, NULL, NULL "
+                    f"WHERE NOT EXISTS (SELECT 1 FROM accounts WHERE {_LOCAL_ACCOUNT})")
+        script.exec(f"INSERT INTO temp.inject_cur (account_id) SELECT min(_id) FROM accounts WHERE {_LOCAL_ACCOUNT}")
+    else:
+        script.exec("INSERT INTO temp.inject_cur DEFAULT VALUES")
+
+    for item in items:
+        name, phone = item.get("name"), item.get("phone")
+        if not name or not phone:
+            continue
+        raw = {"display_name": name, "display_name_alt": name, "sort_key": name, "sort_key_alt": name,
+               "display_name_source": _NAME_SOURCE_STRUCTURED, "aggregation_needed": 1, "deleted": 0,
+               "account_name": None, "account_type": None, "account_id": ("account_id",)}
+        script.exec(*_insert_select("raw_contacts", {c: v for c, v in raw.items() if c in raw_cols}))
+        script.exec("UPDATE temp.inject_cur SET raw_id = last_insert_rowid(), added = added + 1")
+        normalized = normalize_phone(phone)
+        rows = [(MIME_NAME, {"data1": name}),
+                (MIME_PHONE, {"data1": phone, "data2": _PHONE_TYPE_MOBILE, "data4": normalized})]
+        for mime, values in rows:
+            data = {"raw_contact_id": ("raw_id",), mime_col: (mime_expr.format(mime),)}
+            data.update((c, v) for c, v in values.items() if c in data_cols)
+            script.exec(*_insert_select("data", data))
+        if "phone_lookup" in schema:
+            script.exec("INSERT INTO phone_lookup (data_id, raw_contact_id, normalized_number, min_match) "
+                        "SELECT last_insert_rowid(), raw_id, ?, ? FROM temp.inject_cur",
+                        normalized, phone_min_match(normalized))
+    if "properties" in schema:
+        script.exec("DELETE FROM properties WHERE property_key = 'aggregation_v2'")
+    script.query("contacts", "SELECT added FROM temp.inject_cur")
+    script.exec("DROP TABLE temp.inject_cur")
+    return script
+
+def _contacts_finish_script(uid):
+    # sqlite3 以 root 运行，新建的 -wal / -journal 需要归还给 Provider；重启 acore 让 Provider 重新加载
+    finish = ShellScript()
+    if uid:
+        finish.add(f"chown -R {uid}:{uid} {CONTACTS_DB_DIR}")
+    finish.add(f"restorecon -R {CONTACTS_DB_DIR}")
+    finish.add(f"killall {PROC_ACORE}")
+    finish.add(f"am force-stop {PKG_CONTACTS}")
+    return finish
+
+def _contacts_count(result, logger):
+    count = result.value("contacts") if result.ok else None
+    if not count or not count.isdigit():
+        logger.error(f"  联系人 SQL 脚本执行失败: {result.error or '无结果'}")
+        return None
+    return int(count)
+
+def _log_contacts_rate(count, start, logger):
+    seconds = time.perf_counter() - start
+    record_write("Contacts", count, seconds)
+    logger.info(f"  SQL 脚本写入 {count} 个联系人，用时 {seconds:.2f}s ({count / max(seconds, 1e-6):.0f} 个/秒)")
+
+def inject_contacts_bulk(device_id, items, logger):
+    """整个注入一个 SQL 脚本，返回写入的联系人数；失败返回 None (由调用方改为逐个 content insert)"""
+    start = time.perf_counter()
+    schema = parse_contacts_schema(contacts_probe_script().run(device_id, logger))
+    if not schema:
+        logger.warning("  无法读取 contacts2.db 表结构")
+        return None
+    count = _contacts_count(contacts_sql_script(items, schema).run(device_id, logger), logger)
+    if count is None:
+        return None
+    uid = get_device_facts(device_id, logger).package_uid(PKG_CONTACTS_STORAGE, logger)
+    _contacts_finish_script(uid).run(device_id, logger)
+    _log_contacts_rate(count, start, logger)
+    return count
+
+def _inject_contacts_each(device_id, items, logger):
+    """逐个联系人 content insert (每个联系人 3 次以上往返)"""
+    for item in items:
         name = item.get("name")
         phone = item.get("phone")
         
         if not name or not phone:
             continue
             
-        cmd_raw = 'content insert --uri content://com.android.contacts/raw_contacts --bind account_name:n: --bind account_type:n:'
-        out, _ = run_adb(device_id, ["shell", cmd_raw], logger=logger)
-        raw_id = None
-        if out:
-            match = re.search(r"_id=(\d+)", out)
-            if match: raw_id = match.group(1)
+        out, _ = run_adb(device_id, ["shell", CMD_RAW_CONTACT_INSERT], logger=logger)
+        raw_id = _parse_insert_id(out)
         if not raw_id:
             raw_id = get_last_insert_id(device_id, "content://com.android.contacts/raw_contacts", logger)
         if not raw_id: continue
         
-        cmd_name = (f'content insert --uri content://com.android.contacts/data --bind raw_contact_id:i:{raw_id} --bind mimetype:s:vnd.android.cursor.item/name --bind data1:s:"{name}"')
+        cmd_name, cmd_phone = _contact_data_cmds(raw_id, name, phone)
         run_adb(device_id, ["shell", cmd_name], logger=logger)
-        
-        cmd_phone = (f'content insert --uri content://com.android.contacts/data --bind raw_contact_id:i:{raw_id} --bind mimetype:s:vnd.android.cursor.item/phone_v2 --bind data1:s:"{phone}"')
         run_adb(device_id, ["shell", cmd_phone], logger=logger)
         logger.info(f"  已注入: {name} (ID: {raw_id})")
     
-    kill_softly(device_id, "android.process.acore", logger)
-    run_adb(device_id, ["shell", "am force-stop com.android.contacts"], logger=logger)
\ No newline at end of file
+    kill_softly(device_id, PROC_ACORE, logger)
+    run_adb(device_id, ["shell", f"am force-stop {PKG_CONTACTS}"], logger=logger)
+
+@traced("injector")
+def inject_contacts(device_id, logger):
+    logger.info(">>> 注入系统联系人 (Fixed) <<<")
+    
+    # 先查询一次，确保 ContactsProvider 已启动并建好 contacts2.db
+    run_adb(device_id, ["shell", CMD_RAW_CONTACT_QUERY], logger=logger)
+    
+    contacts_data, _ = _load_contacts(logger)
+    if CONTACTS_BULK:
+        try:
+            if inject_contacts_bulk(device_id, contacts_data, logger) is not None:
+                logger.info("✅ 联系人注入完成 (SQL 脚本)。")
+                return
+        except Exception as e:
+            logger.warning(f"  联系人 SQL 脚本注入异常: {e}")
+        logger.warning("  联系人 SQL 脚本注入失败，改为逐个 content insert。")
+        contacts_data, _ = _load_contacts(logger)
+    _inject_contacts_each(device_id, contacts_data, logger)
+
+# ==============================================================================
+# asyncio 版本
+# ==============================================================================
+
+async def db_exec_async(device_id, sql, logger):
+    return (await _single_sql(sql).run_async(device_id, logger)).ok
+
+async def db_query_async(device_id, sql, logger):
+    return _query_text(await _single_sql(sql, query=True).run_async(device_id, logger))
+
+async def get_pid_async(device_id, pkg_name, logger):
+    out, _ = await run_adb_async(device_id, ["shell", f"pidof {pkg_name}"], logger=logger)
+    return _parse_pid(out)
+
+async def kill_softly_async(device_id, pkg_name, logger):
+    pid = await get_pid_async(device_id, pkg_name, logger)
+    if pid:
+        logger.info(f"  重启进程 {pkg_name} (PID: {pid})...")
+        await run_adb_async(device_id, ["shell", f"kill {pid}"], logger=logger)
+
+async def check_db_schema_async(device_id, logger):
+    return _has_required_tables(await db_query_async(device_id, _TABLES_SQL, logger))
+
+async def get_last_insert_id_async(device_id, uri, logger):
+    out, _ = await run_adb_async(device_id, ["shell", _id_query(uri)], logger=logger)
+    return _parse_max_id(out)
+
+async def ensure_sms_environment_async(device_id, logger):
+    logger.info(">>> [SMS] 检查环境健康度...")
+
+    if await check_db_schema_async(device_id, logger):
+        logger.info("  环境结构正常 (Schema OK)。")
+        return
+
+    logger.warning("  🚨 环境异常，执行强制重建...")
+    await _rebuild_script().run_async(device_id, logger)
+
+    logger.info("  激活系统建库...")
+    await run_adb_async(device_id, ["shell", f"monkey -p {PKG_MSG} -c android.intent.category.LAUNCHER 1"], logger=logger)
+    await wait_for_async(device_id, "SMS app launch", focused_activity(PKG_MSG), timeout=6, budget=2, logger=logger)
+    await run_adb_async(device_id, ["emu", "sms", "send", "10086", "System_Init_Trigger"], logger=logger)
+
+    start = time.monotonic()
+    if await wait_for_async(device_id, "SMS rebuild", tables_exist(REMOTE_DB_PATH, REQUIRED_TABLES),
+                            timeout=REBUILD_TIMEOUT, budget=_rebuild_budget, logger=logger):
+        logger.info(f"  ✅ 数据库重建成功 (耗时 {time.monotonic() - start:.1f}s)")
+        return
+
+    logger.error("  ❌ 重建超时。")
+
+async def restart_sms_services_async(device_id, logger):
+    logger.info("  [Restart] 重启服务与 UI...")
+    await kill_softly_async(device_id, PKG_PHONE, logger)
+    await run_adb_async(device_id, ["shell", f"pm clear {PKG_MSG}"], logger=logger)
+    await wait_for_async(device_id, "phone respawn", process_alive(PKG_PHONE), timeout=5, budget=1, logger=logger)
+    await run_adb_async(device_id, ["shell", f"monkey -p {PKG_MSG} -c android.intent.category.LAUNCHER 1"], logger=logger)
+
+async def inject_sms_host_async(device_id, temp_dir, items, logger):
+    start = time.perf_counter()
+    key = None
+    if artifact_cache.enabled():
+        facts = await get_device_facts_async(device_id, logger)
+        key = _template_key(facts, await _template_script().run_async(device_id, logger), logger)
+    local_dir = await run_blocking(_reset_local_dir, temp_dir, device_id)
+    template = await artifact_cache.lookup_async(PKG_TELEPHONY, key, device_id)
+    try:
+        if not template:
+            await run_adb_async(device_id, ["pull", REMOTE_DB_DIR, local_dir], logger=logger)
+        local_db = await run_blocking(_stage_local_db, template, local_dir, key)
+    finally:
+        artifact_cache.release(key, device_id)
+    if not local_db:
+        logger.warning("  拉取 mmssms.db 失败")
+        return None
+
+    # 批量模式下本地建库耗时与行数成正比，放到线程池中执行
+    count = await run_blocking(build_sms_db, local_db, items, int(time.time() * 1000), logger)
+    if count is None:
+        return None
+    await run_adb_async(device_id, ["push", local_db, REMOTE_TMP_DB], logger=logger, check=True)
+    if not _check_host_finish(await _host_finish_script().run_async(device_id, logger), count, logger):
+        return None
+    _log_host_rate(count, start, logger)
+    return count
+
+async def _try_host_build_async(device_id, temp_dir, items, logger):
+    try:
+        return await inject_sms_host_async(device_id, temp_dir, items, logger)
+    except Exception as e:
+        logger.warning(f"  主机端建库异常: {e}")
+        return None
+
+@traced("injector")
+async def inject_sms_msg_async(device_id, temp_dir, logger):
+    """inject_sms_msg 的 asyncio 版本"""
+    logger.info(">>> 注入 SMS (V12.4) <<<")
+    await ensure_sms_environment_async(device_id, logger)
+
+    sms_data, total = _load_sms(logger)
+    if not total:
+        logger.error("无 SMS 数据配置。")
+        return
+
+    if SMS_HOST_BUILD:
+        if await _try_host_build_async(device_id, temp_dir, sms_data, logger):
+            await restart_sms_services_async(device_id, logger)
+            logger.info("✅ SMS 注入全部完成 (主机端建库)。")
+            return
+        logger.warning("  主机端建库失败，改为设备端 SQL 脚本注入。")
+        sms_data, total = _load_sms(logger)
+
+    logger.info("  [Inject] 单事务 SQL 脚本: 清空短信与会话表并插入数据...")
+    start = time.perf_counter()
+    script = await run_blocking(sms_sql_script, sms_data, int(time.time() * 1000))
+    result = await script.run_async(device_id, logger)
+    if not _check_script_result(result, logger):
+        logger.error("  ❌ 数据验证失败：数据库为空！")
+        return
+    _log_script_rate(result, start, logger)
+
+    logger.info("  [Inject] 刷新 WAL 并递归修复权限...")
+    logger.info("  [Permission] 递归修复数据库权限 (Owner: 1001:1001)...")
+    await _script_finish_script().run_async(device_id, logger)
+
+    await restart_sms_services_async(device_id, logger)
+    logger.info("✅ SMS 注入全部完成 (已执行 verify 与 pm clear)。")
+
+async def inject_contacts_bulk_async(device_id, items, logger):
+    start = time.perf_counter()
+    schema = parse_contacts_schema(await contacts_probe_script().run_async(device_id, logger))
+    if not schema:
+        logger.warning("  无法读取 contacts2.db 表结构")
+        return None
+    script = await run_blocking(contacts_sql_script, items, schema)
+    count = _contacts_count(await script.run_async(device_id, logger), logger)
+    if count is None:
+        return None
+    facts = await get_device_facts_async(device_id, logger)
+    uid = await facts.package_uid_async(PKG_CONTACTS_STORAGE, logger)
+    await _contacts_finish_script(uid).run_async(device_id, logger)
+    _log_contacts_rate(count, start, logger)
+    return count
+
+async def _inject_contacts_each_async(device_id, items, logger):
+    for item in items:
+        name = item.get("name")
+        phone = item.get("phone")
+        if not name or not phone:
+            continue
+
+        out, _ = await run_adb_async(device_id, ["shell", CMD_RAW_CONTACT_INSERT], logger=logger)
+        raw_id = _parse_insert_id(out)
+        if not raw_id:
+            raw_id = await get_last_insert_id_async(device_id, "content://com.android.contacts/raw_contacts", logger)
+        if not raw_id: continue
+
+        cmd_name, cmd_phone = _contact_data_cmds(raw_id, name, phone)
+        await run_adb_async(device_id, ["shell", cmd_name], logger=logger)
+        await run_adb_async(device_id, ["shell", cmd_phone], logger=logger)
+        logger.info(f"  已注入: {name} (ID: {raw_id})")
+
+    await kill_softly_async(device_id, PROC_ACORE, logger)
+    await run_adb_async(device_id, ["shell", f"am force-stop {PKG_CONTACTS}"], logger=logger)
+
+@traced("injector")
+async def inject_contacts_async(device_id, logger):
+    """inject_contacts 的 asyncio 版本"""
+    logger.info(">>> 注入系统联系人 (Fixed) <<<")
+
+    await run_adb_async(device_id, ["shell", CMD_RAW_CONTACT_QUERY], logger=logger)
+
+    contacts_data, _ = _load_contacts(logger)
+    if CONTACTS_BULK:
+        try:
+            if await inject_contacts_bulk_async(device_id, contacts_data, logger) is not None:
+                logger.info("✅ 联系人注入完成 (SQL 脚本)。")
+                return
+        except Exception as e:
+            logger.warning(f"  联系人 SQL 脚本注入异常: {e}")
+        logger.warning("  联系人 SQL 脚本注入失败，改为逐个 content insert。")
+        contacts_data, _ = _load_contacts(logger)
+    await _inject_contacts_each_async(device_id, contacts_data, logger)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+首次启动状态注入: 用 shared_prefs 模板代替引导页
+
+模板 = 某个应用版本走完引导页后的整个 shared_prefs 目录，按版本保存在
+    PREFS_TEMPLATE_DIR/<包名>/<versionCode>/*.xml
+应用 (每次流水线):
+    一条 `adb exec-in` 把模板 tar 流送进设备，同一条命令里 force-stop、替换 shared_prefs、
+    按本机 UID chown、restorecon；之后应用启动直接进入主界面并自行建库，不需要任何界面操作。
+采集:
+    设备上没有当前版本的模板时由调用方走引导页，走完后 capture_template 从该设备打包保存。
+
+设备上的 versionCode 没有对应模板、或注入后应用没有按时完成初始化 (模板与版本不符)，
+都由调用方退回引导页；失效的模板会被删除，下一次引导页走完后重新采集。
+注意: 模板中的首次启动时间等取值停留在采集时刻。
+"""
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+
+from config import PREFS_TEMPLATE_DIR
+from device_facts import get_device_facts, get_device_facts_async
+from utils import run_adb, run_adb_async, run_blocking
+from tracing import traced
+
+PREFS_SUBDIR = "shared_prefs"
+OK_MARK = "__PREFS_OK__"
+
+
+def _remote_capture_path(pkg):
+    return f"/data/local/tmp/prefs_{pkg}.tar"
+
+
+def template_dir(pkg, version):
+    return os.path.join(PREFS_TEMPLATE_DIR, pkg, str(version))
+
+
+def template_versions(pkg):
+    root = os.path.join(PREFS_TEMPLATE_DIR, pkg)
+    return sorted(os.listdir(root)) if os.path.isdir(root) else []
+
+
+def unusable_reason(pkg, version):
+    """该版本不能用模板跳过引导页的原因；可用时返回 None"""
+    if not version:
+        return "无法获取 versionCode"
+    path = template_dir(pkg, version)
+    if not os.path.isdir(path) or not any(n.endswith(".xml") for n in os.listdir(path)):
+        known = ", ".join(template_versions(pkg)) or "无"
+        return f"没有 versionCode {version} 的模板 (已有: {known})"
+    return None
+
+
+def drop_template(pkg, version):
+    shutil.rmtree(template_dir(pkg, version), ignore_errors=True)
+
+
+def _build_archive(pkg, version):
+    """把模板打成 shared_prefs/*.xml 的 tar，返回临时文件路径 (调用方删除)"""
+    src = template_dir(pkg, version)
+    fd, path = tempfile.mkstemp(prefix=f"prefs_{pkg}_", suffix=".tar")
+    os.close(fd)
+    with tarfile.open(path, "w") as tar:
+        for name in sorted(os.listdir(src)):
+            if name.endswith(".xml"):
+                tar.add(os.path.join(src, name), arcname=f"{PREFS_SUBDIR}/{name}")
+    return path
+
+
+def apply_command(pkg, uid):
+    """停止应用、替换 shared_prefs、修正属主与 SELinux 标签，全部成功才输出 OK_MARK"""
+    base = f"/data/data/{pkg}"
+    return " && ".join([
+        f"am force-stop {pkg}",
+        f"rm -rf {base}/{PREFS_SUBDIR}",
+        f"mkdir -p {base}",
+        f"tar -xf - -C {base}",
+        f"chown -R {uid}:{uid} {base}/{PREFS_SUBDIR}",
+        f"chmod 771 {base}/{PREFS_SUBDIR}",
+        f"restorecon -R {base}/{PREFS_SUBDIR}",
+        f"echo {OK_MARK}",
+    ])
+
+
+def _usable_version(pkg, version, logger):
+    """模板可用时返回 versionCode，否则返回 None"""
+    reason = unusable_reason(pkg, version)
+    if reason:
+        logger.info(f"{pkg} 无法跳过引导页 ({reason})，使用引导页。")
+        return None
+    return version
+
+
+def _prepare_apply(pkg, uid, logger):
+    """返回设备端命令；查不到 UID 时为 None"""
+    if not uid:
+        logger.warning(f"无法获取 {pkg} 的 UID，使用引导页。")
+        return None
+    return apply_command(pkg, uid)
+
+
+def _check_apply(pkg, version, out, err, logger):
+    if OK_MARK not in (out or ""):
+        logger.error(f"{pkg} 首次启动状态注入失败: {err or out}")
+        return False
+    logger.info(f"{pkg} 已注入首次启动状态 (模板 versionCode {version})")
+    return True
+
+
+def _capture_script(pkg):
+    remote = _remote_capture_path(pkg)
+    return f"am force-stop {pkg} && cd /data/data/{pkg} && tar -cf {remote} {PREFS_SUBDIR}"
+
+
+def _extract_template(pkg, version, archive, logger):
+    """只保留 shared_prefs/ 下的 .xml，原子替换旧模板"""
+    dst = template_dir(pkg, version)
+    tmp = f"{dst}.{threading.get_ident()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    count = 0
+    with tarfile.open(archive) as tar:
+        for member in tar.getmembers():
+            head, name = os.path.split(member.name)
+            if not member.isfile() or head != PREFS_SUBDIR or not name.endswith(".xml"):
+                continue
+            with tar.extractfile(member) as src, open(os.path.join(tmp, name), "wb") as f:
+                shutil.copyfileobj(src, f)
+            count += 1
+    if not count:
+        shutil.rmtree(tmp, ignore_errors=True)
+        logger.warning(f"{pkg} 没有 shared_prefs，未保存模板。")
+        return False
+    shutil.rmtree(dst, ignore_errors=True)
+    try:
+        os.replace(tmp, dst)
+    except OSError:
+        # 另一台设备同时采集并已保存
+        shutil.rmtree(tmp, ignore_errors=True)
+    logger.info(f"{pkg} 首次启动模板已保存: {dst} ({count} 个文件)")
+    return True
+
+# ==================== 同步 ====================
+
+@traced("wizard")
+def apply_template(device_id, pkg, logger):
+    """注入成功返回使用的 versionCode，模板不可用或失败返回 None"""
+    facts = get_device_facts(device_id, logger)
+    version = _usable_version(pkg, facts.version_code(pkg, logger), logger)
+    if not version:
+        return None
+    cmd = _prepare_apply(pkg, facts.package_uid(pkg, logger), logger)
+    if not cmd:
+        return None
+    archive = _build_archive(pkg, version)
+    try:
+        out, err = run_adb(device_id, ["exec-in", cmd], logger=logger, stdin_path=archive)
+    finally:
+        os.remove(archive)
+    return version if _check_apply(pkg, version, out, err, logger) else None
+
+
+@traced("wizard")
+def capture_template(device_id, pkg, logger):
+    """引导页走完后从设备采集当前版本的模板"""
+    version = get_device_facts(device_id, logger).version_code(pkg, logger)
+    if not version:
+        return False
+    remote = _remote_capture_path(pkg)
+    fd, archive = tempfile.mkstemp(prefix=f"prefs_{pkg}_", suffix=".tar")
+    os.close(fd)
+    try:
+        run_adb(device_id, ["shell", _capture_script(pkg)], logger=logger, check=True)
+        run_adb(device_id, ["pull", remote, archive], logger=logger, check=True)
+        return _extract_template(pkg, version, archive, logger)
+    except Exception as e:
+        logger.warning(f"{pkg} 首次启动模板采集失败: {e}")
+        return False
+    finally:
+        run_adb(device_id, ["shell", f"rm -f {remote}"], logger=logger)
+        os.remove(archive)
+
+# ==================== 异步 ====================
+
+@traced("wizard")
+async def apply_template_async(device_id, pkg, logger):
+    facts = await get_device_facts_async(device_id, logger)
+    version = _usable_version(pkg, await facts.version_code_async(pkg, logger), logger)
+    if not version:
+        return None
+    cmd = _prepare_apply(pkg, await facts.package_uid_async(pkg, logger), logger)
+    if not cmd:
+        return None
+    archive = await run_blocking(_build_archive, pkg, version)
+    try:
+        out, err = await run_adb_async(device_id, ["exec-in", cmd], logger=logger, stdin_path=archive)
+    finally:
+        os.remove(archive)
+    return version if _check_apply(pkg, version, out, err, logger) else None
+
+
+@traced("wizard")
+async def capture_template_async(device_id, pkg, logger):
+    facts = await get_device_facts_async(device_id, logger)
+    version = await facts.version_code_async(pkg, logger)
+    if not version:
+        return False
+    remote = _remote_capture_path(pkg)
+    fd, archive = tempfile.mkstemp(prefix=f"prefs_{pkg}_", suffix=".tar")
+    os.close(fd)
+    try:
+        await run_adb_async(device_id, ["shell", _capture_script(pkg)], logger=logger, check=True)
+        await run_adb_async(device_id, ["pull", remote, archive], logger=logger, check=True)
+        return await run_blocking(_extract_template, pkg, version, archive, logger)
+    except Exception as e:
+        logger.warning(f"{pkg} 首次启动模板采集失败: {e}")
+        return False
+    finally:
+        await run_adb_async(device_id, ["shell", f"rm -f {remote}"], logger=logger)
+        os.remove(archive)
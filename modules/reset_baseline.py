@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+差异重置的基线: 每个包 /data/data/<pkg> 的数据指纹
+
+指纹 = 包目录下所有条目 (路径, 大小, mtime, inode) 排序后的 md5，一次设备端循环算完全部包。
+每次重置某个包后立即记录它的指纹作为基线；下一次重置时只处理指纹发生变化的包。
+
+基线按设备保存在 RESET_BASELINE_DIR/<device_id>.json，以下情况视为失效 (退回全量重置):
+  - 设备重启过 (boot_id 变化)；
+  - 包列表或 versionCode 变化 (安装 / 卸载 / 升级)；
+  - 超过 RESET_BASELINE_MAX_AGE 秒。
+"""
+import hashlib
+import json
+import os
+import time
+
+from config import RESET_BASELINE_DIR, RESET_BASELINE_MAX_AGE
+from utils import run_adb, run_adb_async
+
+FP_MARK = "__FP__"
+BOOT_MARK = "__BOOT__"
+
+
+# ==================== 设备端指纹 ====================
+
+def fingerprint_command(pkgs):
+    """输出一行 boot_id，以及每个包一行 "<标记> <包名> <md5>" (目录不存在时为空串的 md5)"""
+    return (
+        f"echo \"{BOOT_MARK} $(cat /proc/sys/kernel/random/boot_id 2>/dev/null)\"; "
+        f"cd /data/data || exit 1; "
+        f"for p in {' '.join(pkgs)}; do "
+        f"h=$(find $p -exec stat -c '%n %s %Y %i' {{}} + 2>/dev/null | sort | md5sum); "
+        f"echo \"{FP_MARK} $p ${{h%% *}}\"; done"
+    )
+
+
+def parse_fingerprints(out):
+    """返回 (boot_id, {包名: 指纹})"""
+    boot_id, fps = None, {}
+    for line in (out or "").splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0] == BOOT_MARK:
+            boot_id = parts[1]
+        elif len(parts) == 3 and parts[0] == FP_MARK:
+            fps[parts[1]] = parts[2]
+    return boot_id, fps
+
+
+def collect_fingerprints(device_id, pkgs, logger=None):
+    if not pkgs:
+        return None, {}
+    out, _ = run_adb(device_id, ["shell", fingerprint_command(pkgs)], logger=logger)
+    return parse_fingerprints(out)
+
+
+async def collect_fingerprints_async(device_id, pkgs, logger=None):
+    if not pkgs:
+        return None, {}
+    out, _ = await run_adb_async(device_id, ["shell", fingerprint_command(pkgs)], logger=logger)
+    return parse_fingerprints(out)
+
+
+# ==================== 基线存取 ====================
+
+def packages_signature(facts):
+    """包列表 + versionCode 的摘要，用于发现安装 / 卸载 / 升级"""
+    items = sorted(f"{pkg}:{facts.version_code(pkg) or ''}" for pkg in facts.packages())
+    return hashlib.sha1("\n".join(items).encode("utf-8")).hexdigest()
+
+
+def _baseline_path(device_id):
+    # 网络设备的序列号形如 192.168.1.2:5555
+    return os.path.join(RESET_BASELINE_DIR, f"{device_id.replace(':', '_')}.json")
+
+
+def load_baseline(device_id):
+    try:
+        with open(_baseline_path(device_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def update_baseline(device_id, baseline, boot_id, packages_sig, fps):
+    """
+    把刚重置过的包的指纹并入基线并写盘。
+    boot_id / 包列表与旧基线不一致时旧条目全部作废，只保留本次的指纹。
+    """
+    if not boot_id:
+        return baseline
+    if not baseline or baseline.get("boot_id") != boot_id or baseline.get("packages_sig") != packages_sig:
+        baseline = {"boot_id": boot_id, "packages_sig": packages_sig, "created": time.time(), "packages": {}}
+    baseline["packages"].update(fps)
+    os.makedirs(RESET_BASELINE_DIR, exist_ok=True)
+    path = _baseline_path(device_id)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+    return baseline
+
+
+# ==================== 差异判断 ====================
+
+def stale_reason(baseline, boot_id, packages_sig, now=None):
+    """基线不可用的原因；可用时返回 None"""
+    if not baseline:
+        return "没有基线"
+    if not boot_id:
+        return "无法读取 boot_id"
+    if baseline.get("boot_id") != boot_id:
+        return "设备已重启"
+    if baseline.get("packages_sig") != packages_sig:
+        return "包列表或版本已变化"
+    age = (now or time.time()) - baseline.get("created", 0)
+    if age > RESET_BASELINE_MAX_AGE:
+        return f"基线已超过 {RESET_BASELINE_MAX_AGE} 秒"
+    return None
+
+
+def diff_targets(baseline, fps, targets):
+    """
+    对比当前指纹与基线，返回 (待重置列表, {包名: 原因})。
+    原因: "new" 基线中没有 / "changed" 指纹变化或本次未取到 / "unchanged" 未变化 (跳过)
+    """
+    known = baseline.get("packages", {})
+    to_reset, reasons = [], {}
+    for pkg in targets:
+        if pkg not in known:
+            reasons[pkg] = "new"
+        elif known[pkg] != fps.get(pkg):
+            reasons[pkg] = "changed"
+        else:
+            reasons[pkg] = "unchanged"
+            continue
+        to_reset.append(pkg)
+    return to_reset, reasons
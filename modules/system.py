@@ -1,9 +1,13 @@
 # modules/system.py
 # -*- coding: utf-8 -*-
 import re
-import time
-from utils import run_adb
-from config import SAFE_PACKAGES_REGEX, PKG_TELEPHONY, PKG_CONTACTS_STORAGE
+from utils import run_adb, run_adb_async, run_blocking
+from adb_script import ShellScript
+from device_facts import get_device_facts, get_device_facts_async
+from config import (SAFE_PACKAGES_REGEX, PKG_TELEPHONY, PKG_CONTACTS_STORAGE, CLEAN_BULK, CLEAN_DIFF,
+                    CLEAN_BULK_PKG_TIMEOUT)
+from modules import reset_baseline
+from readiness import wait_for, wait_for_async, all_of, process_alive, provider_ready, focused_activity
 
 # 定义关键系统服务的宿主进程
 SYSTEM_PROCESS_MAP = {
@@ -12,72 +16,269 @@ SYSTEM_PROCESS_MAP = {
     "com.android.providers.media": ["android.process.media"]
 }
 
+# 系统存储服务对应的 Provider，深度清理后以能应答查询为就绪
+SYSTEM_PROVIDER_URIS = {
+    PKG_TELEPHONY: "content://sms",
+    PKG_CONTACTS_STORAGE: "content://com.android.contacts/raw_contacts",
+}
+
+# 批量重置脚本中每个包输出一行: "<标记> <包名> <退出码> <pm 输出>"
+RESET_MARK = "__RESET__"
+
 def go_home(device_id, logger):
     logger.info("回到桌面...")
     run_adb(device_id, ["shell", "input", "keyevent", "KEYCODE_HOME"], logger=logger)
-    time.sleep(1)
+    wait_for(device_id, "go home", focused_activity("launcher"), timeout=5, budget=1, logger=logger)
+
+def respawn_probe(cleaned_pkgs):
+    """深度清理过的系统存储服务: 宿主进程已重生且 Provider 能应答；没有则返回 None"""
+    probes = []
+    for pkg in cleaned_pkgs:
+        if pkg not in SYSTEM_PROCESS_MAP: continue
+        probes += [process_alive(proc) for proc in SYSTEM_PROCESS_MAP[pkg]]
+        if pkg in SYSTEM_PROVIDER_URIS:
+            probes.append(provider_ready(SYSTEM_PROVIDER_URIS[pkg]))
+    return all_of(*probes)
+
+def _parse_pids(out):
+    return [pid for pid in (out or "").split() if pid.isdigit()]
 
 def kill_process_by_name(device_id, proc_name, logger):
     """查找并杀死指定名称的进程"""
     out, _ = run_adb(device_id, ["shell", f"pidof {proc_name}"], logger=logger)
-    if out:
-        pids = out.split()
-        for pid in pids:
-            if pid.isdigit():
-                logger.debug(f"  Killing system process {proc_name} (PID: {pid}) to force reload...")
-                run_adb(device_id, ["shell", f"kill {pid}"], logger=logger)
-
-def clean_background_apps(device_id, logger, exclude_pkgs=None):
-    if exclude_pkgs is None:
-        exclude_pkgs = []
-        
-    logger.info(f"=== 开始环境重置 (保留: {len(exclude_pkgs)} 个应用) ===")
-    
-    out, _ = run_adb(device_id, ["shell", "pm", "list", "packages"], logger=logger)
-    if not out: return
+    for pid in _parse_pids(out):
+        logger.debug(f"  Killing system process {proc_name} (PID: {pid}) to force reload...")
+        run_adb(device_id, ["shell", f"kill {pid}"], logger=logger)
 
-    all_packages = [line.split(":")[-1].strip() for line in out.splitlines() if line.startswith("package:")]
+def select_reset_targets(all_packages, exclude_pkgs):
+    """在主机端按白名单与保留列表筛选待重置的包，返回 (目标列表, 白名单跳过数)"""
     safe_patterns = [re.compile(p) for p in SAFE_PACKAGES_REGEX]
-
-    cleared = 0
-    skipped = 0
-    
+    targets, skipped = [], 0
     for pkg in all_packages:
         if not pkg: continue
-        
-        # 1. 检查白名单
-        is_safe = any(p.search(pkg) for p in safe_patterns)
-        if is_safe:
+        if any(p.search(pkg) for p in safe_patterns):
             skipped += 1
             continue
-            
-        # 2. 检查任务保留
         if pkg in exclude_pkgs:
             continue
-        
-        # 3. 执行清理
+        targets.append(pkg)
+    return targets, skipped
+
+def _split_deep(targets):
+    """(普通应用, 需要深度清理的系统存储服务)"""
+    return [p for p in targets if p not in SYSTEM_PROCESS_MAP], [p for p in targets if p in SYSTEM_PROCESS_MAP]
+
+def _bulk_reset_script(targets, fingerprint=False):
+    """
+    把全部 force-stop + pm clear 编成一个设备端循环；
+    SYSTEM_PROCESS_MAP 中的系统存储服务仍走物理删除 + 重启宿主进程。
+    fingerprint=True 时追加一步，记录普通应用重置后的数据指纹 (差异重置的基线)。
+    """
+    normal, deep = _split_deep(targets)
+    lines = []
+    if normal:
+        lines.append(
+            f"for p in {' '.join(normal)}; do am force-stop $p; r=$(pm clear $p 2>&1); "
+            f"echo \"{RESET_MARK} $p $? $r\"; done"
+        )
+    for pkg in deep:
+        lines.append(
+            f"am force-stop {pkg}; rm -rf /data/data/{pkg}/databases/* /data/data/{pkg}/cache/*; "
+            f"echo \"{RESET_MARK} {pkg} $? deep\""
+        )
+        for proc in SYSTEM_PROCESS_MAP[pkg]:
+            # 重启宿主进程 (关键步骤！否则进程会持有无效句柄)
+            lines.append(f"for pid in $(pidof {proc}); do kill $pid; done")
+    script = ShellScript()
+    script.add("\n".join(lines), name="bulk reset")
+    if fingerprint and normal:
+        script.add(reset_baseline.fingerprint_command(normal), name="fingerprint")
+    return script
+
+def _parse_bulk_reset(targets, step):
+    """解析批量重置输出，返回 {包名: 是否成功}；没有输出结果行的包视为失败"""
+    results = {pkg: False for pkg in targets}
+    for line in (step.stdout or "").splitlines():
+        parts = line.split(None, 3)
+        if len(parts) < 3 or parts[0] != RESET_MARK: continue
+        pkg, rc = parts[1], parts[2]
+        detail = parts[3] if len(parts) > 3 else ""
+        # pm clear 在部分系统上失败也返回 0，需要同时看输出
+        results[pkg] = rc == "0" and (detail == "deep" or "Success" in detail)
+    return results
+
+def _bulk_timeout(targets):
+    # 每个包预留 CLEAN_BULK_PKG_TIMEOUT 秒，至少 120 秒
+    return max(120, len(targets) * CLEAN_BULK_PKG_TIMEOUT)
+
+def _report_results(results, logger):
+    for pkg, ok in results.items():
+        if pkg in SYSTEM_PROCESS_MAP:
+            logger.info(f"  [Deep Clean] 深度清理系统服务: {pkg}")
+        if not ok:
+            logger.warning(f"  清理 {pkg} 失败")
+    return sum(1 for ok in results.values() if ok)
+
+def _plan_diff(baseline, boot_id, fps, packages_sig, targets, logger):
+    """
+    差异重置: 返回 (仍可用的基线或 None, 本次需要重置的包)。
+    基线失效时退回全量重置；系统存储服务不记录指纹，总是重置。
+    """
+    reason = reset_baseline.stale_reason(baseline, boot_id, packages_sig)
+    if reason:
+        logger.info(f"  差异重置不可用 ({reason})，执行全量重置")
+        return None, targets
+    normal, deep = _split_deep(targets)
+    to_reset, reasons = reset_baseline.diff_targets(baseline, fps, normal)
+    unchanged = [p for p in normal if reasons[p] == "unchanged"]
+    changed = sum(1 for r in reasons.values() if r == "changed")
+    logger.info(f"  差异重置: 数据有变化 {changed}, 无基线 {len(to_reset) - changed}, "
+                f"系统存储服务 {len(deep)}, 未变化跳过 {len(unchanged)}")
+    if unchanged:
+        logger.debug(f"  未变化跳过: {', '.join(unchanged)}")
+    return baseline, to_reset + deep
+
+def _record_baseline(device_id, baseline, packages_sig, results, steps, logger):
+    """把本次重置成功的普通应用的指纹写入基线"""
+    if len(steps) < 2: return
+    boot_id, fps = reset_baseline.parse_fingerprints(steps[1].stdout)
+    fps = {p: h for p, h in fps.items() if results.get(p)}
+    reset_baseline.update_baseline(device_id, baseline, boot_id, packages_sig, fps)
+    logger.debug(f"  已更新 {len(fps)} 个包的重置基线")
+
+def _clean_options(exclude_pkgs, bulk, diff):
+    return (exclude_pkgs or [], CLEAN_BULK if bulk is None else bulk, CLEAN_DIFF if diff is None else diff)
+
+def _reset_commands(pkg):
+    """逐包模式下重置一个包的 adb 命令；系统存储服务之后还要重启宿主进程"""
+    cmds = [["shell", "am", "force-stop", pkg]]
+    if pkg in SYSTEM_PROCESS_MAP:
+        # 特殊处理：系统核心存储服务物理删除数据库目录 (确保数据彻底消失)
+        cmds.append(["shell", f"rm -rf /data/data/{pkg}/databases/*"])
+        cmds.append(["shell", f"rm -rf /data/data/{pkg}/cache/*"])
+    else:
+        # 普通应用直接 pm clear
+        cmds.append(["shell", "pm", "clear", pkg])
+    return cmds
+
+def _clean_bulk(device_id, facts, targets, diff, logger):
+    """一次往返重置 targets (diff 时先剔除未变化的包)，返回 {包名: 是否成功}"""
+    baseline = packages_sig = None
+    if diff:
+        packages_sig = reset_baseline.packages_signature(facts)
+        baseline = reset_baseline.load_baseline(device_id)
+        boot_id, fps = None, {}
+        if baseline:
+            boot_id, fps = reset_baseline.collect_fingerprints(device_id, _split_deep(targets)[0], logger)
+        baseline, targets = _plan_diff(baseline, boot_id, fps, packages_sig, targets, logger)
+    if not targets:
+        return {}
+    steps = _bulk_reset_script(targets, fingerprint=diff).run(device_id, logger, timeout=_bulk_timeout(targets))
+    results = _parse_bulk_reset(targets, steps[0])
+    if diff: _record_baseline(device_id, baseline, packages_sig, results, steps, logger)
+    return results
+
+def _clean_each(device_id, targets, logger):
+    """逐包重置，返回 {包名: 是否成功}"""
+    results = {}
+    for pkg in targets:
         try:
-            # 常规应用：停止 + 清除
-            run_adb(device_id, ["shell", "am", "force-stop", pkg])
-            
-            # 特殊处理：如果是系统核心存储服务，执行物理删除 + 进程重启
-            if pkg in SYSTEM_PROCESS_MAP:
-                logger.info(f"  [Deep Clean] 深度清理系统服务: {pkg}")
-                # 物理删除数据库目录 (确保数据彻底消失)
-                run_adb(device_id, ["shell", f"rm -rf /data/data/{pkg}/databases/*"])
-                run_adb(device_id, ["shell", f"rm -rf /data/data/{pkg}/cache/*"])
-                
-                # 重启宿主进程 (关键步骤！否则进程会持有无效句柄)
-                for proc in SYSTEM_PROCESS_MAP[pkg]:
-                    kill_process_by_name(device_id, proc, logger)
-            else:
-                # 普通应用直接 pm clear
-                run_adb(device_id, ["shell", "pm", "clear", pkg])
-                
-            cleared += 1
+            for cmd in _reset_commands(pkg):
+                run_adb(device_id, cmd, logger=logger)
+            # 重启宿主进程 (关键步骤！否则进程会持有无效句柄)
+            for proc in SYSTEM_PROCESS_MAP.get(pkg, ()):
+                kill_process_by_name(device_id, proc, logger)
+            results[pkg] = True
         except Exception as e:
             logger.warning(f"  清理 {pkg} 失败: {e}")
-            
+            results[pkg] = False
+    return results
+
+def clean_background_apps(device_id, logger, exclude_pkgs=None, bulk=None, diff=None):
+    """
+    重置除白名单与 exclude_pkgs 外的所有应用，返回 {包名: 是否成功} (只含实际重置的包)。
+    bulk (默认 CLEAN_BULK) 为 True 时全部操作在一次 adb 往返内完成，否则逐包执行。
+    diff (默认 CLEAN_DIFF，仅 bulk 模式) 为 True 时跳过数据相对上次重置未变化的包。
+    """
+    exclude_pkgs, bulk, diff = _clean_options(exclude_pkgs, bulk, diff)
+    logger.info(f"=== 开始环境重置 (保留: {len(exclude_pkgs)} 个应用) ===")
+
+    # 包列表来自设备事实缓存 (pm clear 不会让其失效，两次重置共用一次查询)
+    facts = get_device_facts(device_id, logger)
+    all_packages = facts.packages(logger)
+    if not all_packages: return {}
+
+    targets, skipped = select_reset_targets(all_packages, exclude_pkgs)
+    if bulk:
+        results = _clean_bulk(device_id, facts, targets, diff, logger)
+    else:
+        results = _clean_each(device_id, targets, logger)
+    cleared = _report_results(results, logger)
     # 等待系统进程重生
-    time.sleep(3)
-    logger.info(f"环境重置完成: 清理 {cleared}, 跳过 {skipped}。")
\ No newline at end of file
+    wait_for(device_id, "clean respawn", respawn_probe(results), timeout=15, budget=3, logger=logger)
+    logger.info(f"环境重置完成: 清理 {cleared}, 跳过 {skipped}。")
+    return results
+
+# ==============================================================================
+# asyncio 版本
+# ==============================================================================
+
+async def go_home_async(device_id, logger):
+    logger.info("回到桌面...")
+    await run_adb_async(device_id, ["shell", "input", "keyevent", "KEYCODE_HOME"], logger=logger)
+    await wait_for_async(device_id, "go home", focused_activity("launcher"), timeout=5, budget=1, logger=logger)
+
+async def kill_process_by_name_async(device_id, proc_name, logger):
+    out, _ = await run_adb_async(device_id, ["shell", f"pidof {proc_name}"], logger=logger)
+    for pid in _parse_pids(out):
+        logger.debug(f"  Killing system process {proc_name} (PID: {pid}) to force reload...")
+        await run_adb_async(device_id, ["shell", f"kill {pid}"], logger=logger)
+
+async def _clean_bulk_async(device_id, facts, targets, diff, logger):
+    baseline = packages_sig = None
+    if diff:
+        packages_sig = reset_baseline.packages_signature(facts)
+        baseline = await run_blocking(reset_baseline.load_baseline, device_id)
+        boot_id, fps = None, {}
+        if baseline:
+            boot_id, fps = await reset_baseline.collect_fingerprints_async(device_id, _split_deep(targets)[0], logger)
+        baseline, targets = _plan_diff(baseline, boot_id, fps, packages_sig, targets, logger)
+    if not targets:
+        return {}
+    steps = await _bulk_reset_script(targets, fingerprint=diff).run_async(device_id, logger,
+                                                                          timeout=_bulk_timeout(targets))
+    results = _parse_bulk_reset(targets, steps[0])
+    if diff: await run_blocking(_record_baseline, device_id, baseline, packages_sig, results, steps, logger)
+    return results
+
+async def _clean_each_async(device_id, targets, logger):
+    results = {}
+    for pkg in targets:
+        try:
+            for cmd in _reset_commands(pkg):
+                await run_adb_async(device_id, cmd, logger=logger)
+            for proc in SYSTEM_PROCESS_MAP.get(pkg, ()):
+                await kill_process_by_name_async(device_id, proc, logger)
+            results[pkg] = True
+        except Exception as e:
+            logger.warning(f"  清理 {pkg} 失败: {e}")
+            results[pkg] = False
+    return results
+
+async def clean_background_apps_async(device_id, logger, exclude_pkgs=None, bulk=None, diff=None):
+    exclude_pkgs, bulk, diff = _clean_options(exclude_pkgs, bulk, diff)
+    logger.info(f"=== 开始环境重置 (保留: {len(exclude_pkgs)} 个应用) ===")
+
+    facts = await get_device_facts_async(device_id, logger)
+    all_packages = facts.packages(logger)
+    if not all_packages: return {}
+
+    targets, skipped = select_reset_targets(all_packages, exclude_pkgs)
+    if bulk:
+        results = await _clean_bulk_async(device_id, facts, targets, diff, logger)
+    else:
+        results = await _clean_each_async(device_id, targets, logger)
+    cleared = _report_results(results, logger)
+    await wait_for_async(device_id, "clean respawn", respawn_probe(results), timeout=15, budget=3, logger=logger)
+    logger.info(f"环境重置完成: 清理 {cleared}, 跳过 {skipped}。")
+    return results
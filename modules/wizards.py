@@ -1,73 +1,415 @@
 # -*- coding: utf-8 -*-
-import time
+"""
+应用首次启动引导页 (Wizard) 的自动处理
+
+按界面层级导航: 每一步一次往返取回 `uiautomator dump` 的层级和完成标志，
+找到定义中的 Skip / Next / Done / Continue ... 按钮就点它的中心，
+没有按钮、完成标志已出现且焦点在主界面 Activity 时立即结束。
+完成标志必须是应用私有目录下的文件 (pm clear 会删除)，外部存储上的目录跨轮次保留，不能作为标志。
+设备上没有 uiautomator 或取不到层级时退回旧的盲点底部区域。
+bypass=True 时先尝试注入 shared_prefs 模板直接跳过引导页 (见 modules/prefs_bypass.py)，
+没有当前版本的模板则走引导页并在走完后采集模板。
+每个应用的步数与耗时见 wizard_stats()。
+"""
+import asyncio
 import re
-from utils import run_adb
-from config import PKG_MARKOR, PKG_EXPENSE, PKG_TASKS
+import threading
+import time
+import xml.etree.ElementTree as ET
+from utils import run_adb, run_adb_async, run_blocking
+from input_batch import InputBatch
+from tracing import traced
+from device_facts import get_device_facts, get_device_facts_async
+from readiness import wait_for, wait_for_async, focused_activity, focus_matches, file_exists, all_of, FOCUS_COMMAND
+from modules import prefs_bypass
+from config import PKG_MARKOR, PKG_EXPENSE, PKG_TASKS, DB_EXPENSE_PATH, DB_TASKS_PATH
+
+# Markor 走完引导页后写入的默认 SharedPreferences
+MARKOR_PREFS_PATH = f"/data/data/{PKG_MARKOR}/shared_prefs/{PKG_MARKOR}_preferences.xml"
+
+# 各应用引导页定义 (纯数据):
+#   label       日志 / 统计用的名字
+#   launch_wait 启动等待预算 (秒，原固定等待时长)，超时为其 LAUNCH_TIMEOUT_FACTOR 倍
+#   settle      完成后等待预算 (秒)，同上
+#   ready_path  初始化完成的标志路径 (应用私有目录)
+#   main_activity  可选，完成时获得焦点的 Activity 名 (子串匹配)；标志可能在引导页期间就出现时使用
+#   buttons     要点的按钮，按优先级排列；匹配 text / content-desc (忽略大小写的整串正则)，
+#               "id/xxx" 形式匹配 resource-id 后缀
+#   max_steps   最多点击次数
+#   clicks      退回盲点时的底部点击轮数
+WIZARD_DEFS = {
+    # Markor 引导页通常有 5 页左右；shared_prefs 也会被注入的模板带来，因此同时要求回到 MainActivity
+    PKG_MARKOR: {"label": "Markor", "launch_wait": 3, "settle": 2, "ready_path": MARKOR_PREFS_PATH,
+                 "main_activity": "MainActivity",
+                 "buttons": ["Skip", "Done", "Next", "id/next", "id/done", "id/skip"], "max_steps": 8, "clicks": 6},
+    # Expense 引导页: Next -> Continue，等待 DB 写入
+    PKG_EXPENSE: {"label": "Expense", "launch_wait": 4, "settle": 3, "ready_path": DB_EXPENSE_PATH,
+                  "buttons": ["Continue", "Get started", "Next", "Allow", "OK"], "max_steps": 6, "clicks": 4},
+    # Org.Tasks 引导页: 也是类似 Welcome -> Get Started
+    PKG_TASKS: {"label": "Tasks", "launch_wait": 4, "settle": 3, "ready_path": DB_TASKS_PATH,
+                "buttons": ["Get started", "Continue", "Next", "Allow", "OK"], "max_steps": 6, "clicks": 4},
+}
+LAUNCH_TIMEOUT_FACTOR = 3
+# 窗口获得焦点后留给首帧绘制的时间 (仅盲点模式)
+LAUNCH_SETTLE = 0.5
+
+# 底部点击位置 (中下、右下、更靠下)
+BOTTOM_TAP_POINTS = [(0.5, 0.9), (0.85, 0.9), (0.85, 0.94)]
+TAP_INTERVAL = 0.5
+
+UI_DUMP_PATH = "/data/local/tmp/wizard_ui.xml"
+_SEP = "__WIZARD_SEP__"
+_READY = "__WIZARD_READY__"
+# 层级中没有按钮、应用也还没完成初始化时的重试间隔
+STEP_POLL = 0.3
+# 连续取不到层级时的容忍次数 (启动动画期间 uiautomator 常报 could not get idle state)，超过后才判定为没有界面
+DUMP_RETRIES = 3
+# 点击按钮后等待页面切换完成再导出下一次层级
+STEP_SETTLE = 0.5
+_BOUNDS_RE = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
 
 def get_screen_size(device_id, logger):
-    out, _ = run_adb(device_id, ["shell", "wm", "size"], logger=logger)
-    width, height = 1080, 1920
-    if out and "Physical size" in out:
-        match = re.search(r"(\d+)x(\d+)", out)
-        if match:
-            width = int(match.group(1))
-            height = int(match.group(2))
-    return width, height
+    # 屏幕尺寸来自设备事实缓存，三个 Wizard 共用一次查询
+    return get_device_facts(device_id, logger).screen_size(logger)
 
 def tap_percent(device_id, x_pct, y_pct, width, height, logger):
     """按屏幕百分比点击"""
-    x = int(width * x_pct)
-    y = int(height * y_pct)
-    run_adb(device_id, ["shell", f"input tap {x} {y}"], logger=logger)
+    InputBatch().tap_percent(x_pct, y_pct, width, height).run(device_id, logger)
     time.sleep(0.5)
 
-def tap_bottom_area(device_id, width, height, logger, clicks=1):
-    """疯狂点击底部区域 (Next/Done/Skip 通常在这里)"""
+def bottom_area_batch(width, height, clicks=1):
+    """疯狂点击底部区域 (Next/Done/Skip 通常在这里)，事件间隔在设备上等待"""
+    batch = InputBatch()
     for _ in range(clicks):
         # 尝试点击底部中间、右侧、右下角
-        tap_percent(device_id, 0.5, 0.9, width, height, logger) # 中下
-        tap_percent(device_id, 0.85, 0.9, width, height, logger) # 右下
-        tap_percent(device_id, 0.85, 0.94, width, height, logger) # 更靠下
+        for x_pct, y_pct in BOTTOM_TAP_POINTS:
+            batch.tap_percent(x_pct, y_pct, width, height).wait(TAP_INTERVAL)
         # 尝试发送 Enter 键 (物理键盘支持)
-        run_adb(device_id, ["shell", "input keyevent KEYCODE_ENTER"], logger=logger)
-        time.sleep(0.5)
-
-def init_markor(device_id, logger):
-    logger.info(f"正在初始化 {PKG_MARKOR}...")
-    run_adb(device_id, ["shell", "monkey", "-p", PKG_MARKOR, "-c", "android.intent.category.LAUNCHER", "1"], logger=logger)
-    time.sleep(3)
-    width, height = get_screen_size(device_id, logger)
-    
-    # Markor 引导页通常有 5 页左右
-    logger.debug("处理 Markor 引导页...")
-    tap_bottom_area(device_id, width, height, logger, clicks=6)
-    
-    time.sleep(2)
-    run_adb(device_id, ["shell", "am", "force-stop", PKG_MARKOR], logger=logger)
-
-def init_expense(device_id, logger):
-    logger.info(f"正在初始化 {PKG_EXPENSE}...")
-    run_adb(device_id, ["shell", "monkey", "-p", PKG_EXPENSE, "-c", "android.intent.category.LAUNCHER", "1"], logger=logger)
-    time.sleep(4) # 给更多启动时间
-    width, height = get_screen_size(device_id, logger)
-    
-    # Expense 引导页: Next -> Continue
-    logger.debug("处理 Expense 引导页...")
-    tap_bottom_area(device_id, width, height, logger, clicks=4)
-    
-    # 额外等待一下让 DB 写入
-    time.sleep(3)
-    run_adb(device_id, ["shell", "am", "force-stop", PKG_EXPENSE], logger=logger)
-
-def init_tasks(device_id, logger):
-    logger.info(f"正在初始化 {PKG_TASKS}...")
-    run_adb(device_id, ["shell", "monkey", "-p", PKG_TASKS, "-c", "android.intent.category.LAUNCHER", "1"], logger=logger)
-    time.sleep(4)
-    width, height = get_screen_size(device_id, logger)
-    
-    # Org.Tasks 引导页: 也是类似 Welcome -> Get Started
-    logger.debug("处理 Tasks 引导页...")
-    tap_bottom_area(device_id, width, height, logger, clicks=4)
-    
-    time.sleep(3)
-    run_adb(device_id, ["shell", "am", "force-stop", PKG_TASKS], logger=logger)
\ No newline at end of file
+        batch.key("ENTER").wait(TAP_INTERVAL)
+    return batch
+
+def tap_bottom_area(device_id, width, height, logger, clicks=1):
+    bottom_area_batch(width, height, clicks).run(device_id, logger)
+
+# ==================== 界面层级 ====================
+
+def _step_command(ready_path):
+    """一步的设备端命令: 导出界面层级，检查完成标志并输出当前焦点"""
+    return (f"uiautomator dump --compressed {UI_DUMP_PATH} >/dev/null 2>&1; cat {UI_DUMP_PATH} 2>/dev/null; "
+            f"rm -f {UI_DUMP_PATH}; echo {_SEP}; test -e {ready_path} && echo {_READY}; {FOCUS_COMMAND}; true")
+
+
+def parse_step(out, pkg=None, activity=None):
+    """
+    返回 (层级根节点，取不到时为 None, 是否已完成)；
+    给出 activity 时除完成标志外还要求焦点在 pkg 的该 Activity 上
+    """
+    dump, _, tail = (out or "").partition(_SEP)
+    ready = _READY in tail and (not activity or focus_matches(tail, pkg, activity))
+    start, end = dump.find("<hierarchy"), dump.rfind("</hierarchy>")
+    if start < 0 or end < 0:
+        return None, ready
+    try:
+        return ET.fromstring(dump[start:end + len("</hierarchy>")]), ready
+    except ET.ParseError:
+        return None, ready
+
+
+def _matches(node, pattern):
+    if pattern.startswith("id/"):
+        return node.get("resource-id", "").endswith(":" + pattern)
+    label = (node.get("text") or node.get("content-desc") or "").strip()
+    return re.fullmatch(pattern, label, re.IGNORECASE) is not None
+
+
+def find_button(root, buttons):
+    """按 buttons 的优先级找可见的按钮节点 (可点击的优先)，返回 (名称, (x, y)) 或 None"""
+    nodes = sorted(root.iter("node"), key=lambda n: n.get("clickable") != "true")
+    for pattern in buttons:
+        for node in nodes:
+            if node.get("enabled", "true") != "true" or not _matches(node, pattern):
+                continue
+            m = _BOUNDS_RE.fullmatch(node.get("bounds", ""))
+            if not m:
+                continue
+            l, t, r, b = map(int, m.groups())
+            if r > l and b > t:
+                return node.get("text") or node.get("content-desc") or pattern, ((l + r) // 2, (t + b) // 2)
+    return None
+
+# ==================== 统计 ====================
+
+_lock = threading.Lock()
+_stats = {}   # 标签 -> {"runs", "bypassed", "steps", "seconds", "fallbacks", "done"}
+
+
+def _record(label, steps, seconds, fallback, done, bypassed=False):
+    with _lock:
+        s = _stats.setdefault(label, {"runs": 0, "bypassed": 0, "steps": 0, "seconds": 0.0, "fallbacks": 0,
+                                      "done": 0})
+        s["runs"] += 1
+        s["bypassed"] += int(bypassed)
+        s["steps"] += steps
+        s["seconds"] += seconds
+        s["fallbacks"] += int(fallback)
+        s["done"] += int(done)
+
+
+def wizard_stats():
+    with _lock:
+        return {k: dict(v) for k, v in _stats.items()}
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+
+def stats_table():
+    rows = wizard_stats()
+    header = f"{'wizard':<12}{'runs':>6}{'bypass':>8}{'steps':>7}{'avg steps':>11}{'seconds':>9}{'avg(s)':>8}{'fallback':>10}{'done':>6}"
+    lines = [header, "-" * len(header)]
+    for label, s in sorted(rows.items()):
+        runs = s["runs"] or 1
+        lines.append(f"{label[:11]:<12}{s['runs']:>6}{s['bypassed']:>8}{s['steps']:>7}{s['steps'] / runs:>11.1f}{s['seconds']:>9.2f}"
+                     f"{s['seconds'] / runs:>8.2f}{s['fallbacks']:>10}{s['done']:>6}")
+    return "\n".join(lines)
+
+# ==================== 引导页 ====================
+
+def _step_timeout(wdef):
+    return (wdef["launch_wait"] + wdef["settle"]) * LAUNCH_TIMEOUT_FACTOR
+
+
+def _launch_command(pkg):
+    return ["shell", "monkey", "-p", pkg, "-c", "android.intent.category.LAUNCHER", "1"]
+
+
+def _decide(out, pkg, wdef, steps, failures, deadline):
+    """
+    根据一步的输出决定下一步: ("tap", (名称, (x, y))) / ("poll", None) / ("retry", None) / ("end", 结果)；
+    failures 为此前连续取不到层级的次数，"retry" 表示本次也没取到、稍后重试。结果为
+    "ready" (完成标志已出现且焦点在主界面) / "no-ui" (连续 DUMP_RETRIES 次以上取不到层级) / "max-steps" / "timeout"
+    """
+    root, ready = parse_step(out, pkg, wdef.get("main_activity"))
+    if root is None:
+        if ready and steps:
+            return "end", "ready"
+        if failures < DUMP_RETRIES and time.monotonic() < deadline:
+            return "retry", None
+        return "end", "no-ui"
+    button = find_button(root, wdef["buttons"])
+    if button is None:
+        if ready:
+            return "end", "ready"
+    elif steps >= wdef["max_steps"]:
+        return "end", "max-steps"
+    else:
+        return "tap", button
+    if time.monotonic() >= deadline:
+        return "end", "timeout"
+    return "poll", None
+
+
+def _log_tap(wdef, steps, button, logger):
+    name, (x, y) = button
+    logger.debug(f"  [{wdef['label']}] 第 {steps + 1} 步: 点击 {name} ({x}, {y})")
+    return x, y
+
+
+def navigate(device_id, pkg, wdef, logger):
+    """按界面层级走完引导页，返回 (点击次数, 结果)，结果见 _decide"""
+    cmd = _step_command(wdef["ready_path"])
+    deadline = time.monotonic() + _step_timeout(wdef)
+    steps = failures = 0
+    while True:
+        out, _ = run_adb(device_id, ["shell", cmd], logger=logger)
+        action, arg = _decide(out, pkg, wdef, steps, failures, deadline)
+        if action == "end":
+            return steps, arg
+        failures = failures + 1 if action == "retry" else 0
+        if action == "tap":
+            InputBatch().tap(*_log_tap(wdef, steps, arg, logger)).run(device_id, logger)
+            steps += 1
+            time.sleep(STEP_SETTLE)
+        else:
+            time.sleep(STEP_POLL)
+
+
+def _ready_probe(pkg, wdef):
+    """应用在前台 (定义了 main_activity 时须是该 Activity) 且完成标志已出现"""
+    return all_of(focused_activity(pkg, wdef.get("main_activity")), file_exists(wdef["ready_path"]))
+
+
+def _done_probe(pkg, wdef):
+    """引导页结束后的完成条件: 完成标志，定义了 main_activity 时同 _ready_probe"""
+    return _ready_probe(pkg, wdef) if wdef.get("main_activity") else file_exists(wdef["ready_path"])
+
+
+def _navigate_result(label, steps, result, logger):
+    """导航结束后的处理: 取不到层级时返回 True (需要退回盲点底部区域)"""
+    if result == "no-ui":
+        logger.warning(f"  [{label}] 无法获取界面层级，改为点击底部区域")
+        return True
+    if result != "ready":
+        logger.warning(f"  [{label}] 引导页未走完 ({result}, {steps} 步)")
+    return False
+
+
+def _finish(label, steps, start, result, done, logger):
+    elapsed = time.monotonic() - start
+    _record(label, steps, elapsed, result == "no-ui", done, bypassed=result == "bypassed")
+    if result == "bypassed":
+        logger.info(f"{label} 已跳过引导页 ({elapsed:.2f}s)")
+    else:
+        logger.info(f"{label} 引导页: {steps} 步, {elapsed:.2f}s")
+
+
+def _reset_prefs_command(pkg):
+    return f"am force-stop {pkg} && rm -rf /data/data/{pkg}/{prefs_bypass.PREFS_SUBDIR}"
+
+
+def _try_bypass(device_id, pkg, wdef, logger):
+    """注入首次启动状态并启动应用，到达主界面且初始化完成返回 True"""
+    label = wdef["label"]
+    version = prefs_bypass.apply_template(device_id, pkg, logger)
+    if not version:
+        return False
+    run_adb(device_id, _launch_command(pkg), logger=logger)
+    budget = wdef["launch_wait"] + wdef["settle"]
+    if wait_for(device_id, f"{label} bypass", _ready_probe(pkg, wdef), timeout=budget * LAUNCH_TIMEOUT_FACTOR,
+                budget=budget, logger=logger):
+        run_adb(device_id, ["shell", "am", "force-stop", pkg], logger=logger)
+        return True
+    logger.warning(f"  [{label}] 注入首次启动状态后未完成初始化，删除模板 {version} 并改走引导页")
+    prefs_bypass.drop_template(pkg, version)
+    run_adb(device_id, ["shell", _reset_prefs_command(pkg)], logger=logger)
+    return False
+
+
+def init_app(device_id, pkg, logger, bypass=False):
+    wdef = WIZARD_DEFS[pkg]
+    label = wdef["label"]
+    logger.info(f"正在初始化 {pkg}...")
+    start = time.monotonic()
+    if bypass and _try_bypass(device_id, pkg, wdef, logger):
+        _finish(label, 0, start, "bypassed", True, logger)
+        return
+    run_adb(device_id, _launch_command(pkg), logger=logger)
+    wait_for(device_id, f"{label} launch", focused_activity(pkg), timeout=wdef["launch_wait"] * LAUNCH_TIMEOUT_FACTOR,
+             budget=wdef["launch_wait"], logger=logger)
+
+    logger.debug(f"处理 {label} 引导页...")
+    steps, result = navigate(device_id, pkg, wdef, logger)
+    if _navigate_result(label, steps, result, logger):
+        time.sleep(LAUNCH_SETTLE)
+        width, height = get_screen_size(device_id, logger)
+        tap_bottom_area(device_id, width, height, logger, clicks=wdef["clicks"])
+
+    done = result == "ready" or wait_for(device_id, f"{label} ready", _done_probe(pkg, wdef),
+                                         timeout=wdef["settle"] * LAUNCH_TIMEOUT_FACTOR, budget=wdef["settle"],
+                                         logger=logger)
+    run_adb(device_id, ["shell", "am", "force-stop", pkg], logger=logger)
+    _finish(label, steps, start, result, done, logger)
+    if bypass and done:
+        prefs_bypass.capture_template(device_id, pkg, logger)
+
+@traced("wizard")
+def init_markor(device_id, logger, bypass=False):
+    init_app(device_id, PKG_MARKOR, logger, bypass)
+
+@traced("wizard")
+def init_expense(device_id, logger, bypass=False):
+    init_app(device_id, PKG_EXPENSE, logger, bypass)
+
+@traced("wizard")
+def init_tasks(device_id, logger, bypass=False):
+    init_app(device_id, PKG_TASKS, logger, bypass)
+
+# ==============================================================================
+# asyncio 版本 (单事件循环驱动多设备，等待期间不占线程)
+# ==============================================================================
+
+async def get_screen_size_async(device_id, logger):
+    facts = await get_device_facts_async(device_id, logger)
+    return facts.screen_size(logger)
+
+async def tap_percent_async(device_id, x_pct, y_pct, width, height, logger):
+    await InputBatch().tap_percent(x_pct, y_pct, width, height).run_async(device_id, logger)
+    await asyncio.sleep(0.5)
+
+async def tap_bottom_area_async(device_id, width, height, logger, clicks=1):
+    await bottom_area_batch(width, height, clicks).run_async(device_id, logger)
+
+async def navigate_async(device_id, pkg, wdef, logger):
+    cmd = _step_command(wdef["ready_path"])
+    deadline = time.monotonic() + _step_timeout(wdef)
+    steps = failures = 0
+    while True:
+        out, _ = await run_adb_async(device_id, ["shell", cmd], logger=logger)
+        action, arg = _decide(out, pkg, wdef, steps, failures, deadline)
+        if action == "end":
+            return steps, arg
+        failures = failures + 1 if action == "retry" else 0
+        if action == "tap":
+            await InputBatch().tap(*_log_tap(wdef, steps, arg, logger)).run_async(device_id, logger)
+            steps += 1
+            await asyncio.sleep(STEP_SETTLE)
+        else:
+            await asyncio.sleep(STEP_POLL)
+
+async def _try_bypass_async(device_id, pkg, wdef, logger):
+    label = wdef["label"]
+    version = await prefs_bypass.apply_template_async(device_id, pkg, logger)
+    if not version:
+        return False
+    await run_adb_async(device_id, _launch_command(pkg), logger=logger)
+    budget = wdef["launch_wait"] + wdef["settle"]
+    if await wait_for_async(device_id, f"{label} bypass", _ready_probe(pkg, wdef),
+                            timeout=budget * LAUNCH_TIMEOUT_FACTOR, budget=budget, logger=logger):
+        await run_adb_async(device_id, ["shell", "am", "force-stop", pkg], logger=logger)
+        return True
+    logger.warning(f"  [{label}] 注入首次启动状态后未完成初始化，删除模板 {version} 并改走引导页")
+    await run_blocking(prefs_bypass.drop_template, pkg, version)
+    await run_adb_async(device_id, ["shell", _reset_prefs_command(pkg)], logger=logger)
+    return False
+
+async def init_app_async(device_id, pkg, logger, bypass=False):
+    wdef = WIZARD_DEFS[pkg]
+    label = wdef["label"]
+    logger.info(f"正在初始化 {pkg}...")
+    start = time.monotonic()
+    if bypass and await _try_bypass_async(device_id, pkg, wdef, logger):
+        _finish(label, 0, start, "bypassed", True, logger)
+        return
+    await run_adb_async(device_id, _launch_command(pkg), logger=logger)
+    await wait_for_async(device_id, f"{label} launch", focused_activity(pkg),
+                         timeout=wdef["launch_wait"] * LAUNCH_TIMEOUT_FACTOR, budget=wdef["launch_wait"],
+                         logger=logger)
+
+    logger.debug(f"处理 {label} 引导页...")
+    steps, result = await navigate_async(device_id, pkg, wdef, logger)
+    if _navigate_result(label, steps, result, logger):
+        await asyncio.sleep(LAUNCH_SETTLE)
+        width, height = await get_screen_size_async(device_id, logger)
+        await tap_bottom_area_async(device_id, width, height, logger, clicks=wdef["clicks"])
+
+    done = result == "ready" or await wait_for_async(device_id, f"{label} ready", _done_probe(pkg, wdef),
+                                                     timeout=wdef["settle"] * LAUNCH_TIMEOUT_FACTOR,
+                                                     budget=wdef["settle"], logger=logger)
+    await run_adb_async(device_id, ["shell", "am", "force-stop", pkg], logger=logger)
+    _finish(label, steps, start, result, done, logger)
+    if bypass and done:
+        await prefs_bypass.capture_template_async(device_id, pkg, logger)
+
+@traced("wizard")
+async def init_markor_async(device_id, logger, bypass=False):
+    await init_app_async(device_id, PKG_MARKOR, logger, bypass)
+
+@traced("wizard")
+async def init_expense_async(device_id, logger, bypass=False):
+    await init_app_async(device_id, PKG_EXPENSE, logger, bypass)
+
+@traced("wizard")
+async def init_tasks_async(device_id, logger, bypass=False):
+    await init_app_async(device_id, PKG_TASKS, logger, bypass)
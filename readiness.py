@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+就绪轮询: 用廉价的设备端探针代替固定等待
+
+    ok = wait_for(device_id, "calendar launch", focused_activity(PKG_CALENDAR),
+                  timeout=10, budget=3, logger=logger)
+
+条件一满足立即返回；超过 timeout 仍未满足返回 False (调用方决定是否继续)。
+budget 是被替换掉的固定等待时长，每个调用点 (site) 都会累计实际等待与节省的时间，见 wait_stats()。
+探针是一条 shell 命令加一个判断函数，多个探针可用 all_of() 合并成一次 adb 往返。
+"""
+import asyncio
+import threading
+import time
+
+import tracing
+from utils import run_adb, run_adb_async
+
+# 默认轮询间隔: 从 POLL_MIN 开始按 POLL_GROWTH 放大，最多 POLL_MAX
+POLL_MIN = 0.1
+POLL_MAX = 1.0
+POLL_GROWTH = 1.5
+
+_SEP = "__READY_SEP__"
+
+# 轮询间隔属于基础设施，不随 tools/bench_pipeline.py 的 --sleep-scale 缩放 (settle 仍是固定等待)
+_poll_sleep = time.sleep
+_poll_sleep_async = asyncio.sleep
+
+
+class Probe:
+    def __init__(self, name, cmd, check):
+        self.name = name
+        self.cmd = cmd
+        self.check = check  # check(stdout) -> bool
+
+    def test(self, out):
+        try:
+            return bool(self.check(out or ""))
+        except Exception:
+            return False
+
+    def __repr__(self):
+        return f"Probe({self.name!r})"
+
+
+def process_alive(proc):
+    """进程存在 (pidof 有输出)"""
+    return Probe(f"pidof {proc}", f"pidof {proc}", lambda out: any(p.isdigit() for p in out.split()))
+
+
+FOCUS_COMMAND = "dumpsys window | grep -E 'mCurrentFocus|mFocusedApp'"
+
+
+def focus_matches(out, pkg, activity=None):
+    """焦点输出中有属于 pkg 的行 (子串匹配)；给出 activity 时该行还须包含这个 Activity 名"""
+    return any(pkg.lower() in line.lower() and (not activity or activity in line)
+               for line in (out or "").splitlines())
+
+
+def focused_activity(pkg, activity=None):
+    """当前获得焦点的窗口属于 pkg (子串匹配，可传 "launcher")，可限定为其中的某个 Activity"""
+    name = f"focus {pkg}/{activity}" if activity else f"focus {pkg}"
+    return Probe(name, FOCUS_COMMAND, lambda out: focus_matches(out, pkg, activity))
+
+
+def boot_completed():
+    """系统启动完成 (重启或恢复快照后)"""
+    return Probe("boot_completed", "getprop sys.boot_completed", lambda out: out.strip() == "1")
+
+
+def file_exists(path):
+    return Probe(f"exists {path}", f"test -e {path} && echo __READY__", lambda out: "__READY__" in out)
+
+
+def provider_ready(uri):
+    """content provider 能正常应答查询 (空表返回 "No result found." 也算)"""
+    return Probe(f"provider {uri}", f"content query --uri {uri} --projection _id 2>&1 | head -n 1",
+                 lambda out: out.strip() != "" and "Error" not in out and "Exception" not in out)
+
+
+def tables_exist(db_path, tables):
+    """SQLite 数据库中已有全部指定的表"""
+    def check(out):
+        names = set(out.split())
+        return all(t in names for t in tables)
+    return Probe(f"tables {db_path}", f"sqlite3 {db_path} \"SELECT name FROM sqlite_master WHERE type='table';\"",
+                 check)
+
+
+def all_of(*probes):
+    """多个探针合并为一条命令，一次往返判断 (没有探针时返回 None)"""
+    probes = [p for p in probes if p is not None]
+    if len(probes) <= 1:
+        return probes[0] if probes else None
+    cmd = f"; echo {_SEP}; ".join(f"{{ {p.cmd}; }} 2>/dev/null" for p in probes)
+
+    def check(out):
+        parts = out.split(_SEP)
+        return len(parts) == len(probes) and all(p.test(o) for p, o in zip(probes, parts))
+    return Probe(" & ".join(p.name for p in probes), cmd, check)
+
+# ==================== 统计 ====================
+
+_lock = threading.Lock()
+_stats = {}   # site -> {"calls", "ready", "timeouts", "polls", "waited_s", "budget_s", "saved_s"}
+
+
+def _budget_of(budget, elapsed):
+    return budget(elapsed) if callable(budget) else budget
+
+
+def _record(site, sp, ok, polls, elapsed, budget):
+    budget_s = _budget_of(budget, elapsed)
+    saved = (budget_s - elapsed) if budget_s is not None else 0.0
+    sp.set(ok=ok, polls=polls, budget=budget_s, saved=round(saved, 3))
+    with _lock:
+        s = _stats.setdefault(site, {"calls": 0, "ready": 0, "timeouts": 0, "polls": 0,
+                                     "waited_s": 0.0, "budget_s": 0.0, "saved_s": 0.0})
+        s["calls"] += 1
+        s["ready" if ok else "timeouts"] += 1
+        s["polls"] += polls
+        s["waited_s"] += elapsed
+        s["budget_s"] += budget_s or 0.0
+        s["saved_s"] += saved
+
+
+def wait_stats():
+    """{调用点: 统计} 的快照；saved_s 为负表示比原来的固定等待更慢"""
+    with _lock:
+        return {k: dict(v) for k, v in _stats.items()}
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+
+def stats_table():
+    rows = wait_stats()
+    header = f"{'site':<28}{'calls':>7}{'ready':>7}{'timeout':>9}{'polls':>7}{'waited(s)':>11}{'budget(s)':>11}{'saved(s)':>10}"
+    lines = [header, "-" * len(header)]
+    for site, s in sorted(rows.items(), key=lambda kv: -kv[1]["saved_s"]):
+        lines.append(f"{site[:27]:<28}{s['calls']:>7}{s['ready']:>7}{s['timeouts']:>9}{s['polls']:>7}"
+                     f"{s['waited_s']:>11.2f}{s['budget_s']:>11.2f}{s['saved_s']:>10.2f}")
+    return "\n".join(lines)
+
+# ==================== 等待 ====================
+
+def wait_for(device_id, site, probe, timeout=10, budget=None, settle=0, interval=POLL_MIN, logger=None):
+    """
+    轮询 probe 直到满足或超时，返回是否就绪；probe 为 None 表示无需等待。
+    budget: 原固定等待秒数 (或 f(实际耗时) -> 秒)，用于统计节省时间；settle: 就绪后额外等待的秒数。
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    polls, ok = 0, probe is None
+    with tracing.span(device_id, site, cat="wait", probe=probe.name if probe else None) as sp:
+        while probe is not None:
+            out, _ = run_adb(device_id, ["shell", probe.cmd], logger=logger)
+            polls += 1
+            if probe.test(out):
+                ok = True
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            _poll_sleep(min(interval, remaining))
+            interval = min(interval * POLL_GROWTH, POLL_MAX)
+        if ok and settle:
+            time.sleep(settle)
+        elapsed = time.monotonic() - start
+        _record(site, sp, ok, polls, elapsed, budget)
+    if logger:
+        if ok:
+            logger.debug(f"  [{site}] 就绪 ({elapsed:.2f}s, {polls} 次探测)")
+        else:
+            logger.warning(f"  [{site}] 等待 {probe.name} 超时 ({timeout}s)")
+    return ok
+
+
+async def wait_for_async(device_id, site, probe, timeout=10, budget=None, settle=0, interval=POLL_MIN, logger=None):
+    start = time.monotonic()
+    deadline = start + timeout
+    polls, ok = 0, probe is None
+    with tracing.span(device_id, site, cat="wait", probe=probe.name if probe else None) as sp:
+        while probe is not None:
+            out, _ = await run_adb_async(device_id, ["shell", probe.cmd], logger=logger)
+            polls += 1
+            if probe.test(out):
+                ok = True
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await _poll_sleep_async(min(interval, remaining))
+            interval = min(interval * POLL_GROWTH, POLL_MAX)
+        if ok and settle:
+            await asyncio.sleep(settle)
+        elapsed = time.monotonic() - start
+        _record(site, sp, ok, polls, elapsed, budget)
+    if logger:
+        if ok:
+            logger.debug(f"  [{site}] 就绪 ({elapsed:.2f}s, {polls} 次探测)")
+        else:
+            logger.warning(f"  [{site}] 等待 {probe.name} 超时 ({timeout}s)")
+    return ok
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+设备端 SQL 脚本
+
+把一串 SQL 语句编译成一个 .sql 脚本 (默认包在 BEGIN ... COMMIT 中)，由设备上的一个 sqlite3 进程执行，
+代替每条语句一次 `adb shell sqlite3 <db> "<sql>"` (每条一次往返 + 一次进程启动 + 手工转义引号)。
+脚本经 `adb exec-in` 从 stdin 送入 sqlite3，不经过 shell 解析，因此不需要任何转义。
+
+    script = SqlScript(db_path)
+    script.exec("DELETE FROM sms")
+    script.exec("INSERT INTO sms (address, body) VALUES (?, ?)", addr, body)
+    script.query("count", "SELECT count(*) FROM sms")
+    result = script.run(device_id, logger)
+    result.ok, result.value("count"), result.rows("count")
+
+参数用 ? 占位，编译时按 SQL 字面量写入 (字符串单引号转义、None -> NULL、bytes -> X'..')。
+依赖前一条插入的 id 时在 SQL 里用 last_insert_rowid() 或临时表，不要插入后再 SELECT。
+查询结果按 sqlite3 默认的 list 模式 ("|" 分隔、每行一条) 解析，结果中的值不能含 "|" 或换行。
+-bail 使第一条出错的语句终止脚本，未提交的事务随进程退出回滚。
+"""
+import math
+import os
+import tempfile
+import uuid
+
+import tracing
+from utils import run_adb, run_adb_async, run_blocking
+
+REMOTE_SQL_DIR = "/data/local/tmp"
+_MARK = "__SQL__"
+_END = "__SQL_END__"
+
+
+def literal(value):
+    """Python 值 -> SQL 字面量"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float) and not math.isfinite(value):
+        # repr 得到 inf / nan，不是合法的 SQL；与 sqlite3 模块绑定 NaN 的结果一致，写为 NULL
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, bytes):
+        return f"X'{value.hex()}'"
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def bind(sql, params):
+    """把引号外的 ? 依次替换为参数字面量"""
+    if not params:
+        return sql
+    parts, quote, it = [], None, iter(params)
+    for ch in sql:
+        if quote:
+            quote = None if ch == quote else quote
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch == "?":
+            try:
+                ch = literal(next(it))
+            except StopIteration:
+                raise ValueError(f"SQL 参数不足: {sql}")
+        parts.append(ch)
+    if next(it, _END) is not _END:
+        raise ValueError(f"SQL 参数过多: {sql}")
+    return "".join(parts)
+
+
+class SqlResult:
+    def __init__(self, ok, results=None, error=""):
+        self.ok = ok
+        self.results = results or {}   # 查询名 -> [(列, ...), ...]
+        self.error = error
+
+    def rows(self, name):
+        return self.results.get(name, [])
+
+    def value(self, name):
+        """第一行第一列，没有结果时返回 None"""
+        rows = self.rows(name)
+        return rows[0][0] if rows and rows[0] else None
+
+    def __repr__(self):
+        return f"SqlResult(ok={self.ok}, queries={list(self.results)})"
+
+
+class SqlScript:
+    def __init__(self, db_path, transaction=True):
+        self.db_path = db_path
+        self.transaction = transaction
+        self.statements = []   # (查询名或 None, SQL)
+
+    def exec(self, sql, *params):
+        self.statements.append((None, bind(sql, params)))
+        return self
+
+    def query(self, name, sql, *params):
+        self.statements.append((name, bind(sql, params)))
+        return self
+
+    def __len__(self):
+        return len(self.statements)
+
+    # ==================== 编译 ====================
+
+    def compile(self):
+        lines = ["BEGIN;"] if self.transaction else []
+        for name, sql in self.statements:
+            if name:
+                lines.append(f"SELECT '{_MARK}{name}';")
+            lines.append(sql.rstrip().rstrip(";") + ";")
+        if self.transaction:
+            lines.append("COMMIT;")
+        # 只有全部语句 (含 COMMIT) 成功才会输出结束标记
+        lines.append(f"SELECT '{_END}';")
+        return "\n".join(lines) + "\n"
+
+    def stdin_command(self):
+        """从 stdin 读取脚本的设备端命令 (adb exec-in)"""
+        return f"sqlite3 -bail {self.db_path}"
+
+    def file_command(self, remote):
+        """执行已 push 到设备上的脚本文件并删除"""
+        return f"sqlite3 -bail {self.db_path} < {remote}; __rc=$?; rm -f {remote}; exit $__rc"
+
+    def write_local(self):
+        """写出本地 .sql 文件，返回路径 (调用方删除)"""
+        fd, local = tempfile.mkstemp(prefix="sql_", suffix=".sql")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.compile())
+        return local
+
+    @staticmethod
+    def remote_path():
+        return f"{REMOTE_SQL_DIR}/{uuid.uuid4().hex[:10]}.sql"
+
+    @staticmethod
+    def parse(out, err=""):
+        """按标记拆分查询结果；没有结束标记视为失败 (事务已回滚)"""
+        results, current, done = {}, None, False
+        for line in (out or "").splitlines():
+            if line.startswith(_MARK):
+                current = line[len(_MARK):]
+                results[current] = []
+            elif line == _END:
+                done = True
+            elif current is not None and line:
+                results[current].append(tuple(line.split("|")))
+        error = "" if done else ((err or "").strip() or "脚本未执行完")
+        return SqlResult(done, results, error)
+
+    # ==================== 执行 ====================
+
+    def _done(self, sp, result, logger):
+        sp.set(statements=len(self), ok=result.ok)
+        if not result.ok and logger:
+            logger.error(f"  SQL 脚本执行失败 ({self.db_path}, {len(self)} 条语句): {result.error}")
+        return result
+
+    def run(self, device_id, logger=None, timeout=120):
+        """一个 sqlite3 进程执行全部语句，返回 SqlResult"""
+        with tracing.span(device_id, "SqlScript.run", cat="script") as sp:
+            local = self.write_local()
+            try:
+                out, err = run_adb(device_id, ["exec-in", self.stdin_command()], timeout=timeout, logger=logger,
+                                   stdin_path=local)
+            finally:
+                os.remove(local)
+            return self._done(sp, self.parse(out, err), logger)
+
+    async def run_async(self, device_id, logger=None, timeout=120):
+        with tracing.span(device_id, "SqlScript.run", cat="script") as sp:
+            # 批量注入时脚本可达数十 MB，编译与写文件放到线程池
+            local = await run_blocking(self.write_local)
+            try:
+                out, err = await run_adb_async(device_id, ["exec-in", self.stdin_command()], timeout=timeout,
+                                               logger=logger, stdin_path=local)
+            finally:
+                os.remove(local)
+            return self._done(sp, self.parse(out, err), logger)
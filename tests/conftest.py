@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from sql_script import SqlScript  # noqa: E402
+
+
+def fixture_path(name):
+    return os.path.join(FIXTURES, name)
+
+
+def run_script(script, db_file):
+    """
+    在本地库上按设备端 sqlite3 -bail 的语义执行 SqlScript: 逐条执行、查询结果按 list 模式 ("|" 分隔) 输出，
+    第一条出错即停止 (未提交的事务随连接关闭回滚)，输出交给 SqlScript.parse
+    """
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    lines, err = [], ""
+    statements = [(None, "BEGIN")] if script.transaction else []
+    statements += script.statements
+    statements += [(None, "COMMIT")] if script.transaction else []
+    try:
+        for name, sql in statements:
+            rows = conn.execute(sql).fetchall()
+            if name:
+                lines.append(f"__SQL__{name}")
+                lines.extend("|".join("" if v is None else str(v) for v in row) for row in rows)
+        lines.append("__SQL_END__")
+    except sqlite3.Error as e:
+        err = f"Error: {e}"
+    finally:
+        conn.close()
+    return SqlScript.parse("\n".join(lines) + "\n", err)
+
+
+def _make_db(tmp_path, fixture):
+    db_file = str(tmp_path / fixture.replace(".sql", ".db"))
+    conn = sqlite3.connect(db_file)
+    with open(fixture_path(fixture), encoding="utf-8") as f:
+        conn.executescript(f.read())
+    conn.close()
+    return db_file
+
+
+@pytest.fixture
+def logger():
+    return logging.getLogger("tests")
+
+
+@pytest.fixture
+def mmssms_db(tmp_path):
+    return _make_db(tmp_path, "mmssms.sql")
+
+
+@pytest.fixture
+def contacts_db(tmp_path):
+    return _make_db(tmp_path, "contacts2.sql")
+
+
+@pytest.fixture
+def contacts_legacy_db(tmp_path):
+    return _make_db(tmp_path, "contacts2_legacy.sql")
@@ -0,0 +1,24 @@
+-- contacts2.db (com.android.providers.contacts) 的表结构子集: accounts / mimetypes / phone_lookup
+CREATE TABLE accounts (_id INTEGER PRIMARY KEY AUTOINCREMENT, account_name TEXT, account_type TEXT,
+    data_set TEXT);
+CREATE TABLE mimetypes (_id INTEGER PRIMARY KEY AUTOINCREMENT, mimetype TEXT NOT NULL);
+CREATE TABLE raw_contacts (_id INTEGER PRIMARY KEY AUTOINCREMENT, account_id INTEGER REFERENCES accounts(_id),
+    sourceid TEXT, version INTEGER NOT NULL DEFAULT 1, dirty INTEGER NOT NULL DEFAULT 0,
+    deleted INTEGER NOT NULL DEFAULT 0, contact_id INTEGER, aggregation_mode INTEGER NOT NULL DEFAULT 0,
+    aggregation_needed INTEGER NOT NULL DEFAULT 1, display_name TEXT, display_name_alt TEXT,
+    display_name_source INTEGER NOT NULL DEFAULT 0, sort_key TEXT, sort_key_alt TEXT);
+CREATE TABLE data (_id INTEGER PRIMARY KEY AUTOINCREMENT, package_id INTEGER,
+    mimetype_id INTEGER REFERENCES mimetypes(_id) NOT NULL,
+    raw_contact_id INTEGER REFERENCES raw_contacts(_id) NOT NULL, is_primary INTEGER NOT NULL DEFAULT 0,
+    data1 TEXT, data2 TEXT, data3 TEXT, data4 TEXT);
+CREATE TABLE phone_lookup (data_id INTEGER REFERENCES data(_id) NOT NULL,
+    raw_contact_id INTEGER REFERENCES raw_contacts(_id) NOT NULL, normalized_number TEXT NOT NULL,
+    min_match TEXT NOT NULL);
+CREATE TABLE properties (property_key TEXT PRIMARY KEY, property_value TEXT);
+
+-- 设备上已有的一个 Google 账号联系人
+INSERT INTO accounts (account_name, account_type, data_set) VALUES ('user@gmail.com', 'com.google', NULL);
+INSERT INTO mimetypes (mimetype) VALUES ('vnd.android.cursor.item/email_v2');
+INSERT INTO raw_contacts (account_id, display_name) VALUES (1, 'Existing');
+INSERT INTO data (mimetype_id, raw_contact_id, data1) VALUES (1, 1, 'existing@example.com');
+INSERT INTO properties VALUES ('aggregation_v2', '1');
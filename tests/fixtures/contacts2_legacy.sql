@@ -0,0 +1,4 @@
+-- 旧版 contacts2.db: raw_contacts 直接存账号名，data 直接存 mimetype 字符串，没有 phone_lookup
+CREATE TABLE raw_contacts (_id INTEGER PRIMARY KEY AUTOINCREMENT, account_name TEXT, account_type TEXT,
+    deleted INTEGER DEFAULT 0);
+CREATE TABLE data (_id INTEGER PRIMARY KEY AUTOINCREMENT, raw_contact_id INTEGER, mimetype TEXT, data1 TEXT);
@@ -0,0 +1,33 @@
+-- mmssms.db (com.android.providers.telephony) 的表结构子集，含用户数据表与 sms 触发器
+CREATE TABLE android_metadata (locale TEXT);
+CREATE TABLE canonical_addresses (_id INTEGER PRIMARY KEY AUTOINCREMENT, address TEXT);
+CREATE TABLE threads (_id INTEGER PRIMARY KEY AUTOINCREMENT, date INTEGER DEFAULT 0,
+    message_count INTEGER DEFAULT 0, recipient_ids TEXT, snippet TEXT, snippet_cs INTEGER DEFAULT 0,
+    read INTEGER DEFAULT 1, archived INTEGER DEFAULT 0, type INTEGER DEFAULT 0, error INTEGER DEFAULT 0,
+    has_attachment INTEGER DEFAULT 0);
+CREATE TABLE sms (_id INTEGER PRIMARY KEY, thread_id INTEGER, address TEXT, person INTEGER, date INTEGER,
+    date_sent INTEGER DEFAULT 0, protocol INTEGER, read INTEGER DEFAULT 0, status INTEGER DEFAULT -1,
+    type INTEGER, reply_path_present INTEGER, subject TEXT, body TEXT, service_center TEXT,
+    locked INTEGER DEFAULT 0, sub_id INTEGER DEFAULT -1, error_code INTEGER DEFAULT -1, creator TEXT,
+    seen INTEGER DEFAULT 0);
+CREATE TABLE pdu (_id INTEGER PRIMARY KEY AUTOINCREMENT, thread_id INTEGER, date INTEGER, msg_box INTEGER,
+    read INTEGER DEFAULT 0, m_id TEXT, sub TEXT);
+CREATE TABLE part (_id INTEGER PRIMARY KEY AUTOINCREMENT, mid INTEGER, ct TEXT, text TEXT);
+CREATE TABLE addr (_id INTEGER PRIMARY KEY, msg_id INTEGER, address TEXT, type INTEGER);
+CREATE VIRTUAL TABLE words USING FTS3 (_id INTEGER PRIMARY KEY, index_text TEXT, source_id INTEGER,
+    table_to_use INTEGER);
+CREATE TRIGGER sms_words_update AFTER INSERT ON sms BEGIN
+    INSERT INTO words (index_text, source_id, table_to_use) VALUES (new.body, new._id, 1);
+END;
+CREATE TRIGGER sms_update_thread_on_insert AFTER INSERT ON sms BEGIN
+    UPDATE threads SET message_count = message_count + 1 WHERE _id = new.thread_id;
+END;
+
+-- 模板来自另一台设备时残留的用户数据
+INSERT INTO android_metadata VALUES ('en_US');
+INSERT INTO canonical_addresses (address) VALUES ('+15550000001'), ('+15550000002');
+INSERT INTO threads (date, message_count, recipient_ids, snippet) VALUES (1, 1, '1', 'old'), (2, 1, '2 1', 'mms');
+INSERT INTO sms (thread_id, address, date, type, body) VALUES (1, '+15550000001', 1, 1, 'old');
+INSERT INTO pdu (thread_id, date, msg_box) VALUES (2, 2, 1);
+INSERT INTO part (mid, ct, text) VALUES (1, 'text/plain', 'mms');
+INSERT INTO addr (msg_id, address, type) VALUES (1, '+15550000002', 137);
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import collections
+
+import pytest
+
+import adb_policy
+from adb_policy import MIN_SAMPLES, observe, timeout_for
+from config import ADB_MIN_TRANSFER_BPS, ADB_TIMEOUT_CLASS_MAX, ADB_TIMEOUT_DEFAULT, ADB_TIMEOUT_MIN
+
+
+@pytest.fixture(autouse=True)
+def samples(monkeypatch):
+    fresh = collections.defaultdict(lambda: collections.deque(maxlen=adb_policy.WINDOW))
+    monkeypatch.setattr(adb_policy, "_samples", fresh)
+    return fresh
+
+
+def test_default_without_samples():
+    assert timeout_for("shell ls") == ADB_TIMEOUT_DEFAULT
+    assert timeout_for("exec-in") == min(ADB_TIMEOUT_CLASS_MAX["exec-in"], ADB_TIMEOUT_DEFAULT)
+    # 类别上限低于默认值时取上限
+    assert timeout_for("root") == ADB_TIMEOUT_CLASS_MAX["root"]
+    assert timeout_for("shell monkey") == ADB_TIMEOUT_CLASS_MAX["shell monkey"]
+
+
+def test_pull_uses_class_cap():
+    for _ in range(MIN_SAMPLES):
+        observe("pull", 0.1)
+    assert timeout_for("pull") == ADB_TIMEOUT_CLASS_MAX["pull"]
+
+
+def test_adaptive_after_enough_samples():
+    for _ in range(MIN_SAMPLES - 1):
+        observe("shell cat", 2.0)
+    assert timeout_for("shell cat") == ADB_TIMEOUT_DEFAULT
+    observe("shell cat", 2.0)
+    assert timeout_for("shell cat") == 2.0 * adb_policy.ADB_TIMEOUT_MULTIPLIER
+
+
+def test_adaptive_is_clamped():
+    for _ in range(MIN_SAMPLES):
+        observe("shell ls", 0.01)
+        observe("shell dumpsys", 100.0)
+        observe("push", 100.0)
+    assert timeout_for("shell ls") == ADB_TIMEOUT_MIN
+    # 没有单独上限的类别按默认值封顶，push 按类别上限封顶
+    assert timeout_for("shell dumpsys") == ADB_TIMEOUT_DEFAULT
+    assert timeout_for("push") == ADB_TIMEOUT_CLASS_MAX["push"]
+
+
+def test_exec_in_scales_with_bytes():
+    assert timeout_for("exec-in", nbytes=1024) == ADB_TIMEOUT_DEFAULT
+    nbytes = 100 * ADB_MIN_TRANSFER_BPS
+    assert timeout_for("exec-in", nbytes=nbytes) == ADB_TIMEOUT_MIN + 100
+    assert timeout_for("exec-in", nbytes=1000 * ADB_MIN_TRANSFER_BPS) == ADB_TIMEOUT_CLASS_MAX["exec-in"]
+
+
+def test_push_scales_with_file_size(tmp_path):
+    big = tmp_path / "big.bin"
+    with open(big, "wb") as f:
+        f.truncate(80 * ADB_MIN_TRANSFER_BPS)
+    assert timeout_for("push", ["push", str(big), "/sdcard/big.bin"]) == ADB_TIMEOUT_MIN + 80
+    assert timeout_for("push", ["push", str(tmp_path / "missing"), "/sdcard/x"]) == ADB_TIMEOUT_DEFAULT
+
+
+def test_only_read_only_classes_retry_on_timeout():
+    assert adb_policy.retry_on_timeout("pull")
+    assert adb_policy.retry_on_timeout("shell getprop")
+    assert not adb_policy.retry_on_timeout("push")
+    assert not adb_policy.retry_on_timeout("exec-in")
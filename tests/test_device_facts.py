@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+
+import pytest
+
+import device_facts
+from device_facts import DEFAULT_SCREEN_SIZE, DeviceFacts
+
+BULK_OUT = ("package:org.tasks versionCode:120 uid:10123\n"
+            "package:com.android.shell uid:2000\n"
+            "__DEVICE_FACTS_SEP__\nPhysical size: 1080x2340\nOverride size: 720x1560\n"
+            "__DEVICE_FACTS_SEP__\n+0800\n__DEVICE_FACTS_SEP__\nAsia/Shanghai\n")
+
+
+class FakeAdb:
+    """替换 device_facts.run_adb / run_adb_async，按顺序返回 outputs 中的 stdout"""
+
+    def __init__(self, *outputs):
+        self.outputs, self.calls = list(outputs), 0
+
+    def __call__(self, device_id, command_list, logger=None):
+        self.calls += 1
+        return (self.outputs.pop(0) if self.outputs else None), "error: device offline"
+
+    async def run_async(self, device_id, command_list, logger=None):
+        return self(device_id, command_list, logger)
+
+
+@pytest.fixture
+def adb(monkeypatch):
+    def install(*outputs):
+        fake = FakeAdb(*outputs)
+        monkeypatch.setattr(device_facts, "run_adb", fake)
+        monkeypatch.setattr(device_facts, "run_adb_async", fake.run_async)
+        return fake
+    return install
+
+
+def test_bulk_query_is_parsed_once(adb):
+    fake = adb(BULK_OUT)
+    facts = DeviceFacts("sim-1")
+    assert facts.packages() == ["org.tasks", "com.android.shell"]
+    assert facts.version_code("org.tasks") == "120" and facts.version_code("com.android.shell") is None
+    assert facts.package_uid("org.tasks") == "10123"
+    assert facts.screen_size() == (1080, 2340)
+    assert facts.utc_offset() == 8 * 3600
+    assert facts.tzinfo().key == "Asia/Shanghai"
+    assert fake.calls == 1 and facts.loads == 1
+
+
+def test_failed_load_is_not_repeated_per_lookup(adb):
+    fake = adb(None, BULK_OUT)
+    facts = DeviceFacts("sim-1")
+    assert facts.screen_size() == DEFAULT_SCREEN_SIZE
+    assert facts.packages() == []
+    assert facts.version_code("org.tasks") is None
+    assert facts.tzinfo() is None
+    assert asyncio.run(facts.ensure_loaded_async()) is facts
+    assert fake.calls == 1
+
+    # 失效 (如重启后) 立即重查
+    facts.invalidate("reboot")
+    assert facts.version_code("org.tasks") == "120"
+    assert fake.calls == 2
+
+
+def test_failed_load_is_retried_after_a_while(adb, monkeypatch):
+    fake = adb(None, BULK_OUT)
+    facts = DeviceFacts("sim-1")
+    assert facts.packages() == []
+    monkeypatch.setattr(device_facts, "DEVICE_FACTS_RETRY_AFTER", 0)
+    assert asyncio.run(facts.ensure_loaded_async()).packages() == ["org.tasks", "com.android.shell"]
+    assert fake.calls == 2
+
+
+def test_tzinfo_falls_back_to_fixed_offset(adb):
+    adb(BULK_OUT.replace("Asia/Shanghai", "Mars/Olympus_Mons"))
+    tz = DeviceFacts("sim-1").tzinfo()
+    assert tz == datetime.timezone(datetime.timedelta(hours=8))
+
+
+def test_async_accessors_do_not_block_the_loop(adb, monkeypatch):
+    fake = adb(None, BULK_OUT)
+    facts = DeviceFacts("sim-1")
+    assert asyncio.run(facts.tzinfo_async()) is None
+
+    def blocking(*args, **kwargs):
+        raise AssertionError("async accessor called the blocking run_adb")
+    monkeypatch.setattr(device_facts, "run_adb", blocking)
+    monkeypatch.setattr(device_facts, "DEVICE_FACTS_RETRY_AFTER", 0)
+    assert asyncio.run(facts.tzinfo_async()).key == "Asia/Shanghai"
+    assert asyncio.run(facts.version_code_async("org.tasks")) == "120"
+    assert fake.calls == 2
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import collections
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import artifact_cache
+from conftest import ROOT
+from config import PKG_TASKS
+from modules import inject_app_db
+
+SCHEMA_FP = "0123456789abcdef0123456789abcdef"
+TASKS_SQL = ("CREATE TABLE tasks (_id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, importance INTEGER, "
+             "dueDate INTEGER, hideUntil INTEGER, created INTEGER, modified INTEGER, completed INTEGER, "
+             "deleted INTEGER, notes TEXT)")
+
+Step = collections.namedtuple("Step", "name stdout")
+
+
+class FakeFacts:
+    def version_code(self, pkg, logger=None):
+        return "42"
+
+    def package_uid(self, pkg, logger=None):
+        return "10123"
+
+
+class FakeScript:
+    def run(self, device_id, logger=None):
+        return [Step("table", None), Step("schema", f"{SCHEMA_FP}  -")]
+
+    async def run_async(self, device_id, logger=None):
+        return self.run(device_id, logger)
+
+
+class FakeDevice:
+    """替换 pull / push: pull 得到一个空的 tasks 库，push 记录推送的文件 (可指定前几次失败)"""
+
+    def __init__(self, base_db, deploy_failures=0):
+        self.base_db = base_db
+        self.deploy_failures = deploy_failures
+        self.pulls, self.deploys = [], []
+
+    def pull(self, device_id, pkg, spec, temp_dir, logger):
+        local_dir = inject_app_db._reset_local_dir(temp_dir, pkg, device_id)
+        local_db = f"{local_dir}/tasks.db"
+        shutil.copyfile(self.base_db, local_db)
+        self.pulls.append(device_id)
+        return local_db
+
+    def deploy(self, device_id, pkg, spec, db_file, facts, logger):
+        self.deploys.append((device_id, db_file))
+        if self.deploy_failures:
+            self.deploy_failures -= 1
+            return False
+        return True
+
+    async def pull_async(self, *args):
+        return self.pull(*args)
+
+    async def deploy_async(self, *args):
+        return self.deploy(*args)
+
+
+@pytest.fixture
+def device(tmp_path, monkeypatch):
+    base_db = str(tmp_path / "base.db")
+    sqlite3.connect(base_db).execute(TASKS_SQL)
+    fake = FakeDevice(base_db)
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(artifact_cache, "ARTIFACT_CACHE", True)
+    monkeypatch.setattr(artifact_cache, "ARTIFACT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(artifact_cache, "_inflight", {})
+    monkeypatch.setattr(artifact_cache, "_stats", {})
+    monkeypatch.setattr(artifact_cache, "_groups", {})
+    # 本地库的指纹与设备端不同也必须命中同一个产物
+    monkeypatch.setattr(artifact_cache, "local_schema", lambda db_file: "f" * 32)
+    monkeypatch.setattr(inject_app_db, "get_device_facts", lambda device_id, logger: FakeFacts())
+    monkeypatch.setattr(inject_app_db, "_prep_script", lambda pkg, spec: FakeScript())
+    monkeypatch.setattr(inject_app_db, "_pull", fake.pull)
+    monkeypatch.setattr(inject_app_db, "_deploy", fake.deploy)
+    monkeypatch.setattr(inject_app_db, "get_device_facts_async", lambda device_id, logger: _value(FakeFacts()))
+    monkeypatch.setattr(inject_app_db, "_pull_async", fake.pull_async)
+    monkeypatch.setattr(inject_app_db, "_deploy_async", fake.deploy_async)
+    return fake
+
+
+async def _value(value):
+    return value
+
+
+@pytest.fixture(params=["sync", "async"])
+def inject(request):
+    def run(device_id, tmp_path, logger):
+        spec = inject_app_db._spec(PKG_TASKS)
+        args = (device_id, str(tmp_path / "work"), logger, PKG_TASKS, spec)
+        if request.param == "async":
+            return asyncio.run(inject_app_db._inject_async(*args))
+        return inject_app_db._inject(*args)
+    return run
+
+
+def _lookup_key():
+    spec = inject_app_db._spec(PKG_TASKS)
+    return inject_app_db._cache_key(PKG_TASKS, spec, FakeFacts(), SCHEMA_FP)
+
+
+def test_build_stores_under_claimed_key(device, inject, tmp_path, logger):
+    assert inject("sim-1", tmp_path, logger)
+    key = _lookup_key()
+    assert os.path.exists(artifact_cache._entry(key))
+    assert sqlite3.connect(artifact_cache._entry(key)).execute("SELECT count(*) FROM tasks").fetchone()[0] > 0
+    assert artifact_cache._inflight == {}
+
+    # 第二台设备直接推送缓存产物，不再 pull
+    assert inject("sim-2", tmp_path, logger)
+    assert device.pulls == ["sim-1"]
+    assert [d for d, _ in device.deploys] == ["sim-1", "sim-2"]
+    assert artifact_cache.cache_stats()[PKG_TASKS] == {"hits": 1, "misses": 1, "stores": 1, "evictions": 0}
+
+
+def test_failed_cached_deploy_falls_back_to_build(device, inject, tmp_path, logger):
+    assert inject("sim-1", tmp_path, logger)
+    device.deploy_failures = 1
+    assert inject("sim-2", tmp_path, logger)
+    assert device.pulls == ["sim-1", "sim-2"]
+    assert [d for d, _ in device.deploys] == ["sim-1", "sim-2", "sim-2"]
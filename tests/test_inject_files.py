@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import datetime
+import time
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from modules.inject_files import touch_mtime
+
+NEW_YORK = ZoneInfo("America/New_York")
+
+
+def _epoch(*args, tz):
+    return int(datetime.datetime(*args, tzinfo=tz).timestamp())
+
+
+@pytest.mark.parametrize("ts, expected", [
+    ("202401151030", (2024, 1, 15, 10, 30, 0)),
+    ("202401151030.45", (2024, 1, 15, 10, 30, 45)),
+    ("2401151030", (2024, 1, 15, 10, 30, 0)),
+    ("6812312359", (2068, 12, 31, 23, 59, 0)),
+    ("6901010000", (1969, 1, 1, 0, 0, 0)),
+    ("9912312359.59", (1999, 12, 31, 23, 59, 59)),
+    (202401151030, (2024, 1, 15, 10, 30, 0)),
+])
+def test_touch_mtime_formats(ts, expected):
+    assert touch_mtime(ts, datetime.timezone.utc) == _epoch(*expected, tz=datetime.timezone.utc)
+
+
+def test_touch_mtime_without_year_uses_current_year():
+    year = int(time.strftime("%Y"))
+    assert touch_mtime("01151030", datetime.timezone.utc) == _epoch(year, 1, 15, 10, 30, tz=datetime.timezone.utc)
+
+
+@pytest.mark.parametrize("ts", ["", "2024011510", "20240115103", "abc401151030", "202401151030.x",
+                                "202413151030", "202401321030", "202401152460", "1030"])
+def test_touch_mtime_invalid(ts):
+    assert touch_mtime(ts, datetime.timezone.utc) is None
+
+
+def test_touch_mtime_follows_dst():
+    # 同一时区冬令时 UTC-5、夏令时 UTC-4
+    assert touch_mtime("202401151030", NEW_YORK) == _epoch(2024, 1, 15, 15, 30, tz=datetime.timezone.utc)
+    assert touch_mtime("202407151030", NEW_YORK) == _epoch(2024, 7, 15, 14, 30, tz=datetime.timezone.utc)
+
+
+def test_touch_mtime_fixed_offset():
+    tz = datetime.timezone(datetime.timedelta(hours=8))
+    assert touch_mtime("202407151030", tz) == _epoch(2024, 7, 15, 2, 30, tz=datetime.timezone.utc)
+
+
+def test_touch_mtime_without_tz_uses_host_time():
+    assert touch_mtime("202407151030", None) == int(time.mktime((2024, 7, 15, 10, 30, 0, 0, 0, -1)))
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import artifact_cache
+from conftest import run_script
+from modules.inject_system import (MIME_NAME, MIME_PHONE, build_sms_db, contacts_probe_script, contacts_sql_script,
+                                   normalize_phone, parse_contacts_schema, phone_min_match, sms_sql_script,
+                                   _stage_local_db)
+from sql_script import SqlResult
+
+NOW_MS = 1_700_000_000_000
+
+SMS_ITEMS = [
+    {"address": "10086", "body": "余额提醒", "type": 1, "date_offset": -3000},
+    {"address": "+8613800000000", "body": "It's me", "type": 2, "date_offset": -2000},
+    {"address": "10086", "body": "流量提醒 | 100MB", "type": 1, "date_offset": -1000},
+    {"body": "没有地址"},
+]
+
+CONTACTS = [
+    {"name": "Alice O'Neil", "phone": "+1 (555) 010-2030"},
+    {"name": "张三", "phone": "138-0000-0000"},
+    {"name": "", "phone": "123"},
+    {"name": "No Phone"},
+]
+
+
+def _query(db_file, sql):
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def _check_sms(db_file):
+    """两种注入方式写出同样的数据: 每个地址一个会话，摘要取最后一条，条数不受 sms 触发器影响"""
+    threads = _query(db_file, "SELECT t._id, t.recipient_ids, t.message_count, t.snippet, t.date, c.address "
+                              "FROM threads t JOIN canonical_addresses c ON c._id = t.recipient_ids "
+                              "ORDER BY c.address")
+    assert [(count, snippet, date, addr) for _, _, count, snippet, date, addr in threads] == [
+        (1, "It's me", NOW_MS - 2000, "+8613800000000"),
+        (2, "流量提醒 | 100MB", NOW_MS - 1000, "10086"),
+    ]
+    sms = _query(db_file, "SELECT address, body, date, type, read, thread_id FROM sms ORDER BY date")
+    thread_ids = {addr: tid for tid, _, _, _, _, addr in threads}
+    assert sms == [
+        ("10086", "余额提醒", NOW_MS - 3000, 1, 1, thread_ids["10086"]),
+        ("+8613800000000", "It's me", NOW_MS - 2000, 2, 1, thread_ids["+8613800000000"]),
+        ("10086", "流量提醒 | 100MB", NOW_MS - 1000, 1, 1, thread_ids["10086"]),
+    ]
+
+
+def test_sms_sql_script(mmssms_db):
+    result = run_script(sms_sql_script(SMS_ITEMS, NOW_MS, mmssms_db), mmssms_db)
+    assert result.ok, result.error
+    assert (result.value("sms"), result.value("threads")) == ("3", "2")
+    _check_sms(mmssms_db)
+    # 设备端脚本只重建 sms / threads，canonical_addresses 中已有的地址被复用
+    assert len(_query(mmssms_db, "SELECT * FROM canonical_addresses")) == 4
+
+
+def test_sms_sql_script_reuses_existing_address(mmssms_db):
+    items = [{"address": "+15550000001", "body": "hi"}]
+    assert run_script(sms_sql_script(items, NOW_MS, mmssms_db), mmssms_db).ok
+    assert _query(mmssms_db, "SELECT recipient_ids, message_count FROM threads") == [("1", 1)]
+    assert _query(mmssms_db, "SELECT count(*) FROM canonical_addresses") == [(2,)]
+
+
+def test_build_sms_db(mmssms_db, logger):
+    assert build_sms_db(mmssms_db, iter(SMS_ITEMS[:3]), NOW_MS, logger) == 3
+    _check_sms(mmssms_db)
+    # 只重建 sms / threads，彩信等其他表不动；没有会话引用的旧地址被删除
+    for table in ("pdu", "part", "addr"):
+        assert _query(mmssms_db, f"SELECT count(*) FROM {table}") == [(1,)]
+    assert _query(mmssms_db, "SELECT address FROM canonical_addresses ORDER BY _id") == [
+        ("10086",), ("+8613800000000",)]
+    # 触发器照常执行，系统记录保留
+    assert _query(mmssms_db, "SELECT count(*) FROM words") == [(4,)]
+    assert _query(mmssms_db, "SELECT locale FROM android_metadata") == [("en_US",)]
+    assert _query(mmssms_db, "PRAGMA journal_mode") == [("delete",)]
+
+
+def test_build_sms_db_reuses_existing_address(mmssms_db, logger):
+    items = [{"address": "+15550000002", "body": "hi"}]
+    assert build_sms_db(mmssms_db, items, NOW_MS, logger) == 1
+    assert _query(mmssms_db, "SELECT _id, address FROM canonical_addresses") == [(2, "+15550000002")]
+    assert _query(mmssms_db, "SELECT recipient_ids, message_count FROM threads") == [("2", 1)]
+
+
+def test_stored_template_has_no_user_data(mmssms_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_cache, "ARTIFACT_CACHE_DIR", str(tmp_path / "cache"))
+    local_dir = tmp_path / "pulled"
+    local_dir.mkdir()
+    shutil.move(mmssms_db, local_dir / "mmssms.db")
+    local_db = _stage_local_db(None, str(local_dir), "k" * 64)
+    # 本机刚 pull 的库原样使用
+    assert _query(local_db, "SELECT count(*) FROM pdu") == [(1,)]
+    assert _query(local_db, "SELECT count(*) FROM sms") == [(1,)]
+    template = artifact_cache._entry("k" * 64)
+    for table in ("sms", "threads", "canonical_addresses", "pdu", "part", "addr", "words"):
+        assert _query(template, f"SELECT count(*) FROM {table}") == [(0,)]
+    assert _query(template, "SELECT locale FROM android_metadata") == [("en_US",)]
+    assert not os.path.exists(f"{local_db}.template")
+
+    staged_dir = tmp_path / "staged"
+    staged_dir.mkdir()
+    staged = _stage_local_db(template, str(staged_dir), "k" * 64)
+    assert _query(staged, "SELECT count(*) FROM pdu") == [(0,)]
+
+
+def test_build_sms_db_failure_rolls_back(tmp_path, logger):
+    db_file = str(tmp_path / "broken.db")
+    sqlite3.connect(db_file).executescript(
+        "CREATE TABLE canonical_addresses (_id INTEGER PRIMARY KEY, address TEXT);"
+        "CREATE TABLE threads (_id INTEGER PRIMARY KEY, date INTEGER);"
+        "CREATE TABLE sms (_id INTEGER PRIMARY KEY, body TEXT);"
+        "INSERT INTO sms (body) VALUES ('kept');")
+    assert build_sms_db(db_file, SMS_ITEMS[:1], NOW_MS, logger) is None
+    assert _query(db_file, "SELECT body FROM sms") == [("kept",)]
+
+
+@pytest.mark.parametrize("phone, normalized, min_match", [
+    ("+1 (555) 010-2030", "+15550102030", "0302010"),
+    ("138-0000-0000", "13800000000", "0000000"),
+    ("10086", "10086", "68001"),
+])
+def test_normalize_phone(phone, normalized, min_match):
+    assert normalize_phone(phone) == normalized
+    assert phone_min_match(normalized) == min_match
+
+
+def _schema(db_file):
+    return parse_contacts_schema(run_script(contacts_probe_script(db_file), db_file))
+
+
+def test_parse_contacts_schema(contacts_db, contacts_legacy_db, tmp_path):
+    schema = _schema(contacts_db)
+    assert {"raw_contacts", "data", "accounts", "mimetypes", "phone_lookup", "properties"} <= set(schema)
+    assert {"account_id", "display_name", "sort_key_alt"} <= schema["raw_contacts"]
+    assert "mimetype_id" in schema["data"] and "data4" in schema["data"]
+    assert schema["accounts"] == {"_id", "account_name", "account_type", "data_set"}
+
+    legacy = _schema(contacts_legacy_db)
+    assert "accounts" not in legacy and "phone_lookup" not in legacy
+    assert legacy["data"] == {"_id", "raw_contact_id", "mimetype", "data1"}
+
+    empty = str(tmp_path / "empty.db")
+    sqlite3.connect(empty).execute("CREATE TABLE raw_contacts (_id INTEGER PRIMARY KEY)")
+    assert _schema(empty) is None
+    assert parse_contacts_schema(SqlResult(False, error="Error: unable to open database")) is None
+
+
+def test_contacts_sql_script(contacts_db):
+    result = run_script(contacts_sql_script(CONTACTS, _schema(contacts_db), contacts_db), contacts_db)
+    assert result.ok, result.error
+    assert result.value("contacts") == "2"
+
+    # 新联系人挂在本地 (全 NULL) 账号下，已有的 Google 账号联系人不受影响
+    local = _query(contacts_db, "SELECT _id FROM accounts WHERE account_name IS NULL AND account_type IS NULL")
+    assert len(local) == 1
+    raws = _query(contacts_db, "SELECT _id, account_id, display_name, sort_key, display_name_source, "
+                               "aggregation_needed, deleted FROM raw_contacts ORDER BY _id")
+    assert raws[0][1:3] == (1, "Existing")
+    assert [r[1:] for r in raws[1:]] == [(local[0][0], "Alice O'Neil", "Alice O'Neil", 40, 1, 0),
+                                         (local[0][0], "张三", "张三", 40, 1, 0)]
+
+    data = _query(contacts_db, "SELECT d._id, d.raw_contact_id, m.mimetype, d.data1, d.data2, d.data4 FROM data d "
+                               "JOIN mimetypes m ON m._id = d.mimetype_id WHERE d.raw_contact_id > 1 "
+                               "ORDER BY d._id")
+    alice, zhang = raws[1][0], raws[2][0]
+    assert [row[1:] for row in data] == [
+        (alice, MIME_NAME, "Alice O'Neil", None, None),
+        (alice, MIME_PHONE, "+1 (555) 010-2030", "2", "+15550102030"),
+        (zhang, MIME_NAME, "张三", None, None),
+        (zhang, MIME_PHONE, "138-0000-0000", "2", "13800000000"),
+    ]
+    phone_ids = {row[1]: row[0] for row in data if row[2] == MIME_PHONE}
+    assert _query(contacts_db, "SELECT data_id, raw_contact_id, normalized_number, min_match FROM phone_lookup "
+                               "ORDER BY data_id") == [
+        (phone_ids[alice], alice, "+15550102030", "0302010"),
+        (phone_ids[zhang], zhang, "13800000000", "0000000"),
+    ]
+    assert _query(contacts_db, "SELECT count(*) FROM mimetypes") == [(3,)]
+    assert _query(contacts_db, "SELECT count(*) FROM properties") == [(0,)]
+
+    # 再次注入复用已有的本地账号与 mimetype
+    assert run_script(contacts_sql_script(CONTACTS[:1], _schema(contacts_db), contacts_db), contacts_db).ok
+    assert _query(contacts_db, "SELECT count(*) FROM accounts") == [(2,)]
+    assert _query(contacts_db, "SELECT count(*) FROM mimetypes") == [(3,)]
+
+
+def test_contacts_sql_script_legacy_schema(contacts_legacy_db):
+    script = contacts_sql_script(CONTACTS, _schema(contacts_legacy_db), contacts_legacy_db)
+    result = run_script(script, contacts_legacy_db)
+    assert result.ok, result.error
+    assert result.value("contacts") == "2"
+    assert _query(contacts_legacy_db, "SELECT account_name, account_type, deleted FROM raw_contacts") == [
+        (None, None, 0)] * 2
+    assert _query(contacts_legacy_db, "SELECT raw_contact_id, mimetype, data1 FROM data ORDER BY _id") == [
+        (1, MIME_NAME, "Alice O'Neil"), (1, MIME_PHONE, "+1 (555) 010-2030"),
+        (2, MIME_NAME, "张三"), (2, MIME_PHONE, "138-0000-0000"),
+    ]
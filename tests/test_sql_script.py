@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import shutil
+import sqlite3
+import subprocess
+
+import pytest
+
+from conftest import run_script
+from sql_script import SqlScript, bind, literal
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, "NULL"),
+    (True, "1"),
+    (False, "0"),
+    (42, "42"),
+    (-1.5, "-1.5"),
+    (float("nan"), "NULL"),
+    (float("inf"), "NULL"),
+    (float("-inf"), "NULL"),
+    (b"\x00\xff", "X'00ff'"),
+    ("it's", "'it''s'"),
+    ("", "''"),
+    ("短信", "'短信'"),
+])
+def test_literal(value, expected):
+    assert literal(value) == expected
+
+
+def test_literal_round_trips_through_sqlite():
+    values = [None, 7, 2.25, b"\x01\x02", "a'b\"c;--", "line\nbreak"]
+    conn = sqlite3.connect(":memory:")
+    row = conn.execute("SELECT " + ", ".join(literal(v) for v in values)).fetchone()
+    assert list(row) == values
+
+
+def test_bind_replaces_placeholders_in_order():
+    assert bind("INSERT INTO t VALUES (?, ?, ?)", ("a", 1, None)) == "INSERT INTO t VALUES ('a', 1, NULL)"
+
+
+def test_bind_skips_placeholders_inside_quotes():
+    sql = "SELECT '?', \"?\", ? WHERE x = 'it''s ?'"
+    assert bind(sql, ("v",)) == "SELECT '?', \"?\", 'v' WHERE x = 'it''s ?'"
+
+
+def test_bind_without_params_returns_sql_unchanged():
+    assert bind("SELECT ?", ()) == "SELECT ?"
+
+
+def test_bind_checks_param_count():
+    with pytest.raises(ValueError):
+        bind("SELECT ?, ?", (1,))
+    with pytest.raises(ValueError):
+        bind("SELECT ?", (1, 2))
+
+
+def test_compile_wraps_transaction_and_marks_queries():
+    script = SqlScript("/data/x.db").exec("DELETE FROM t;").query("n", "SELECT count(*) FROM t")
+    assert script.compile().splitlines() == [
+        "BEGIN;", "DELETE FROM t;", "SELECT '__SQL__n';", "SELECT count(*) FROM t;", "COMMIT;",
+        "SELECT '__SQL_END__';",
+    ]
+    assert SqlScript("/data/x.db", transaction=False).compile() == "SELECT '__SQL_END__';\n"
+
+
+def test_parse_splits_named_results():
+    out = "__SQL__a\n1|x\n2|\n__SQL__b\n__SQL__c\n5\n__SQL_END__\n"
+    result = SqlScript.parse(out)
+    assert result.ok and result.error == ""
+    assert result.rows("a") == [("1", "x"), ("2", "")]
+    assert result.rows("b") == [] and result.value("b") is None
+    assert result.value("c") == "5"
+    assert result.rows("missing") == []
+
+
+def test_parse_without_end_marker_fails():
+    result = SqlScript.parse("__SQL__a\n1\n", "Error: near line 3: no such table: t\n")
+    assert not result.ok
+    assert result.error == "Error: near line 3: no such table: t"
+    assert result.value("a") == "1"
+    assert SqlScript.parse("", "").error
+
+
+def test_failed_statement_rolls_back(tmp_path):
+    db_file = str(tmp_path / "t.db")
+    sqlite3.connect(db_file).executescript("CREATE TABLE t (v TEXT NOT NULL);")
+    script = SqlScript(db_file).exec("INSERT INTO t VALUES (?)", "kept?").exec("INSERT INTO t VALUES (?)", None)
+    assert not run_script(script, db_file).ok
+    assert sqlite3.connect(db_file).execute("SELECT count(*) FROM t").fetchone() == (0,)
+
+
+@pytest.mark.skipif(shutil.which("sqlite3") is None, reason="需要 sqlite3 命令行")
+def test_compiled_script_runs_in_sqlite3_cli(tmp_path):
+    db_file = str(tmp_path / "t.db")
+    script = SqlScript(db_file)
+    script.exec("CREATE TABLE t (a TEXT, b BLOB, c REAL)")
+    script.exec("INSERT INTO t VALUES (?, ?, ?)", "it's; ? --", b"\x00", float("nan"))
+    script.query("rows", "SELECT a, hex(b), c IS NULL FROM t")
+    proc = subprocess.run(script.stdin_command().split(), input=script.compile(), capture_output=True, text=True)
+    result = SqlScript.parse(proc.stdout, proc.stderr)
+    assert result.ok, result.error
+    assert result.rows("rows") == [("it's; ? --", "00", "1")]
+
+    failing = SqlScript(db_file).exec("INSERT INTO t (a) VALUES ('x')").exec("INSERT INTO missing VALUES (1)")
+    proc = subprocess.run(failing.stdin_command().split(), input=failing.compile(), capture_output=True, text=True)
+    result = SqlScript.parse(proc.stdout, proc.stderr)
+    assert not result.ok and "missing" in result.error
+    assert sqlite3.connect(db_file).execute("SELECT count(*) FROM t").fetchone() == (1,)
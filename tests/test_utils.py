@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+import adb_client
+import adb_policy
+import utils
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(adb_policy, "backoff", lambda attempt: 0)
+
+
+class FakeSocket:
+    """替换 adb_client.run_command: 依次抛出 errors 中的异常，之后返回 result"""
+
+    def __init__(self, errors=(), result=("ok", "", 0)):
+        self.errors, self.result, self.calls = list(errors), result, []
+
+    def __call__(self, serial, command_list, timeout=60, data=None):
+        self.calls.append((serial, command_list, data is not None))
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+def _both(device_id, command_list, **kwargs):
+    return [utils.run_adb(device_id, command_list, **kwargs),
+            asyncio.run(utils.run_adb_async(device_id, command_list, **kwargs))]
+
+
+def test_socket_backend_is_used_by_both_twins(monkeypatch, tmp_path):
+    fake = FakeSocket()
+    monkeypatch.setattr(utils, "ADB_BACKEND", "socket")
+    monkeypatch.setattr(adb_client, "run_command", fake)
+    assert _both("sim-1", ["shell", "echo", "ok"]) == [("ok", "")] * 2
+    payload = tmp_path / "in.tar"
+    payload.write_bytes(b"data")
+    assert _both("sim-1", ["exec-in", "tar -xf -"], stdin_path=str(payload)) == [("ok", "")] * 2
+    assert fake.calls == [("sim-1", ["shell", "echo", "ok"], False)] * 2 + [("sim-1", ["exec-in", "tar -xf -"], True)] * 2
+
+
+def test_shell_session_is_used_by_both_twins(monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "ADB_BACKEND", "binary")
+    monkeypatch.setattr(utils, "ADB_SHELL_SESSION", True)
+    monkeypatch.setattr(utils, "_run_in_session", lambda *args: calls.append(args) or ("1080x1920", "", 0))
+    assert _both("sim-1", ["shell", "wm", "size"]) == [("1080x1920", "")] * 2
+    assert len(calls) == 2
+
+
+def test_transient_socket_error_is_retried(monkeypatch):
+    monkeypatch.setattr(utils, "ADB_BACKEND", "socket")
+    for run in (utils.run_adb, lambda *a, **k: asyncio.run(utils.run_adb_async(*a, **k))):
+        fake = FakeSocket(errors=[OSError("Connection reset by peer")])
+        monkeypatch.setattr(adb_client, "run_command", fake)
+        assert run("sim-1", ["shell", "echo", "ok"]) == ("ok", "")
+        assert len(fake.calls) == 2
+
+
+def test_other_socket_errors_are_not_retried(monkeypatch):
+    monkeypatch.setattr(utils, "ADB_BACKEND", "socket")
+    for run in (utils.run_adb, lambda *a, **k: asyncio.run(utils.run_adb_async(*a, **k))):
+        fake = FakeSocket(errors=[adb_client.AdbError("permission denied")])
+        monkeypatch.setattr(adb_client, "run_command", fake)
+        assert run("sim-1", ["shell", "echo", "ok"]) == (None, "permission denied")
+        assert len(fake.calls) == 1
+
+
+def test_install_invalidates_device_facts(monkeypatch):
+    import device_facts
+    facts = device_facts.DeviceFacts("sim-1")
+    facts._loaded = True
+    monkeypatch.setitem(device_facts._FACTS, "sim-1", facts)
+    monkeypatch.setattr(utils, "ADB_BACKEND", "socket")
+    monkeypatch.setattr(adb_client, "run_command", FakeSocket())
+    utils.run_adb("sim-1", ["shell", "pm", "clear", "org.tasks"])
+    assert facts._loaded
+    asyncio.run(utils.run_adb_async("sim-1", ["shell", "pm", "install", "-r", "/data/local/tmp/a.apk"]))
+    assert not facts._loaded
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import time
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from conftest import fixture_path
+from modules.wizards import DUMP_RETRIES, WIZARD_DEFS, _decide, find_button, parse_step
+
+PKG = "net.gsantner.markor"
+FOCUS = (f"  mCurrentFocus=Window{{5f1c2a u0 {PKG}/{PKG}.activity.MainActivity}}\n"
+         f"  mFocusedApp=ActivityRecord{{8e2b1d u0 {PKG}/.activity.MainActivity t12}}\n")
+
+
+@pytest.fixture
+def dump():
+    with open(fixture_path("wizard_dump.xml"), encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def test_parse_step_reads_hierarchy_and_ready(dump):
+    root, ready = parse_step(f"{dump}\n__WIZARD_SEP__\n__WIZARD_READY__\n{FOCUS}")
+    assert root.tag == "hierarchy"
+    assert len(list(root.iter("node"))) == 6
+    assert ready
+
+
+def test_parse_step_not_ready(dump):
+    root, ready = parse_step(f"{dump}\n__WIZARD_SEP__\n{FOCUS}")
+    assert root is not None and not ready
+
+
+def test_parse_step_checks_focused_activity(dump):
+    out = f"{dump}\n__WIZARD_SEP__\n__WIZARD_READY__\n{FOCUS}"
+    assert parse_step(out, PKG, "MainActivity")[1]
+    assert not parse_step(out, PKG, "SettingsActivity")[1]
+    assert not parse_step(out, "com.example.other", "MainActivity")[1]
+    launcher = ("  mCurrentFocus=Window{1a2b3c u0 com.google.android.apps.nexuslauncher/"
+                "com.android.launcher3.MainActivity}\n")
+    assert not parse_step(f"{dump}\n__WIZARD_SEP__\n__WIZARD_READY__\n{launcher}", PKG, "MainActivity")[1]
+
+
+@pytest.mark.parametrize("out", [
+    "",
+    None,
+    "ERROR: null root node returned by UiTestAutomationBridge.\n__WIZARD_SEP__\n__WIZARD_READY__\n",
+    "<hierarchy rotation=\"0\"><node text=\"Next\"></hierarchy>\n__WIZARD_SEP__\n__WIZARD_READY__\n",
+])
+def test_parse_step_without_hierarchy(out):
+    root, ready = parse_step(out)
+    assert root is None
+    assert ready == bool(out)
+
+
+def test_find_button_prefers_clickable_node(dump):
+    root = ET.fromstring(dump[dump.find("<hierarchy"):])
+    # TextView "Next" 不可点击；ImageButton 的 content-desc 是 "Next page"，不完整匹配
+    assert find_button(root, ["Next"]) == ("  NEXT ", (600, 2220))
+
+
+def test_find_button_follows_pattern_priority(dump):
+    root = ET.fromstring(dump[dump.find("<hierarchy"):])
+    assert find_button(root, ["Next page", "Next"]) == ("Next page", (920, 2220))
+    assert find_button(root, ["id/next", "Next"]) == ("Next page", (920, 2220))
+    assert find_button(root, ["Get started|Next"])[0] == "  NEXT "
+
+
+def test_find_button_skips_disabled_and_empty_nodes(dump):
+    root = ET.fromstring(dump[dump.find("<hierarchy"):])
+    assert find_button(root, ["Done"]) is None
+    assert find_button(root, ["Skip"]) is None
+    assert find_button(root, ["id/title"]) == ("Next", (220, 230))
+    assert find_button(root, ["Continue"]) is None
+
+
+def test_find_button_ignores_invalid_bounds():
+    root = ET.fromstring('<hierarchy><node text="OK" clickable="true" bounds="" />'
+                         '<node text="OK" bounds="[10,10][30,50]" /></hierarchy>')
+    assert find_button(root, ["OK"]) == ("OK", (20, 30))
+
+
+NO_DUMP = "ERROR: could not get idle state.\n__WIZARD_SEP__\n" + FOCUS
+
+
+def test_decide_retries_failed_dumps():
+    wdef, deadline = WIZARD_DEFS[PKG], time.monotonic() + 60
+    for failures in range(DUMP_RETRIES):
+        assert _decide(NO_DUMP, PKG, wdef, 0, failures, deadline) == ("retry", None)
+    assert _decide(NO_DUMP, PKG, wdef, 0, DUMP_RETRIES, deadline) == ("end", "no-ui")
+
+
+def test_decide_failed_dump_after_deadline():
+    assert _decide(NO_DUMP, PKG, WIZARD_DEFS[PKG], 0, 0, time.monotonic() - 1) == ("end", "no-ui")
+
+
+def test_decide_failed_dump_when_ready():
+    out = NO_DUMP.replace("__WIZARD_SEP__\n", "__WIZARD_SEP__\n__WIZARD_READY__\n")
+    assert _decide(out, PKG, WIZARD_DEFS[PKG], 2, 0, time.monotonic() + 60) == ("end", "ready")
+
+
+def test_decide_taps_button(dump):
+    out = f"{dump}\n__WIZARD_SEP__\n{FOCUS}"
+    wdef, deadline = WIZARD_DEFS[PKG], time.monotonic() + 60
+    assert _decide(out, PKG, wdef, 0, 2, deadline) == ("tap", ("  NEXT ", (600, 2220)))
+    assert _decide(out, PKG, wdef, wdef["max_steps"], 0, deadline) == ("end", "max-steps")
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端流水线基准 (基于 tools/fake_adb.py 假设备)
+
+在 N 台模拟设备上运行 main.process_device_pipeline (或 --async 版本)，报告:
+  - 总墙钟时间
+  - adb 调用次数 (按命令类别 / 执行后端)
+  - 每个流水线步骤的耗时 (跨设备的平均 / 最大)
+  - 注入结果校验 (各数据库行数、文件数)
+  - 每台设备的日志量与日志在热路径上的开销
+  - 各就绪等待调用点的实际等待与节省时间 (见 readiness.py)
+  - 每个应用引导页的点击步数与耗时 (见 modules/wizards.py)
+  - 每个应用本地写库 (含主机端构建的短信库) 的行数与速率 (见 modules/inject_app_db.py)
+  - 注入数据库缓存产物的命中 / 未命中次数，以及每个产物的构建耗时与分发到其余设备的耗时 (见 artifact_cache.py)
+
+    python3 tools/bench_pipeline.py --devices 4 --latency emulator --sleep-scale 0
+    python3 tools/bench_pipeline.py --devices 2 --json baseline.json
+    python3 tools/bench_pipeline.py --devices 1 --latency none --sleep-scale 0 --bulk-rows 100000
+    python3 tools/bench_pipeline.py --devices 1 --latency emulator --sms-rows 10000 [--sms-on-device]
+    python3 tools/bench_pipeline.py --devices 1 --latency emulator --contacts-rows 1000 [--contacts-each]
+
+--sleep-scale 按比例缩放流水线中的固定等待 (time.sleep / asyncio.sleep)，0 表示跳过，
+便于单独观察 adb 往返本身的开销；默认 1.0 与真实运行一致。
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+FAKE_ADB = os.path.join(REPO_ROOT, "tools", "fake_adb.py")
+
+# 延迟预设 (秒)。emulator 大致对应本机 x86 模拟器上的实测量级
+LATENCY_PRESETS = {
+    "none": {},
+    "emulator": {
+        "default": 0.002, "shell": 0.01, "push": 0.015, "pull": 0.015, "root": 0.3,
+        "pm": 0.08, "am": 0.05, "monkey": 0.25, "dumpsys": 0.08, "content": 0.1, "sqlite3": 0.01,
+        "uiautomator": 0.5,
+    },
+}
+TRANSFER_PRESETS = {"none": 0, "emulator": 60 * 1024 * 1024}
+
+STAGES = ["snapshot", "root", "clean", "golden", "wizards", "inject", "finish"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="假设备端到端流水线基准")
+    parser.add_argument("--devices", type=int, default=2)
+    parser.add_argument("--packages", type=int, default=40, help="每台设备额外的第三方填充包数量")
+    parser.add_argument("--latency", default="emulator",
+                        help=f"延迟预设 ({'/'.join(LATENCY_PRESETS)}) 或 JSON 字符串")
+    parser.add_argument("--sleep-scale", type=float, default=1.0, help="固定等待的缩放系数，0 表示跳过")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="使用 asyncio 版本流水线")
+    parser.add_argument("--no-session", action="store_true", help="关闭常驻 shell 会话 (ADB_SHELL_SESSION)")
+    parser.add_argument("--no-artifact-cache", action="store_true", help="关闭注入数据库缓存产物 (ARTIFACT_CACHE)")
+    parser.add_argument("--prefs-bypass", action="store_true",
+                        help="注入 shared_prefs 模板跳过引导页 (PREFS_BYPASS)，模板放在 --sim-root 下")
+    parser.add_argument("--bulk-rows", type=int, default=0,
+                        help="Calendar / Tasks / Expense 各生成该数量的行 (BULK_ROWS)，0 表示按 data/ 原样注入")
+    parser.add_argument("--sms-rows", type=int, default=0, help="生成该数量的短信 (BULK_ROWS[PKG_TELEPHONY])")
+    parser.add_argument("--sms-on-device", action="store_true",
+                        help="短信用设备端单事务 SQL 脚本注入，不在主机上构建 mmssms.db (SMS_HOST_BUILD=False)")
+    parser.add_argument("--contacts-rows", type=int, default=0,
+                        help="生成该数量的联系人 (BULK_ROWS[PKG_CONTACTS_STORAGE])")
+    parser.add_argument("--contacts-each", action="store_true",
+                        help="联系人逐个 content insert，不直接写 contacts2.db (CONTACTS_BULK=False)")
+    parser.add_argument("--sim-root", help="模拟器目录 (默认临时目录，运行结束后删除)")
+    parser.add_argument("--trace", metavar="PATH", help="同时导出 Chrome trace JSON")
+    parser.add_argument("--json", metavar="PATH", help="把结果写成 JSON，便于与基线对比")
+    return parser.parse_args(argv)
+
+
+def _setup_environment(args, sim_root):
+    """必须在导入 utils / main 之前调用: 各模块以 from config import ADB_PATH 的方式取值"""
+    import config
+    config.ADB_PATH = FAKE_ADB
+    config.ADB_BACKEND = "binary"
+    if args.no_session:
+        config.ADB_SHELL_SESSION = False
+    # 缓存产物放在模拟器目录下，每次基准都从空缓存开始
+    config.ARTIFACT_CACHE = not args.no_artifact_cache
+    config.ARTIFACT_CACHE_DIR = os.path.join(sim_root, "artifacts")
+    config.PREFS_BYPASS = args.prefs_bypass
+    config.PREFS_TEMPLATE_DIR = os.path.join(sim_root, "prefs_templates")
+    if args.bulk_rows:
+        config.BULK_ROWS = {p: args.bulk_rows for p in (config.PKG_CALENDAR, config.PKG_TASKS, config.PKG_EXPENSE)}
+    if args.sms_rows:
+        config.BULK_ROWS = dict(config.BULK_ROWS, **{config.PKG_TELEPHONY: args.sms_rows})
+    if args.contacts_rows:
+        config.BULK_ROWS = dict(config.BULK_ROWS, **{config.PKG_CONTACTS_STORAGE: args.contacts_rows})
+    config.SMS_HOST_BUILD = not args.sms_on_device
+    config.CONTACTS_BULK = not args.contacts_each
+    os.environ["FAKE_ADB_ROOT"] = sim_root
+    os.chmod(FAKE_ADB, 0o755)
+
+    import fake_adb
+    fake_adb.SIM_ROOT = sim_root
+    if args.latency in LATENCY_PRESETS:
+        latency, bps = LATENCY_PRESETS[args.latency], TRANSFER_PRESETS[args.latency]
+    else:
+        latency, bps = json.loads(args.latency), 0
+    return fake_adb.init_sim(sim_root, args.devices, args.packages, latency, transfer_bytes_per_s=bps)
+
+
+def _scale_sleeps(scale):
+    if scale == 1.0:
+        return
+    real_sleep, real_async_sleep = time.sleep, asyncio.sleep
+
+    def sleep(seconds):
+        if seconds * scale > 0: real_sleep(seconds * scale)
+
+    async def async_sleep(seconds, result=None):
+        return await real_async_sleep(seconds * scale, result)
+
+    # 只替换流水线代码里的固定等待; adb_session 等基础设施使用队列超时，不受影响
+    time.sleep = sleep
+    asyncio.sleep = async_sleep
+
+
+def _run(main_mod, devices, use_async):
+    start = time.perf_counter()
+    if use_async:
+        asyncio.run(main_mod.run_all_async(devices))
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(devices)) as executor:
+            for _ in executor.map(main_mod.process_device_pipeline, devices): pass
+    return time.perf_counter() - start
+
+
+def _count(db, table):
+    if not os.path.exists(db):
+        return None
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+def verify_device(fake_adb, sim_root, serial):
+    """直接读取假设备文件系统，核对注入结果"""
+    from config import DB_CALENDAR_PATH, DB_TASKS_PATH, DB_EXPENSE_PATH, DB_SMS_PATH, PKG_CONTACTS_STORAGE
+    dev = fake_adb.FakeDevice(sim_root, serial)
+    contacts_db = dev.host_path(f"/data/data/{PKG_CONTACTS_STORAGE}/databases/contacts2.db")
+    files = 0
+    for d in ("sdcard/Documents", "sdcard/Download", "sdcard/Pictures", "sdcard/DCIM"):
+        for _, _, fs in os.walk(dev.host_path(d)):
+            files += len(fs)
+    return {
+        "calendar_events": _count(dev.host_path(DB_CALENDAR_PATH), "events"),
+        "tasks": _count(dev.host_path(DB_TASKS_PATH), "tasks"),
+        "expenses": _count(dev.host_path(DB_EXPENSE_PATH), "expense"),
+        "sms": _count(dev.host_path(DB_SMS_PATH), "sms"),
+        "raw_contacts": _count(contacts_db, "raw_contacts"),
+        "sdcard_files": files,
+    }
+
+
+def build_report(tracing, wall, devices, verify, logs=None, waits=None, artifacts=None, fleet=None,
+                 wizards=None, db_writes=None):
+    spans = tracing.spans()
+    adb = [s for s in spans if s.cat == "adb"]
+    by_class, by_backend = {}, {}
+    for s in adb:
+        by_class[s.name] = by_class.get(s.name, 0) + 1
+        backend = s.args.get("backend", "?")
+        by_backend[backend] = by_backend.get(backend, 0) + 1
+    stages = {}
+    for name in STAGES + ["pipeline"]:
+        ds = [s.duration for s in spans if s.name == name and s.cat in ("stage", "pipeline")]
+        if ds:
+            stages[name] = {"mean": sum(ds) / len(ds), "max": max(ds)}
+    return {
+        "devices": len(devices),
+        "wall_s": wall,
+        "adb_calls": len(adb),
+        "adb_calls_per_device": len(adb) / max(len(devices), 1),
+        "adb_calls_by_backend": by_backend,
+        "adb_calls_by_class": dict(sorted(by_class.items(), key=lambda kv: -kv[1])),
+        "stages": stages,
+        "verify": verify,
+        "logs": logs or {},
+        "waits": waits or {},
+        "artifacts": artifacts or {},
+        "fleet": fleet or {},
+        "wizards": wizards or {},
+        "db_writes": db_writes or {},
+    }
+
+
+def print_report(report, tracing, readiness, artifact_cache, wizards, inject_app_db):
+    print()
+    print("=" * 60)
+    print(f"设备数: {report['devices']}    墙钟: {report['wall_s']:.2f}s")
+    print(f"adb 调用: {report['adb_calls']} (每台 {report['adb_calls_per_device']:.1f})  "
+          f"后端: {report['adb_calls_by_backend']}")
+    print("-" * 60)
+    print(f"{'stage':<12}{'mean(s)':>10}{'max(s)':>10}")
+    for name, st in report["stages"].items():
+        print(f"{name:<12}{st['mean']:>10.2f}{st['max']:>10.2f}")
+    print("-" * 60)
+    for serial, v in report["verify"].items():
+        print(f"[{serial}] " + ", ".join(f"{k}={v[k]}" for k in v))
+    print("-" * 60)
+    for serial, st in report["logs"].items():
+        print(f"[{serial}] 日志 {st['records']} 条 / {st['bytes'] / 1024:.1f} KiB, "
+              f"入队 {st['enqueue_s'] * 1000:.1f} ms, 写线程 {st['write_s'] * 1000:.1f} ms")
+    print("=" * 60)
+    print(readiness.stats_table())
+    print("=" * 60)
+    print(wizards.stats_table())
+    print("=" * 60)
+    print(inject_app_db.stats_table())
+    print("=" * 60)
+    print(artifact_cache.stats_table())
+    print()
+    print(artifact_cache.fleet_table())
+    print("=" * 60)
+    print(tracing.summary_table())
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sim_root = args.sim_root or tempfile.mkdtemp(prefix="fake_adb_")
+    devices = _setup_environment(args, sim_root)
+
+    # 流水线按相对路径读取 data/ 与 source/
+    os.chdir(REPO_ROOT)
+    import artifact_cache
+    import fake_adb
+    import log_backend
+    import readiness
+    import tracing
+    import main as pipeline
+    from modules import wizards, inject_app_db
+    tracing.enable()
+    tracing.reset()
+    _scale_sleeps(args.sleep_scale)
+
+    try:
+        if artifact_cache.enabled() and len(devices) > 1:
+            print(artifact_cache.plan_table(artifact_cache.plan_fleet(devices, pipeline.ARTIFACT_PKGS),
+                                            pipeline.ARTIFACT_PKGS))
+        wall = _run(pipeline, devices, args.use_async)
+        verify = {d: verify_device(fake_adb, sim_root, d) for d in devices}
+        log_backend.flush()
+        report = build_report(tracing, wall, devices, verify, log_backend.log_stats(), readiness.wait_stats(),
+                              artifact_cache.cache_stats(), artifact_cache.fleet_stats(),
+                              wizards.wizard_stats(), inject_app_db.write_stats())
+        report["mode"] = "async" if args.use_async else "threads"
+        report["latency"] = args.latency
+        report["sleep_scale"] = args.sleep_scale
+        print_report(report, tracing, readiness, artifact_cache, wizards, inject_app_db)
+        if args.trace:
+            tracing.export_chrome_trace(args.trace)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+    finally:
+        from adb_session import close_all_sessions
+        close_all_sessions()
+        if not args.sim_root:
+            import shutil
+            shutil.rmtree(sim_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
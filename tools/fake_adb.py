@@ -0,0 +1,1026 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线假设备模拟器 (adb 替身)
+
+把 config.ADB_PATH 指向本文件即可在普通 Linux 机器上跑完整流水线，无需模拟器。
+每台假设备在 FAKE_ADB_ROOT/<serial>/ 下拥有:
+  fs/          设备文件系统 (/data, /sdcard ... 会被映射到这里)
+  bin/         设备上的 pm / am / dumpsys / sqlite3 / content / monkey ... 替身
+  state.json   包列表、进程表等设备状态
+
+shell 命令交给本机 sh 执行，命令中的设备绝对路径被改写到 fs/ 下，输出再改写回来；
+kill / chown 等会影响本机的命令全部由 bin/ 中的替身接管。
+
+用法:
+    python3 tools/fake_adb.py --init --devices 2 --packages 40
+    FAKE_ADB_ROOT=/tmp/fake_adb python3 tools/fake_adb.py -s sim-5554 shell pm list packages
+
+sim.json 中的 latency 可为每类命令注入固定延迟 (秒)，键为 adb 子命令 (shell / push / pull / root ...)
+或设备上的程序名 (pm / am / sqlite3 / monkey ...)，"default" 作为兜底；
+transfer_bytes_per_s 限制 push / pull 的带宽 (0 表示不限)。
+
+注意: 每个设备程序替身都是一次 Python 进程启动，本身有几十毫秒开销，
+基准结果适合做前后对比，不代表真机上的绝对耗时。
+"""
+import argparse
+import fcntl
+import json
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from config import (PKG_CALENDAR, PKG_TASKS, PKG_EXPENSE, PKG_MARKOR, PKG_CONTACTS,
+                    PKG_TELEPHONY, PKG_CONTACTS_STORAGE, PATH_MARKOR_ROOT)
+
+SIM_ROOT = os.environ.get("FAKE_ADB_ROOT", os.path.join(tempfile.gettempdir(), "fake_adb"))
+CONFIG_NAME = "sim.json"
+
+PKG_MSG = "com.google.android.apps.messaging"
+PKG_PHONE = "com.android.phone"
+PKG_MEDIA = "com.android.providers.media"
+PKG_LAUNCHER = "com.android.launcher3"
+
+# 设备上被映射到 fs/ 下的顶层目录
+DEVICE_DIRS = ("data", "sdcard", "storage", "system", "mnt", "cache", "vendor")
+_DEVICE_PATH_RE = re.compile(r"(?<![\w.:/-])/(%s)(?=[/\s'\";|&)<>*]|$)" % "|".join(DEVICE_DIRS))
+
+# 设备上的程序替身 (kill 是 shell 内建命令，由 PRELUDE 中的函数覆盖)
+TOOLS = ("pm", "am", "cmd", "dumpsys", "wm", "input", "uiautomator", "monkey", "pidof", "kill", "killall",
+         "sqlite3", "content", "chown", "restorecon", "chcon", "getprop", "setprop",
+         "settings", "reboot", "setenforce", "logcat")
+PRELUDE = 'kill() { "$FAKE_ADB_BIN/kill" "$@"; }\n'
+
+# 系统包: (包名, uid)
+SYSTEM_PACKAGES = [
+    ("android", 1000), ("com.android.systemui", 10010), ("com.android.settings", 1000),
+    ("com.android.shell", 2000), (PKG_LAUNCHER, 10011),
+    ("com.google.android.gms", 10012), ("com.android.vending", 10013),
+    ("com.android.inputmethod.latin", 10014), ("com.android.providers.settings", 1000),
+    (PKG_MEDIA, 10015), ("com.android.providers.downloads", 10016),
+    (PKG_TELEPHONY, 1001), (PKG_CONTACTS_STORAGE, 10017), (PKG_PHONE, 1001),
+    (PKG_CONTACTS, 10018), (PKG_MSG, 10019),
+]
+TARGET_PACKAGES = [PKG_CALENDAR, PKG_TASKS, PKG_EXPENSE, PKG_MARKOR]
+# 常驻系统进程: 被 kill 后立即以新 pid 重生
+SYSTEM_PROCS = (PKG_PHONE, "android.process.acore", "android.process.media")
+
+# ==================== 应用建库 (首次启动时) ====================
+SCHEMAS = {
+    PKG_CALENDAR: ("events.db", [
+        "CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, start_ts INTEGER, end_ts INTEGER, "
+        "title TEXT, location TEXT, description TEXT, reminder_1_minutes INTEGER, reminder_2_minutes INTEGER, "
+        "reminder_3_minutes INTEGER, reminder_1_type INTEGER, reminder_2_type INTEGER, reminder_3_type INTEGER, "
+        "repeat_interval INTEGER, repeat_rule INTEGER, repeat_limit INTEGER, repetition_exceptions TEXT, "
+        "attendees TEXT, import_id TEXT, time_zone TEXT, flags INTEGER, event_type INTEGER, parent_id INTEGER, "
+        "last_updated INTEGER, source TEXT, availability INTEGER, color INTEGER, type INTEGER)",
+        "CREATE TABLE IF NOT EXISTS event_types (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, color INTEGER, "
+        "type INTEGER, caldav_calendar_id INTEGER, caldav_display_name TEXT, caldav_email TEXT)",
+    ]),
+    PKG_TASKS: ("database", [
+        "CREATE TABLE IF NOT EXISTS tasks (_id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, importance INTEGER, "
+        "dueDate INTEGER, hideUntil INTEGER, created INTEGER, modified INTEGER, completed INTEGER, deleted INTEGER, "
+        "notes TEXT, estimatedSeconds INTEGER, elapsedSeconds INTEGER, timerStart INTEGER, "
+        "notificationFlags INTEGER, lastNotified INTEGER, recurrence TEXT, repeat_from INTEGER, "
+        "collapsed INTEGER, parent INTEGER, \"order\" INTEGER, read_only INTEGER)",
+    ]),
+    PKG_EXPENSE: ("accounting.db", [
+        "CREATE TABLE IF NOT EXISTS expense (expense_id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, "
+        "amount INTEGER, category INTEGER, note TEXT, created_date INTEGER, modified_date INTEGER)",
+    ]),
+    PKG_TELEPHONY: ("mmssms.db", [
+        "CREATE TABLE IF NOT EXISTS canonical_addresses (_id INTEGER PRIMARY KEY AUTOINCREMENT, address TEXT)",
+        "CREATE TABLE IF NOT EXISTS threads (_id INTEGER PRIMARY KEY AUTOINCREMENT, date INTEGER DEFAULT 0, "
+        "message_count INTEGER DEFAULT 0, recipient_ids TEXT, snippet TEXT, snippet_cs INTEGER DEFAULT 0, "
+        "read INTEGER DEFAULT 1, archived INTEGER DEFAULT 0, type INTEGER DEFAULT 0, error INTEGER DEFAULT 0, "
+        "has_attachment INTEGER DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS sms (_id INTEGER PRIMARY KEY AUTOINCREMENT, thread_id INTEGER, address TEXT, "
+        "person INTEGER, date INTEGER, date_sent INTEGER DEFAULT 0, protocol INTEGER, read INTEGER DEFAULT 0, "
+        "status INTEGER DEFAULT -1, type INTEGER, body TEXT, seen INTEGER DEFAULT 0)",
+    ]),
+    PKG_CONTACTS_STORAGE: ("contacts2.db", [
+        "CREATE TABLE IF NOT EXISTS raw_contacts (_id INTEGER PRIMARY KEY AUTOINCREMENT, account_name TEXT, "
+        "account_type TEXT, deleted INTEGER DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS data (_id INTEGER PRIMARY KEY AUTOINCREMENT, raw_contact_id INTEGER, "
+        "mimetype TEXT, data1 TEXT)",
+    ]),
+}
+# 首次启动的引导页: 每页右下角一个按钮，点完最后一页才算初始化完成 (建库 / 建目录)
+WIZARD_PAGES = {
+    PKG_MARKOR: ["Next", "Next", "Next", "Next", "Done"],
+    PKG_EXPENSE: ["Next", "Continue"],
+    PKG_TASKS: ["Next", "Get started"],
+}
+# 引导页完成后写入应用自己的 SharedPreferences
+WIZARD_PREF = "shared_prefs/{pkg}_preferences.xml"
+WIZARD_DONE_KEY = "intro_done"
+# 引导页按钮区域 (屏幕比例): 左, 上, 右, 下
+WIZARD_BUTTON_BOUNDS = (0.70, 0.87, 0.95, 0.93)
+# 启动某个应用时，顺带让哪个 Provider 建库
+LAUNCH_BOOTSTRAP = {PKG_MSG: PKG_TELEPHONY, PKG_CONTACTS: PKG_CONTACTS_STORAGE}
+PROC_PROVIDER = {PKG_PHONE: PKG_TELEPHONY, "android.process.acore": PKG_CONTACTS_STORAGE}
+CONTENT_TABLES = {
+    "content://com.android.contacts/raw_contacts": (PKG_CONTACTS_STORAGE, "raw_contacts"),
+    "content://com.android.contacts/data": (PKG_CONTACTS_STORAGE, "data"),
+    "content://sms": (PKG_TELEPHONY, "sms"),
+    "content://mms-sms/canonical-addresses": (PKG_TELEPHONY, "canonical_addresses"),
+}
+
+# ==================== 模拟器配置 ====================
+
+def load_config(root=None):
+    path = os.path.join(root or SIM_ROOT, CONFIG_NAME)
+    if not os.path.exists(path):
+        return {"devices": [], "latency": {}, "screen_size": "1080x2400", "transfer_bytes_per_s": 0}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def simulate_latency(cfg, key, nbytes=0):
+    latency = cfg.get("latency") or {}
+    delay = latency.get(key, latency.get("default", 0.0))
+    bps = cfg.get("transfer_bytes_per_s") or 0
+    if nbytes and bps:
+        delay += nbytes / bps
+    if delay > 0:
+        time.sleep(delay)
+
+
+def init_sim(root=None, devices=1, packages=40, latency=None, screen_size="1080x2400",
+             transfer_bytes_per_s=0, serial_prefix="sim-"):
+    """重建模拟器目录并初始化设备，返回设备序列号列表"""
+    root = root or SIM_ROOT
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    os.makedirs(root)
+    serials = [f"{serial_prefix}{5554 + 2 * i}" for i in range(devices)]
+    cfg = {
+        "devices": serials,
+        "latency": latency or {},
+        "screen_size": screen_size,
+        "transfer_bytes_per_s": transfer_bytes_per_s,
+    }
+    with open(os.path.join(root, CONFIG_NAME), "w", encoding="utf-8") as f:
+        json.dump(cfg, f, indent=2)
+    for serial in serials:
+        FakeDevice(root, serial).provision(packages)
+    return serials
+
+# ==================== 设备 ====================
+
+class FakeDevice:
+    def __init__(self, root, serial):
+        self.root = root
+        self.serial = serial
+        self.dir = os.path.join(root, serial)
+        self.fs = os.path.join(self.dir, "fs")
+        self.bin = os.path.join(self.dir, "bin")
+        self.state_path = os.path.join(self.dir, "state.json")
+        self._lock_path = os.path.join(self.dir, "state.lock")
+
+    @property
+    def exists(self):
+        return os.path.exists(self.state_path)
+
+    # ---------- 路径映射 ----------
+    def host_path(self, device_path):
+        return os.path.join(self.fs, device_path.lstrip("/"))
+
+    def rewrite_in(self, text):
+        return _DEVICE_PATH_RE.sub(lambda m: self.fs + m.group(0), text)
+
+    def rewrite_out(self, text):
+        return text.replace(self.fs, "")
+
+    # ---------- 状态 ----------
+    def locked(self):
+        return _FileLock(self._lock_path)
+
+    def load_state(self):
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_state(self, state):
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    def provision(self, filler_packages=40):
+        for d in ("data/local/tmp", "data/data", "sdcard/Documents", "sdcard/Download",
+                  "sdcard/Pictures", "sdcard/DCIM", "system"):
+            os.makedirs(self.host_path(d), exist_ok=True)
+        os.makedirs(self.bin, exist_ok=True)
+        me = os.path.abspath(__file__)
+        for tool in TOOLS:
+            shim = os.path.join(self.bin, tool)
+            with open(shim, "w") as f:
+                # -S: 替身只用标准库，跳过 site 初始化以缩短每次启动
+                f.write(f'#!/bin/sh\nexec "{sys.executable}" -S "{me}" --tool {tool} "$@"\n')
+            os.chmod(shim, 0o755)
+
+        packages = {}
+        for pkg, uid in SYSTEM_PACKAGES:
+            packages[pkg] = {"uid": uid, "version": 34}
+        for i, pkg in enumerate(TARGET_PACKAGES):
+            packages[pkg] = {"uid": 10100 + i, "version": 100 + i}
+        for i in range(filler_packages):
+            packages[f"com.example.filler{i:03d}"] = {"uid": 10200 + i, "version": 1}
+        for pkg in packages:
+            os.makedirs(self.host_path(f"data/data/{pkg}"), exist_ok=True)
+
+        state = {"packages": packages, "procs": {}, "next_pid": 1000, "rooted": False}
+        for name in SYSTEM_PROCS:
+            _spawn(state, name)
+        self.save_state(state)
+        for provider in (PKG_TELEPHONY, PKG_CONTACTS_STORAGE):
+            self.bootstrap(provider)
+
+    # ---------- 应用行为 ----------
+    def db_path(self, pkg):
+        name, _ = SCHEMAS[pkg]
+        return self.host_path(f"data/data/{pkg}/databases/{name}")
+
+    def bootstrap(self, pkg):
+        """应用 / Provider 启动时若数据库不存在则建库"""
+        if pkg == PKG_MARKOR:
+            os.makedirs(self.host_path(PATH_MARKOR_ROOT), exist_ok=True)
+        if pkg not in SCHEMAS:
+            return
+        path = self.db_path(pkg)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path)
+        try:
+            for sql in SCHEMAS[pkg][1]:
+                conn.execute(sql)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def launch(self, state, pkg):
+        if pkg not in state["packages"]:
+            return False
+        _spawn(state, pkg)
+        state["focus"] = pkg
+        if pkg in WIZARD_PAGES and not self.wizard_done(pkg):
+            # 未完成引导页: 从第一页开始，完成后才初始化
+            state.setdefault("wizard", {})[pkg] = 0
+            return True
+        self.bootstrap(pkg)
+        if pkg in LAUNCH_BOOTSTRAP:
+            self.bootstrap(LAUNCH_BOOTSTRAP[pkg])
+        return True
+
+    def wizard_done(self, pkg):
+        path = self.host_path(f"data/data/{pkg}/" + WIZARD_PREF.format(pkg=pkg))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f'name="{WIZARD_DONE_KEY}" value="true"' in f.read()
+        except OSError:
+            return False
+
+    def finish_wizard(self, state, pkg):
+        path = self.host_path(f"data/data/{pkg}/" + WIZARD_PREF.format(pkg=pkg))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("<?xml version='1.0' encoding='utf-8' standalone='yes' ?>\n<map>\n"
+                    f'    <boolean name="{WIZARD_DONE_KEY}" value="true" />\n</map>\n')
+        state.get("wizard", {}).pop(pkg, None)
+        self.bootstrap(pkg)
+
+    def screen_size(self):
+        w, h = load_config(self.root).get("screen_size", "1080x2400").split("x")
+        return int(w), int(h)
+
+    def wizard_button(self):
+        w, h = self.screen_size()
+        l, t, r, b = WIZARD_BUTTON_BOUNDS
+        return int(w * l), int(h * t), int(w * r), int(h * b)
+
+    def shell_env(self):
+        env = os.environ.copy()
+        env["PATH"] = self.bin + os.pathsep + env.get("PATH", "/usr/bin:/bin")
+        env["FAKE_ADB_ROOT"] = self.root
+        env["FAKE_ADB_SERIAL"] = self.serial
+        env["FAKE_ADB_BIN"] = self.bin
+        return env
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.f = open(self.path, "a")
+        fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+
+
+def _spawn(state, name):
+    state["next_pid"] += 1
+    state["procs"][name] = state["next_pid"]
+    return state["next_pid"]
+
+
+def _stop(state, name):
+    # 前台应用被停止后回到桌面
+    if state.get("focus") == name:
+        state["focus"] = PKG_LAUNCHER
+    return state["procs"].pop(name, None) is not None
+
+# ==================== adb 前端 ====================
+
+def _print_transfer(nbytes, start, action, nfiles):
+    dt = max(time.time() - start, 1e-6)
+    print(f"{nfiles} file{'s' if nfiles != 1 else ''} {action}, 0 skipped. "
+          f"{nbytes / dt / 1e6:.1f} MB/s ({nbytes} bytes in {dt:.3f}s)")
+
+
+def _copy(src, dst):
+    """复制文件或目录，返回 (文件数, 字节数)"""
+    if os.path.isdir(src):
+        shutil.copytree(src, dst, dirs_exist_ok=True)
+        nfiles = nbytes = 0
+        for root, _, files in os.walk(dst):
+            for f in files:
+                nfiles += 1
+                nbytes += os.path.getsize(os.path.join(root, f))
+        return nfiles, nbytes
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    shutil.copyfile(src, dst)
+    return 1, os.path.getsize(dst)
+
+
+def cmd_shell(dev, cfg, args):
+    if not args:
+        return _interactive_shell(dev)
+    simulate_latency(cfg, "shell")
+    # 与 adb 一致: shell 之后的参数以空格拼接成一条命令
+    cmd = dev.rewrite_in(" ".join(args))
+    proc = subprocess.run(["/bin/sh", "-c", PRELUDE + cmd], cwd=dev.fs, env=dev.shell_env(),
+                          capture_output=True, stdin=subprocess.DEVNULL)
+    sys.stdout.write(dev.rewrite_out(proc.stdout.decode("utf-8", "replace")))
+    sys.stderr.write(dev.rewrite_out(proc.stderr.decode("utf-8", "replace")))
+    return proc.returncode
+
+
+def cmd_exec(dev, cfg, args, stdin=False):
+    """exec-out / exec-in: 无 PTY、二进制安全 (stdout 不做路径改写)；exec-in 把本地 stdin 转给命令"""
+    if not args:
+        print("adb: exec requires an argument", file=sys.stderr)
+        return 1
+    data = sys.stdin.buffer.read() if stdin else b""
+    simulate_latency(cfg, "shell")
+    if stdin:
+        # 送入的数据与 push 一样受带宽限制
+        simulate_latency(cfg, "exec-in", len(data))
+    cmd = dev.rewrite_in(" ".join(args))
+    proc = subprocess.run(["/bin/sh", "-c", PRELUDE + cmd], cwd=dev.fs, env=dev.shell_env(),
+                          capture_output=True, input=data)
+    sys.stdout.buffer.write(proc.stdout)
+    sys.stdout.flush()
+    sys.stderr.write(dev.rewrite_out(proc.stderr.decode("utf-8", "replace")))
+    return proc.returncode
+
+
+def _interactive_shell(dev):
+    """无参数的 `adb shell`: 逐行转发 stdin 给本机 sh，输出逐行改写后转发回来"""
+    proc = subprocess.Popen(["/bin/sh"], cwd=dev.fs, env=dev.shell_env(),
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def pump_out(src, dst):
+        for line in iter(src.readline, b""):
+            dst.write(dev.rewrite_out(line.decode("utf-8", "replace")))
+            dst.flush()
+
+    threads = [threading.Thread(target=pump_out, args=(proc.stdout, sys.stdout), daemon=True),
+               threading.Thread(target=pump_out, args=(proc.stderr, sys.stderr), daemon=True)]
+    for t in threads: t.start()
+    try:
+        proc.stdin.write(PRELUDE.encode())
+        proc.stdin.flush()
+        for line in iter(sys.stdin.buffer.readline, b""):
+            proc.stdin.write(dev.rewrite_in(line.decode("utf-8", "replace")).encode("utf-8"))
+            proc.stdin.flush()
+        proc.stdin.close()
+    except (BrokenPipeError, OSError):
+        pass
+    rc = proc.wait()
+    for t in threads: t.join(timeout=2)
+    return rc
+
+
+def cmd_push(dev, cfg, args):
+    if len(args) < 2:
+        print("adb: push requires an argument", file=sys.stderr)
+        return 1
+    local, remote = args[-2], args[-1]
+    if not os.path.exists(local):
+        print(f"adb: error: cannot stat '{local}': No such file or directory", file=sys.stderr)
+        return 1
+    dst = dev.host_path(remote)
+    if remote.endswith("/") or os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(local.rstrip("/")))
+    start = time.time()
+    nfiles, nbytes = _copy(local, dst)
+    simulate_latency(cfg, "push", nbytes)
+    _print_transfer(nbytes, start, "pushed", nfiles)
+    return 0
+
+
+def cmd_pull(dev, cfg, args):
+    if len(args) < 1:
+        print("adb: pull requires an argument", file=sys.stderr)
+        return 1
+    remote = args[0]
+    local = args[1] if len(args) > 1 else "."
+    src = dev.host_path(remote)
+    if not os.path.exists(src):
+        print(f"adb: error: failed to stat remote object '{remote}': No such file or directory", file=sys.stderr)
+        return 1
+    dst = local
+    if os.path.isdir(local):
+        dst = os.path.join(local, os.path.basename(remote.rstrip("/")))
+    start = time.time()
+    nfiles, nbytes = _copy(src, dst)
+    simulate_latency(cfg, "pull", nbytes)
+    _print_transfer(nbytes, start, "pulled", nfiles)
+    return 0
+
+
+def cmd_root(dev, cfg, args, root=True):
+    simulate_latency(cfg, "root")
+    with dev.locked():
+        state = dev.load_state()
+        if state.get("rooted") == root:
+            print("adbd is already running as root" if root else "adbd not running as root")
+            return 0
+        state["rooted"] = root
+        dev.save_state(state)
+    print("restarting adbd as root" if root else "restarting adbd as non root")
+    return 0
+
+
+def _emu_snapshot(dev, cfg, sub, name):
+    """模拟器控制台的 avd snapshot save / load / list / delete: 快照即 fs/ 与 state.json 的整份拷贝"""
+    snap_root = os.path.join(dev.dir, "snapshots")
+    snap = os.path.join(snap_root, name or "")
+    if sub == "list":
+        print("List of snapshots present on all disks:")
+        print("ID        TAG                 VM SIZE                DATE       VM CLOCK")
+        for tag in sorted(os.listdir(snap_root)) if os.path.isdir(snap_root) else []:
+            print(f"--        {tag:<20}   0M {time.strftime('%Y-%m-%d %H:%M:%S')}   00:00:00.000")
+        return True
+    if not name:
+        print("KO: missing snapshot name")
+        return False
+    simulate_latency(cfg, "snapshot")
+    with dev.locked():
+        if sub == "save":
+            shutil.rmtree(snap, ignore_errors=True)
+            shutil.copytree(dev.fs, os.path.join(snap, "fs"), symlinks=True)
+            shutil.copy2(dev.state_path, os.path.join(snap, "state.json"))
+        elif sub == "load":
+            if not os.path.isdir(snap):
+                print(f"KO: snapshot '{name}' does not exist")
+                return False
+            shutil.rmtree(dev.fs)
+            shutil.copytree(os.path.join(snap, "fs"), dev.fs, symlinks=True)
+            shutil.copy2(os.path.join(snap, "state.json"), dev.state_path)
+        elif sub == "delete":
+            shutil.rmtree(snap, ignore_errors=True)
+        else:
+            print(f"KO: unknown snapshot command '{sub}'")
+            return False
+    return True
+
+
+def cmd_emu(dev, cfg, args):
+    simulate_latency(cfg, "emu")
+    if args[:2] == ["sms", "send"]:
+        # 收到短信会拉起 TelephonyProvider 并建库
+        dev.bootstrap(PKG_TELEPHONY)
+    elif args[:2] == ["avd", "name"]:
+        print(f"Fake_AVD_{dev.serial.rsplit('-', 1)[-1]}")
+    elif args[:2] == ["avd", "snapshot"] and len(args) >= 3:
+        if not _emu_snapshot(dev, cfg, args[2], args[3] if len(args) > 3 else None):
+            return 0
+    print("OK")
+    return 0
+
+
+def cmd_reboot(dev, cfg, args):
+    simulate_latency(cfg, "reboot")
+    with dev.locked():
+        state = dev.load_state()
+        state["procs"] = {}
+        state["rooted"] = False
+        for name in SYSTEM_PROCS:
+            _spawn(state, name)
+        dev.save_state(state)
+    return 0
+
+
+def cmd_install(dev, cfg, args):
+    simulate_latency(cfg, "install")
+    return run_tool(dev, cfg, "pm", ["install"] + args)
+
+
+def cmd_uninstall(dev, cfg, args):
+    simulate_latency(cfg, "uninstall")
+    return run_tool(dev, cfg, "pm", ["uninstall"] + args)
+
+
+ADB_COMMANDS = {
+    "shell": cmd_shell,
+    "exec-out": cmd_exec,
+    "exec-in": lambda dev, cfg, args: cmd_exec(dev, cfg, args, stdin=True),
+    "push": cmd_push,
+    "pull": cmd_pull,
+    "root": cmd_root,
+    "unroot": lambda dev, cfg, args: cmd_root(dev, cfg, args, root=False),
+    "emu": cmd_emu,
+    "reboot": cmd_reboot,
+    "install": cmd_install,
+    "uninstall": cmd_uninstall,
+    "wait-for-device": lambda dev, cfg, args: 0,
+    "get-state": lambda dev, cfg, args: print("device") or 0,
+}
+
+
+def adb_main(argv):
+    cfg = load_config()
+    serial = os.environ.get("ANDROID_SERIAL")
+    args = list(argv)
+    while args and args[0].startswith("-"):
+        opt = args.pop(0)
+        if opt == "-s" and args:
+            serial = args.pop(0)
+        elif opt in ("-P", "-H", "-L"):
+            args = args[1:]
+    if not args:
+        print("Android Debug Bridge (fake)", file=sys.stderr)
+        return 1
+
+    verb, rest = args[0], args[1:]
+    if verb == "devices":
+        simulate_latency(cfg, "devices")
+        print("List of devices attached")
+        for s in cfg.get("devices", []):
+            print(f"{s}\tdevice")
+        print()
+        return 0
+    if verb in ("start-server", "kill-server", "version"):
+        print("Android Debug Bridge version 1.0.41 (fake)")
+        return 0
+
+    if serial is None and len(cfg.get("devices", [])) == 1:
+        serial = cfg["devices"][0]
+    dev = FakeDevice(SIM_ROOT, serial) if serial else None
+    if dev is None or not dev.exists:
+        print(f"adb: device '{serial}' not found", file=sys.stderr)
+        return 1
+    handler = ADB_COMMANDS.get(verb)
+    if handler is None:
+        print(f"adb: unknown command {verb}", file=sys.stderr)
+        return 1
+    return handler(dev, cfg, rest) or 0
+
+# ==================== 设备程序替身 ====================
+
+def tool_pm(dev, state, args):
+    sub = args[0] if args else ""
+    pkgs = state["packages"]
+    if sub == "list" and args[1:2] == ["packages"]:
+        flags = args[2:]
+        for pkg, info in pkgs.items():
+            line = f"package:{pkg}"
+            if "--show-versioncode" in flags: line += f" versionCode:{info['version']}"
+            if "-U" in flags: line += f" uid:{info['uid']}"
+            print(line)
+        return 0
+    if sub == "clear" and len(args) > 1:
+        pkg = args[-1]
+        if pkg not in pkgs:
+            print("Failed")
+            return 1
+        data_dir = dev.host_path(f"data/data/{pkg}")
+        shutil.rmtree(data_dir, ignore_errors=True)
+        os.makedirs(data_dir, exist_ok=True)
+        # 常驻进程 (如 com.android.phone) 被清数据后会立即重启
+        _kill_proc(dev, state, pkg)
+        print("Success")
+        return 0
+    if sub in ("grant", "revoke") and len(args) > 2:
+        if args[1] not in pkgs:
+            print(f"Exception occurred while executing '{sub}':", file=sys.stderr)
+            print(f"java.lang.IllegalArgumentException: Unknown package: {args[1]}", file=sys.stderr)
+            return 255
+        return 0
+    if sub == "path" and len(args) > 1:
+        if args[1] not in pkgs: return 1
+        print(f"package:/data/app/{args[1]}-1/base.apk")
+        return 0
+    if sub == "install":
+        pkg = os.path.splitext(os.path.basename(args[-1]))[0] if len(args) > 1 else ""
+        if pkg:
+            pkgs.setdefault(pkg, {"uid": 10500 + len(pkgs), "version": 1})
+            os.makedirs(dev.host_path(f"data/data/{pkg}"), exist_ok=True)
+        print("Success")
+        return 0
+    if sub == "uninstall" and len(args) > 1:
+        pkg = args[-1]
+        if pkgs.pop(pkg, None) is None:
+            print("Failure [DELETE_FAILED_INTERNAL_ERROR]")
+            return 1
+        _stop(state, pkg)
+        shutil.rmtree(dev.host_path(f"data/data/{pkg}"), ignore_errors=True)
+        print("Success")
+        return 0
+    print(f"pm: unknown command '{sub}'", file=sys.stderr)
+    return 1
+
+
+def tool_am(dev, state, args):
+    sub = args[0] if args else ""
+    if sub == "force-stop" and len(args) > 1:
+        _kill_proc(dev, state, args[-1])
+        return 0
+    if sub == "broadcast":
+        print("Broadcasting: Intent { act=... }")
+        print("Broadcast completed: result=0")
+        return 0
+    if sub in ("start", "start-activity"):
+        for i, a in enumerate(args):
+            if a == "-n" and i + 1 < len(args):
+                dev.launch(state, args[i + 1].split("/")[0])
+        print("Starting: Intent { ... }")
+        return 0
+    print(f"am: unknown command '{sub}'", file=sys.stderr)
+    return 1
+
+
+MONKEY_EVENT_RE = re.compile(r"^(\w+)\((.*)\)\s*$")
+
+
+def _monkey_script(dev, state, path):
+    """monkey -f: 执行 Tap / DispatchPress 事件，Drag / UserWait 只计数 (不模拟等待)"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        print(f"** Error: unable to open script {path}, monkey aborted.", file=sys.stderr)
+        return 1
+    body = lines[lines.index("start data >>") + 1:] if "start data >>" in lines else lines
+    injected = 0
+    for line in body:
+        m = MONKEY_EVENT_RE.match(line.strip())
+        if not m:
+            continue
+        name, params = m.group(1), [p.strip() for p in m.group(2).split(",")]
+        if name == "Tap" and len(params) >= 2:
+            _tap(dev, state, params[0], params[1])
+        elif name == "DispatchPress" and params:
+            _press(state, params[0])
+        injected += 1
+    print(f"Events injected: {injected}")
+    print("// Monkey finished")
+    return 0
+
+
+def tool_monkey(dev, state, args):
+    if "-f" in args:
+        i = args.index("-f")
+        return _monkey_script(dev, state, args[i + 1] if i + 1 < len(args) else "")
+    pkg = None
+    for i, a in enumerate(args):
+        if a == "-p" and i + 1 < len(args):
+            pkg = args[i + 1]
+    if not pkg or not dev.launch(state, pkg):
+        print("** No activities found to run, monkey aborted.", file=sys.stderr)
+        return 252
+    print("Events injected: 1")
+    return 0
+
+
+def tool_dumpsys(dev, state, args):
+    if args[:1] == ["package"] and len(args) > 1:
+        info = state["packages"].get(args[1])
+        if not info:
+            print(f"Unable to find package: {args[1]}")
+            return 0
+        print("Packages:")
+        print(f"  Package [{args[1]}] (fake):")
+        print(f"    userId={info['uid']}")
+        print(f"    versionCode={info['version']} minSdk=21 targetSdk=34")
+        return 0
+    if args[:1] == ["window"]:
+        focus = state.get("focus", PKG_LAUNCHER)
+        print(f"  mCurrentFocus=Window{{1f2e3d u0 {focus}/{focus}.MainActivity}}")
+        print(f"  mFocusedApp=ActivityRecord{{4c5b6a u0 {focus}/.MainActivity t12}}")
+        return 0
+    return 0
+
+
+def tool_wm(dev, state, args, cfg=None):
+    if args[:1] == ["size"]:
+        print(f"Physical size: {(cfg or {}).get('screen_size', '1080x2400')}")
+    return 0
+
+
+def tool_pidof(dev, state, args):
+    pids = [str(state["procs"][n]) for n in args if n in state["procs"]]
+    if not pids: return 1
+    print(" ".join(pids))
+    return 0
+
+
+def _kill_proc(dev, state, name):
+    _stop(state, name)
+    if name in SYSTEM_PROCS:
+        _spawn(state, name)
+        if name in PROC_PROVIDER:
+            dev.bootstrap(PROC_PROVIDER[name])
+
+
+def tool_kill(dev, state, args):
+    rc = 0
+    by_pid = {str(pid): name for name, pid in state["procs"].items()}
+    for a in args:
+        if a.startswith("-"): continue
+        name = by_pid.get(a)
+        if name is None:
+            print(f"kill: {a}: No such process", file=sys.stderr)
+            rc = 1
+            continue
+        _kill_proc(dev, state, name)
+    return rc
+
+
+def tool_killall(dev, state, args):
+    names = [a for a in args if not a.startswith("-")]
+    found = False
+    for n in names:
+        if n in state["procs"]:
+            _kill_proc(dev, state, n)
+            found = True
+    if not found:
+        print(f"killall: {' '.join(names)}: no process killed", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _split_sql(sql):
+    stmts, buf = [], ""
+    for ch in sql:
+        buf += ch
+        if ch == ";" and sqlite3.complete_statement(buf):
+            stmts.append(buf)
+            buf = ""
+    if buf.strip():
+        stmts.append(buf)
+    return stmts
+
+
+def tool_sqlite3(dev, state, args):
+    opts = [a for a in args if a.startswith("-")]
+    rest = [a for a in args if not a.startswith("-")]
+    if not rest:
+        print("Usage: sqlite3 [OPTIONS] FILENAME [SQL]", file=sys.stderr)
+        return 1
+    db = rest[0]
+    sql = " ".join(rest[1:]) if len(rest) > 1 else sys.stdin.read()
+    sep = "|"
+    try:
+        os.makedirs(os.path.dirname(db) or ".", exist_ok=True)
+        conn = sqlite3.connect(db)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Error: unable to open database \"{dev.rewrite_out(db)}\": {e}", file=sys.stderr)
+        return 1
+    try:
+        for stmt in _split_sql(sql):
+            if not stmt.strip(): continue
+            cur = conn.execute(stmt)
+            for row in cur.fetchall():
+                print(sep.join("" if v is None else str(v) for v in row))
+        conn.commit()
+        return 0
+    except sqlite3.Error as e:
+        print(f"Error: in prepare, {e} (1)" if "-bail" not in opts else f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+
+def _parse_bind(spec):
+    col, typ, val = (spec.split(":", 2) + ["", ""])[:3]
+    if typ == "n": return col, None
+    if typ in ("i", "l"): return col, int(val)
+    if typ in ("f", "d"): return col, float(val)
+    if typ == "b": return col, 1 if val in ("true", "1") else 0
+    return col, val
+
+
+def tool_content(dev, state, args):
+    sub = args[0] if args else ""
+    uri, binds, projection, where = None, [], None, None
+    i = 1
+    while i < len(args):
+        a = args[i]
+        if a == "--uri": uri = args[i + 1]; i += 2; continue
+        if a == "--bind": binds.append(_parse_bind(args[i + 1])); i += 2; continue
+        if a == "--projection": projection = args[i + 1].split(":"); i += 2; continue
+        if a == "--where": where = args[i + 1]; i += 2; continue
+        i += 1
+    target = CONTENT_TABLES.get((uri or "").rstrip("/"))
+    if target is None:
+        print(f"Error while accessing provider:{uri}", file=sys.stderr)
+        print("java.lang.IllegalArgumentException: Unknown URI", file=sys.stderr)
+        return 1
+    provider, table = target
+    dev.bootstrap(provider)
+    conn = sqlite3.connect(dev.db_path(provider))
+    conn.row_factory = sqlite3.Row
+    try:
+        if sub == "insert":
+            cols = [c for c, _ in binds]
+            sql = f"INSERT INTO {table} ({','.join(cols)}) VALUES ({','.join('?' * len(cols))})"
+            conn.execute(sql, [v for _, v in binds])
+            conn.commit()
+            return 0
+        if sub == "query":
+            cols = ",".join(projection) if projection else "*"
+            sql = f"SELECT {cols} FROM {table}" + (f" WHERE {where}" if where else "")
+            rows = conn.execute(sql).fetchall()
+            if not rows:
+                print("No result found.")
+            for n, row in enumerate(rows):
+                print(f"Row: {n} " + ", ".join(f"{k}={'NULL' if row[k] is None else row[k]}" for k in row.keys()))
+            return 0
+        if sub == "delete":
+            conn.execute(f"DELETE FROM {table}" + (f" WHERE {where}" if where else ""))
+            conn.commit()
+            return 0
+    except sqlite3.Error as e:
+        print(f"Error while accessing provider: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    print(f"content: unknown command '{sub}'", file=sys.stderr)
+    return 1
+
+
+def tool_getprop(dev, state, args):
+    props = {"ro.build.version.sdk": "34", "ro.product.model": "FakeDevice",
+             "sys.boot_completed": "1", "ro.serialno": dev.serial}
+    if args:
+        print(props.get(args[0], ""))
+    else:
+        for k, v in props.items(): print(f"[{k}]: [{v}]")
+    return 0
+
+
+def _press(state, key):
+    # 只模拟会改变前台窗口的按键
+    if key in ("KEYCODE_HOME", "HOME", "3", "KEYCODE_BACK", "BACK", "4"):
+        state["focus"] = PKG_LAUNCHER
+
+
+def _tap(dev, state, x, y):
+    # 只模拟点中引导页按钮的点击
+    pkg = state.get("focus")
+    page = state.get("wizard", {}).get(pkg)
+    l, t, r, b = dev.wizard_button()
+    if page is not None and l <= float(x) <= r and t <= float(y) <= b:
+        if page + 1 >= len(WIZARD_PAGES[pkg]):
+            dev.finish_wizard(state, pkg)
+        else:
+            state["wizard"][pkg] = page + 1
+
+
+def tool_input(dev, state, args):
+    if args[:1] == ["keyevent"]:
+        for key in args[1:]:
+            _press(state, key)
+    elif args[:1] == ["tap"] and len(args) >= 3:
+        _tap(dev, state, args[1], args[2])
+    return 0
+
+
+def _ui_node(pkg, cls, bounds, text="", rid="", clickable=False, children=""):
+    l, t, r, b = bounds
+    node = (f'<node index="0" text="{text}" resource-id="{rid}" class="{cls}" package="{pkg}" content-desc="" '
+            f'checkable="false" checked="false" clickable="{str(clickable).lower()}" enabled="true" '
+            f'focusable="{str(clickable).lower()}" bounds="[{l},{t}][{r},{b}]"')
+    return f"{node}>{children}</node>" if children else f"{node} />"
+
+
+def tool_uiautomator(dev, state, args):
+    """uiautomator dump [--compressed] [文件]: 前台应用的界面层级 (引导页或主界面)"""
+    if args[:1] != ["dump"]:
+        print(f"uiautomator: unknown command {' '.join(args)}", file=sys.stderr)
+        return 1
+    files = [a for a in args[1:] if not a.startswith("-")]
+    path = files[0] if files else dev.host_path("sdcard/window_dump.xml")
+    w, h = dev.screen_size()
+    pkg = state.get("focus", PKG_LAUNCHER)
+    page = state.get("wizard", {}).get(pkg)
+    if page is not None:
+        pages = WIZARD_PAGES[pkg]
+        children = (_ui_node(pkg, "android.widget.TextView", (0, h // 3, w, h // 2),
+                             text=f"Welcome ({page + 1}/{len(pages)})", rid=f"{pkg}:id/title")
+                    + _ui_node(pkg, "android.widget.Button", dev.wizard_button(), text=pages[page],
+                               rid=f"{pkg}:id/next", clickable=True))
+    else:
+        children = _ui_node(pkg, "android.widget.TextView", (0, 0, w, h // 10), text=pkg, rid=f"{pkg}:id/toolbar")
+    xml = ("<?xml version='1.0' encoding='UTF-8' standalone='yes' ?><hierarchy rotation=\"0\">"
+           + _ui_node(pkg, "android.widget.FrameLayout", (0, 0, w, h), children=children) + "</hierarchy>")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(xml)
+    print(f"UI hierchary dumped to: {path}")
+    return 0
+
+
+def tool_noop(dev, state, args):
+    return 0
+
+
+TOOL_HANDLERS = {
+    "pm": tool_pm, "am": tool_am, "monkey": tool_monkey, "dumpsys": tool_dumpsys,
+    "pidof": tool_pidof, "kill": tool_kill, "killall": tool_killall,
+    "sqlite3": tool_sqlite3, "content": tool_content, "getprop": tool_getprop, "input": tool_input,
+    "uiautomator": tool_uiautomator,
+}
+# 不读写 state.json 的程序
+STATELESS_TOOLS = ("sqlite3", "getprop", "chown", "restorecon", "chcon",
+                   "setprop", "settings", "setenforce", "logcat")
+
+
+def run_tool(dev, cfg, name, args):
+    if name == "cmd" and args:
+        # `cmd package ...` / `cmd activity ...` 与 pm / am 等价
+        name, args = {"package": "pm", "activity": "am"}.get(args[0], args[0]), args[1:]
+    simulate_latency(cfg, name)
+    if name == "wm":
+        return tool_wm(dev, None, args, cfg)
+    if name == "reboot":
+        return cmd_reboot(dev, cfg, args)
+    handler = TOOL_HANDLERS.get(name, tool_noop)
+    if name in STATELESS_TOOLS:
+        return handler(dev, None, args)
+    with dev.locked():
+        state = dev.load_state()
+        rc = handler(dev, state, args)
+        dev.save_state(state)
+    return rc
+
+
+def tool_main(name, argv):
+    cfg = load_config()
+    dev = FakeDevice(os.environ.get("FAKE_ADB_ROOT", SIM_ROOT), os.environ.get("FAKE_ADB_SERIAL", ""))
+    if not dev.exists:
+        print(f"{name}: not running inside a fake device shell", file=sys.stderr)
+        return 1
+    return run_tool(dev, cfg, name, argv)
+
+# ==================== 入口 ====================
+
+def _init_main(argv):
+    parser = argparse.ArgumentParser(description="初始化假设备模拟器")
+    parser.add_argument("--init", action="store_true")
+    parser.add_argument("--root", default=SIM_ROOT)
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--packages", type=int, default=40, help="额外的第三方填充包数量")
+    parser.add_argument("--latency", default="{}", help='JSON，例如 {"shell": 0.01, "pm": 0.1}')
+    parser.add_argument("--screen-size", default="1080x2400")
+    args = parser.parse_args(argv)
+    serials = init_sim(args.root, args.devices, args.packages, json.loads(args.latency), args.screen_size)
+    print(f"模拟器已初始化: {args.root} -> {serials}")
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["--tool"] and len(argv) > 1:
+        return tool_main(argv[1], argv[2:])
+    if argv[:1] == ["--init"]:
+        return _init_main(argv)
+    return adb_main(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
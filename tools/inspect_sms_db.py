@@ -8,6 +8,11 @@ import sys
 import logging
 import shlex
 
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from sql_script import SqlScript
+from modules.inject_system import sms_sql_script
+
 # ==============================================================================
 # 配置区域
 # ==============================================================================
@@ -88,23 +93,29 @@ def run_shell(cmd, **kwargs):
 # 2. 远程 SQL 执行工具 (核心修改)
 # ==============================================================================
 
+def run_sql(script):
+    """push .sql 脚本后由设备上的一个 sqlite3 进程执行，返回 SqlResult (见 sql_script.py)"""
+    local, remote = script.write_local(), SqlScript.remote_path()
+    try:
+        run_adb(["push", local, remote])
+    finally:
+        os.remove(local)
+    out, err = run_shell(script.file_command(remote))
+    result = SqlScript.parse(out, err)
+    if not result.ok:
+        logger.error(f"SQL Error: {result.error} ({len(script)} statements)")
+    return result
+
 def db_exec(sql):
     """直接在设备上执行 SQL (Write)"""
-    # 转义双引号以免 shell 混淆
-    safe_sql = sql.replace('"', '\\"')
-    cmd = f"sqlite3 {DB_PATH} \"{safe_sql}\""
-    out, err = run_shell(cmd)
-    if "Error" in (out or "") or "Error" in (err or ""):
-        logger.error(f"SQL Error: {err or out} | SQL: {sql}")
-        return False
-    return True
+    return run_sql(SqlScript(DB_PATH, transaction=False).exec(sql)).ok
 
 def db_query(sql):
     """直接在设备上查询 SQL (Read)"""
-    safe_sql = sql.replace('"', '\\"')
-    cmd = f"sqlite3 {DB_PATH} \"{safe_sql}\""
-    out, _ = run_shell(cmd)
-    return out.strip() if out else None
+    result = run_sql(SqlScript(DB_PATH, transaction=False).query("result", sql))
+    if not result.ok:
+        return None
+    return "\n".join("|".join(row) for row in result.rows("result")) or None
 
 # ==============================================================================
 # 3. 环境健康度检查与修复
@@ -191,49 +202,11 @@ def ensure_healthy_env():
 # 4. 远程注入逻辑 (V12: On-Device Injection)
 # ==============================================================================
 
-def get_or_create_canonical_address_remote(address):
-    # 1. Check
-    sql_check = f"SELECT _id FROM canonical_addresses WHERE address = '{address}'"
-    res = db_query(sql_check)
-    if res and res.isdigit():
-        return int(res)
-    
-    # 2. Insert
-    db_exec(f"INSERT INTO canonical_addresses (address) VALUES ('{address}')")
-    
-    # 3. Fetch ID
-    res = db_query(sql_check)
-    return int(res) if res and res.isdigit() else None
-
-def get_or_create_thread_remote(recipient_id):
-    recip_str = str(recipient_id)
-    # 1. Check
-    sql_check = f"SELECT _id FROM threads WHERE recipient_ids = '{recip_str}'"
-    res = db_query(sql_check)
-    if res and res.isdigit():
-        return int(res)
-        
-    # 2. Insert (Need timestamp)
-    now = int(time.time() * 1000)
-    # 这里的 snippet 只是占位，后面会更新
-    sql_insert = (
-        f"INSERT INTO threads (date, message_count, recipient_ids, read, type, error, has_attachment) "
-        f"VALUES ({now}, 0, '{recip_str}', 1, 0, 0, 0)"
-    )
-    db_exec(sql_insert)
-    
-    # 3. Fetch ID
-    res = db_query(sql_check)
-    return int(res) if res and res.isdigit() else None
-
 def perform_injection_remote():
-    logger.info(">>> Step 2: 执行数据注入 (On-Device Mode) <<<")
+    logger.info(">>> Step 2: 执行数据注入 (On-Device SQL Script) <<<")
     
-    # 1. 清理旧数据 (保留表结构)
-    logger.info("Clearing old data via ADB...")
-    db_exec("DELETE FROM sms;")
-    db_exec("DELETE FROM threads;")
-    # canonical_addresses 不删，避免 ID 碎片化
+    # 清空 sms / threads (canonical_addresses 不删，避免 ID 碎片化)、建会话、插入短信、回填摘要，
+    # 全部在一个事务、一个 sqlite3 进程内完成
     
     messages = [
         ("10086", "Welcome to Android service.", 0, 1),
@@ -243,42 +216,13 @@ def perform_injection_remote():
         ("13800138000", "Yes, see you at 7.", 0, 2) # Sent message
     ]
     
-    now_ms = int(time.time() * 1000)
-    count = 0
-    
-    for addr, body, offset, type_ in messages:
-        # A. 获取关联 ID
-        recip_id = get_or_create_canonical_address_remote(addr)
-        if not recip_id:
-            logger.error(f"Failed to get canonical ID for {addr}")
-            continue
-            
-        tid = get_or_create_thread_remote(recip_id)
-        if not tid:
-            logger.error(f"Failed to get Thread ID for {addr}")
-            continue
-            
-        # B. 插入 SMS
-        # 转义单引号
-        safe_body = body.replace("'", "''")
-        ts = now_ms + offset
-        
-        sql_sms = (
-            f"INSERT INTO sms (address, body, date, read, type, thread_id) "
-            f"VALUES ('{addr}', '{safe_body}', {ts}, 1, {type_}, {tid})"
-        )
-        if db_exec(sql_sms):
-            count += 1
-            
-            # C. 更新 Thread 摘要
-            # 简化版：直接把最新这条作为摘要更新进去
-            sql_update_thread = (
-                f"UPDATE threads SET snippet = '{safe_body}', date = {ts}, message_count = message_count + 1 "
-                f"WHERE _id = {tid}"
-            )
-            db_exec(sql_update_thread)
-    
-    logger.info(f"✅ Injected {count} messages directly on device.")
+    items = [{"address": a, "body": b, "date_offset": o, "type": t} for a, b, o, t in messages]
+    result = run_sql(sms_sql_script(items, int(time.time() * 1000), DB_PATH))
+    if not result.ok:
+        logger.error("❌ Injection script failed, transaction rolled back.")
+        return
+    logger.info(f"✅ Injected {result.value('sms')} messages directly on device "
+                f"({result.value('threads')} threads, 1 transaction).")
     
     # 2. 刷新缓存
     logger.info("Flushing WAL and refreshing...")
@@ -308,9 +252,11 @@ def verify():
     else:
         logger.warning("⚠️ Telephony Process NOT detected (Might be restarting).")
         
-    # 检查数据
-    sms_count = db_query("SELECT count(*) FROM sms;")
-    thread_count = db_query("SELECT count(*) FROM threads;")
+    # 检查数据 (一次往返)
+    result = run_sql(SqlScript(DB_PATH, transaction=False)
+                     .query("sms", "SELECT count(*) FROM sms")
+                     .query("threads", "SELECT count(*) FROM threads"))
+    sms_count, thread_count = result.value("sms"), result.value("threads")
     
     logger.info(f"✅ Final SMS Count: {sms_count}")
     logger.info(f"✅ Final Threads Count: {thread_count}")
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+结构化耗时追踪 (span)
+
+为每条 adb 命令、每个注入器 / Wizard、以及流水线的每个步骤记录一个 span，
+包含设备号、命令类别、传输字节数与退出码。结果可导出为:
+  - Chrome trace-event JSON (chrome://tracing 或 https://ui.perfetto.dev 打开)
+  - 按阶段汇总的文本表格
+
+默认关闭 (span 为空操作)，由 main.py 的 --trace 参数开启:
+
+    tracing.enable()
+    with tracing.span(device_id, "clean", cat="stage"):
+        ...
+    tracing.export_chrome_trace("trace.json")
+    print(tracing.summary_table())
+"""
+import contextlib
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import os
+import re
+import threading
+import time
+
+_enabled = False
+_lock = threading.Lock()
+_spans = []
+_ids = itertools.count(1)
+_epoch = time.perf_counter()
+# 当前所在的父 span id (线程与 asyncio 任务各自独立)
+_parent = contextvars.ContextVar("trace_parent", default=None)
+
+_BYTES_RE = re.compile(r"\((\d+) bytes in")
+
+
+class Span:
+    __slots__ = ("id", "parent", "device_id", "name", "cat", "start", "end", "args")
+
+    def __init__(self, device_id, name, cat, args):
+        self.id = next(_ids)
+        self.parent = None
+        self.device_id = device_id
+        self.name = name
+        self.cat = cat
+        self.start = time.perf_counter()
+        self.end = None
+        self.args = dict(args)
+
+    def set(self, **kwargs):
+        self.args.update(kwargs)
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+
+class _NullSpan:
+    def set(self, **kwargs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    global _epoch
+    with _lock:
+        _spans.clear()
+        _epoch = time.perf_counter()
+
+
+def spans():
+    with _lock:
+        return list(_spans)
+
+
+@contextlib.contextmanager
+def span(device_id, name, cat="stage", **args):
+    """记录一个 span；异常会写入 args["error"] 后继续抛出"""
+    if not _enabled:
+        yield _NULL_SPAN
+        return
+    sp = Span(device_id, name, cat, args)
+    sp.parent = _parent.get()
+    token = _parent.set(sp.id)
+    try:
+        yield sp
+    except BaseException as e:
+        sp.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _parent.reset(token)
+        sp.end = time.perf_counter()
+        with _lock:
+            _spans.append(sp)
+
+
+def traced(cat):
+    """
+    装饰器: 以函数名为 span 名记录整次调用，第一个位置参数视为 device_id。
+    同时支持普通函数与 async 函数 (去掉 _async 后缀，两种模式汇总到同一行)；返回 bool 时记为 ok。
+    """
+    def deco(func):
+        name = func.__name__
+        if name.endswith("_async"): name = name[:-len("_async")]
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(device_id, *args, **kwargs):
+                with span(device_id, name, cat=cat) as sp:
+                    ret = await func(device_id, *args, **kwargs)
+                    if isinstance(ret, bool): sp.set(ok=ret)
+                    return ret
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(device_id, *args, **kwargs):
+            with span(device_id, name, cat=cat) as sp:
+                ret = func(device_id, *args, **kwargs)
+                if isinstance(ret, bool): sp.set(ok=ret)
+                return ret
+        return wrapper
+    return deco
+
+# ==================== adb 命令 ====================
+
+def command_class(command_list):
+    """命令类别: shell 命令细分到程序名 (shell pm / shell input ...)，其余取 adb 子命令"""
+    if not command_list:
+        return "adb"
+    verb = command_list[0]
+    if verb == "shell" and len(command_list) > 1:
+        words = " ".join(command_list[1:]).split()
+        # 命令组 "{ cmd; }" / "( cmd )" 按组内第一条命令归类
+        while words and words[0] in ("{", "("):
+            words = words[1:]
+        if words:
+            # ShellScript 编译出的批量脚本以变量赋值开头
+            if "=" in words[0]: return "shell script"
+            return f"shell {os.path.basename(words[0])}"
+    return verb
+
+
+def _local_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+def transfer_bytes(command_list, stdout, stderr):
+    """
+    估算一条命令传输的字节数:
+    push / pull 优先取 adb 输出里的 "(N bytes in ...)"，否则按本地文件大小统计；
+    其余命令按输出长度统计。
+    """
+    verb = command_list[0] if command_list else ""
+    if verb in ("push", "pull") and len(command_list) >= 3:
+        m = _BYTES_RE.search(f"{stdout or ''}\n{stderr or ''}")
+        if m:
+            return int(m.group(1))
+        local = command_list[-2] if verb == "push" else command_list[-1]
+        return _local_size(local) if os.path.exists(local) else 0
+    return len((stdout or "").encode("utf-8")) + len((stderr or "").encode("utf-8"))
+
+
+def record_adb(sp, command_list, result, backend, stdin_bytes=None):
+    """run_adb 在拿到 (stdout, stderr, returncode) 后调用；stdin_bytes 为 exec-in 送入的字节数"""
+    if sp is _NULL_SPAN:
+        return
+    stdout, stderr, returncode = result
+    sp.set(backend=backend, exit_code=returncode,
+           bytes=transfer_bytes(command_list, stdout, stderr) + (stdin_bytes or 0))
+
+# ==================== 导出 ====================
+
+def _device_pids(items):
+    pids = {}
+    for sp in items:
+        if sp.device_id not in pids:
+            pids[sp.device_id] = len(pids) + 1
+    return pids
+
+
+def to_chrome_trace(items=None):
+    """
+    转为 Chrome trace-event 格式。每台设备一个 pid；
+    单台设备内的步骤是串行的 (线程池或 asyncio 均如此)，放在同一条 tid 上即可正确嵌套。
+    """
+    items = sorted(spans() if items is None else items, key=lambda s: (s.start, -s.duration))
+    pids = _device_pids(items)
+    events = []
+    for device_id, pid in pids.items():
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 1,
+                       "args": {"name": str(device_id)}})
+    for sp in items:
+        args = dict(sp.args)
+        args["device_id"] = sp.device_id
+        events.append({
+            "name": sp.name,
+            "cat": sp.cat,
+            "ph": "X",
+            "ts": round((sp.start - _epoch) * 1e6, 3),
+            "dur": round(sp.duration * 1e6, 3),
+            "pid": pids[sp.device_id],
+            "tid": 1,
+            "args": args,
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def export_chrome_trace(path, items=None):
+    d = os.path.dirname(path)
+    if d: os.makedirs(d, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(to_chrome_trace(items), f, ensure_ascii=False)
+    return path
+
+
+def summarize(items=None):
+    """按 (类别, 名称) 汇总: 次数、总耗时、平均、最大、字节数、失败次数、涉及设备数"""
+    rows = {}
+    for sp in spans() if items is None else items:
+        r = rows.setdefault((sp.cat, sp.name), {
+            "count": 0, "total": 0.0, "max": 0.0, "bytes": 0, "failed": 0, "devices": set(),
+        })
+        d = sp.duration
+        r["count"] += 1
+        r["total"] += d
+        r["max"] = max(r["max"], d)
+        r["bytes"] += sp.args.get("bytes") or 0
+        rc = sp.args.get("exit_code")
+        if ("error" in sp.args or sp.args.get("ok") is False or sp.args.get("failed")
+                or (rc is not None and rc != 0)):
+            r["failed"] += 1
+        r["devices"].add(sp.device_id)
+    return rows
+
+
+_CAT_ORDER = {"pipeline": 0, "stage": 1, "wizard": 2, "injector": 3, "wait": 4, "script": 5, "adb": 6}
+
+
+def summary_table(items=None):
+    # 表头用英文: 中文在等宽终端里占两格，会让列错位
+    rows = summarize(items)
+    header = f"{'cat':<10}{'name':<36}{'count':>7}{'total(s)':>10}{'mean(s)':>10}{'max(s)':>10}{'bytes':>12}{'failed':>8}{'devices':>8}"
+    lines = [header, "-" * len(header)]
+    order = sorted(rows.items(), key=lambda kv: (_CAT_ORDER.get(kv[0][0], 9), -kv[1]["total"]))
+    for (cat, name), r in order:
+        lines.append(
+            f"{cat:<10}{name[:35]:<36}{r['count']:>7}{r['total']:>10.2f}"
+            f"{r['total'] / r['count']:>10.3f}{r['max']:>10.2f}{r['bytes']:>12}"
+            f"{r['failed']:>8}{len(r['devices']):>8}"
+        )
+    return "\n".join(lines)
@@ -1,11 +1,27 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import subprocess
 import logging
 import os
 import sys
 import time
 import json
-from config import ADB_PATH, LOG_ROOT_DIR
+import random
+import re
+from config import ADB_PATH, LOG_ROOT_DIR, ADB_SHELL_SESSION, ADB_BACKEND
+from config import LOG_FILE_LEVEL, LOG_COMPRESS, LOG_PAYLOAD_SAMPLE, LOG_PAYLOAD_MAX
+from adb_session import get_shell_session, close_shell_session, ShellSessionError
+import adb_client
+import adb_policy
+import log_backend
+import tracing
+
+# 每条命令结束后依次调用的 hook(device_id, command_list)，由需要感知命令的模块注册 (如 device_facts 的缓存失效)
+_command_hooks = []
+
+def add_command_hook(hook):
+    if hook not in _command_hooks:
+        _command_hooks.append(hook)
 
 def load_json_data(filename):
     """从 data/ 目录加载 JSON 配置文件"""
@@ -33,21 +49,22 @@ def load_json_data(filename):
 def setup_logger(device_id, app_context="main"):
     """
     为设备和特定 APP 上下文创建独立的 Logger
-    日志路径: logs/{device_id}/{app_context}.log
+    日志路径: logs/{device_id}/{app_context}.log (LOG_COMPRESS 时为 .log.gz)
+    记录只在调用线程入队，文件 / 终端写入由 log_backend 的写线程完成。
     """
     logger_name = f"{device_id}_{app_context}"
     logger = logging.getLogger(logger_name)
-    logger.setLevel(logging.DEBUG)
-    
-    if logger.hasHandlers(): logger.handlers.clear()
+    file_level = logging.getLevelName(LOG_FILE_LEVEL)
+    # logger 级别取两个输出中较低者，低于该级别的调用直接返回，不做格式化
+    logger.setLevel(min(file_level, logging.INFO))
 
     device_log_dir = os.path.join(LOG_ROOT_DIR, device_id)
     os.makedirs(device_log_dir, exist_ok=True)
 
     log_file = os.path.join(device_log_dir, f"{app_context}.log")
     
-    file_handler = logging.FileHandler(log_file, mode='w', encoding='utf-8')
-    file_handler.setLevel(logging.DEBUG)
+    file_handler = log_backend.open_log_stream(log_file, compress=LOG_COMPRESS)
+    file_handler.setLevel(file_level)
     # 增加 %(funcName)s 和 %(lineno)d 方便定位代码位置
     file_formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d - %(message)s')
     file_handler.setFormatter(file_formatter)
@@ -57,43 +74,156 @@ def setup_logger(device_id, app_context="main"):
     console_formatter = logging.Formatter(f'[{device_id}][{app_context}] %(message)s')
     console_handler.setFormatter(console_formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    return log_backend.attach(logger, device_id, [file_handler, console_handler])
+
+def _run_in_session(device_id, command_list, timeout):
+    """
+    通过常驻会话执行 shell 命令，返回 (stdout, stderr, returncode)。
+    会话不可用且命令尚未发出时返回 None，由调用方回退到 subprocess。
+    """
+    # 与 adb 行为一致: shell 之后的参数以空格拼接成一条命令
+    cmd = " ".join(command_list[1:])
+    try:
+        return get_shell_session(device_id).run(cmd, timeout=timeout)
+    except ShellSessionError as e:
+        close_shell_session(device_id)
+        if e.sent:
+            raise
+        return None
+    except OSError:
+        close_shell_session(device_id)
+        return None
+
+def list_devices():
+    """返回在线 (state == device) 的设备序列号列表"""
+    if ADB_BACKEND == "socket":
+        return [serial for serial, state in adb_client.default_client().devices() if state == "device"]
+    res = subprocess.run([ADB_PATH, "devices"], capture_output=True, text=True)
+    devices = []
+    if res.stdout:
+        for line in res.stdout.splitlines()[1:]:
+            match = re.match(r"(\S+)\s+device$", line.strip())
+            if match: devices.append(match.group(1))
+    return devices
+
+def _sample_payload():
+    return LOG_PAYLOAD_SAMPLE >= 1.0 or random.random() < LOG_PAYLOAD_SAMPLE
+
+def _finish_result(device_id, command_list, full_cmd, result, duration, check, logger):
+    """run_adb / run_adb_async 共用的结果处理: 规整输出、记录日志、check 时抛错"""
+    raw_out, raw_err, returncode = result
+    stdout = raw_out.strip() if raw_out else ""
+    stderr = raw_err.strip() if raw_err else ""
+
+    # adb root / unroot / 恢复模拟器快照会重启 adbd，旧会话随之失效
+    if command_list and (command_list[0] in ("root", "unroot", "reboot")
+                         or command_list[:4] == ["emu", "avd", "snapshot", "load"]):
+        close_shell_session(device_id)
+    for hook in _command_hooks:
+        hook(device_id, command_list)
     
-    return logger
+    # 记录输出结果，方便调试 (限制长度防止日志爆炸)
+    # 只在 DEBUG 开启时按采样比例记录，失败的命令始终记录
+    if logger:
+        if logger.isEnabledFor(logging.DEBUG) and (returncode != 0 or _sample_payload()):
+            if stdout: 
+                log_content = stdout[:LOG_PAYLOAD_MAX] + "..." if len(stdout) > LOG_PAYLOAD_MAX else stdout
+                logger.debug("STDOUT (%.2fs): %s", duration, log_content)
+            if stderr:
+                logger.debug("STDERR (%.2fs): %s", duration, stderr)
+        if returncode != 0 and not check:
+            logger.warning(f"CMD FAIL (Ret: {returncode}): {stderr}")
+
+    if returncode != 0 and check:
+        # 会话模式下需要自行抛出，与 subprocess.run(check=True) 保持一致
+        raise subprocess.CalledProcessError(returncode, full_cmd, output=stdout, stderr=stderr)
+        
+    return stdout, stderr
+
+def _log_attempt_error(logger, msg, attempt, attempts, delay):
+    if logger:
+        logger.warning(f"ADB 调用失败，{delay:.2f}s 后重试 ({attempt + 1}/{attempts - 1}): {msg}")
+
+def _fast_backend(command_list, stdin_path=None):
+    """不起 adb 进程的后端: "socket" / "session" (常驻会话无法转发二进制输入，exec-in 不走会话)；都不适用时为 None"""
+    if ADB_BACKEND == "socket":
+        return "socket"
+    if stdin_path is None and ADB_SHELL_SESSION and len(command_list) > 1 and command_list[0] == "shell":
+        return "session"
+    return None
 
-def run_adb(device_id, command_list, timeout=60, check=False, logger=None):
+def _exec_fast(backend, device_id, command_list, timeout, stdin_path=None):
+    """经 socket 协议或常驻会话执行一次 (阻塞)，返回 (stdout, stderr, returncode)；不支持该命令时返回 None"""
+    if backend == "session":
+        return _run_in_session(device_id, command_list, timeout)
+    if stdin_path is None:
+        return adb_client.run_command(device_id, command_list, timeout=timeout)
+    # exec-in: 本地文件作为远端命令的 stdin
+    with open(stdin_path, "rb") as f:
+        return adb_client.run_command(device_id, command_list, timeout=timeout, data=f)
+
+def _exec_once(device_id, command_list, full_cmd, timeout, stdin_path=None):
+    """执行一次命令，返回 ((stdout, stderr, returncode), 后端)"""
+    backend = _fast_backend(command_list, stdin_path)
+    if backend:
+        result = _exec_fast(backend, device_id, command_list, timeout, stdin_path)
+        if result is not None:
+            return result, backend
+    if stdin_path is not None:
+        with open(stdin_path, "rb") as f:
+            proc = subprocess.run(full_cmd, stdin=f, capture_output=True, text=True, timeout=timeout,
+                                  encoding='utf-8', errors='replace')
+        return (proc.stdout, proc.stderr, proc.returncode), "subprocess"
+    proc = subprocess.run(full_cmd, capture_output=True, text=True, timeout=timeout, encoding='utf-8')
+    return (proc.stdout, proc.stderr, proc.returncode), "subprocess"
+
+def run_adb(device_id, command_list, timeout=None, check=False, logger=None, retries=None, stdin_path=None):
     """
     执行 ADB 命令并提供详细的日志记录
+    ADB_BACKEND="socket" 时优先直接走 adb server 协议；
+    否则 `shell <cmd>` 形式的命令 (ADB_SHELL_SESSION 开启时) 走常驻会话，其余命令仍单独起进程。
+    timeout 为 None 时按命令类别的自适应策略分配 (见 adb_policy)；
+    device offline 等传输层错误最多重试 retries 次 (默认 ADB_RETRIES)。
+    stdin_path: 作为远端命令 stdin 的本地文件 (配合 `exec-in` 使用)。
     """
     full_cmd = [ADB_PATH, "-s", device_id] + command_list
-    cmd_str = ' '.join(full_cmd)
+    cls = tracing.command_class(command_list)
+    attempts = adb_policy.max_attempts(retries)
+    nbytes = os.path.getsize(stdin_path) if stdin_path else None
     
     try:
-        if logger: logger.debug(f"EXEC: {cmd_str}")
-        
-        start_time = time.time()
-        result = subprocess.run(full_cmd, capture_output=True, text=True, check=check, timeout=timeout, encoding='utf-8')
-        duration = time.time() - start_time
+        if logger and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("EXEC: %s", ' '.join(full_cmd))
         
-        stdout = result.stdout.strip() if result.stdout else ""
-        stderr = result.stderr.strip() if result.stderr else ""
-        
-        # 记录输出结果，方便调试 (限制长度防止日志爆炸)
-        if logger:
-            if stdout: 
-                log_content = stdout[:500] + "..." if len(stdout) > 500 else stdout
-                logger.debug(f"STDOUT ({duration:.2f}s): {log_content}")
-            if stderr:
-                logger.debug(f"STDERR ({duration:.2f}s): {stderr}")
-            if result.returncode != 0 and not check:
-                logger.warning(f"CMD FAIL (Ret: {result.returncode}): {stderr}")
-
-        if result.returncode != 0 and check:
-            # 如果 check=True，subprocess 已经抛出异常，这里通常走不到
-            pass
-            
-        return stdout, stderr
+        for attempt in range(attempts):
+            limit = timeout if timeout is not None else adb_policy.timeout_for(cls, command_list, nbytes)
+            last = attempt == attempts - 1
+            try:
+                with tracing.span(device_id, cls, cat="adb", attempt=attempt) as sp:
+                    start_time = time.time()
+                    result, backend = _exec_once(device_id, command_list, full_cmd, limit, stdin_path)
+                    duration = time.time() - start_time
+                    tracing.record_adb(sp, command_list, result, backend, nbytes)
+            except subprocess.TimeoutExpired:
+                if last or not adb_policy.retry_on_timeout(cls): raise
+                delay = adb_policy.backoff(attempt)
+                _log_attempt_error(logger, f"超时 ({limit:.1f}s)", attempt, attempts, delay)
+                time.sleep(delay)
+                continue
+            except (adb_client.AdbError, OSError) as e:
+                if last or not adb_policy.is_transient(str(e)): raise
+                delay = adb_policy.backoff(attempt)
+                _log_attempt_error(logger, e, attempt, attempts, delay)
+                time.sleep(delay)
+                continue
+
+            if result[2] != 0 and not last and adb_policy.is_transient(result[1]):
+                delay = adb_policy.backoff(attempt)
+                _log_attempt_error(logger, (result[1] or "").strip(), attempt, attempts, delay)
+                time.sleep(delay)
+                continue
+            adb_policy.observe(cls, duration)
+            return _finish_result(device_id, command_list, full_cmd, result, duration, check, logger)
         
     except subprocess.CalledProcessError as e:
         err_msg = e.stderr.strip() if e.stderr else str(e)
@@ -101,4 +231,89 @@ def run_adb(device_id, command_list, timeout=60, check=False, logger=None):
         raise e
     except Exception as e:
         if logger: logger.error(f"EXCEPTION: {e}")
-        return None, str(e)
\ No newline at end of file
+        return None, str(e)
+
+async def _exec_once_async(device_id, command_list, full_cmd, timeout, stdin_path=None):
+    """_exec_once 的 asyncio 版本: socket 协议与常驻会话是阻塞调用，放到线程池；adb 进程用 asyncio 子进程"""
+    backend = _fast_backend(command_list, stdin_path)
+    if backend:
+        result = await run_blocking(_exec_fast, backend, device_id, command_list, timeout, stdin_path)
+        if result is not None:
+            return result, backend
+    stdin = open(stdin_path, "rb") if stdin_path else asyncio.subprocess.DEVNULL
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *full_cmd,
+            stdin=stdin,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    finally:
+        # 子进程已继承文件描述符，本地句柄可以关闭
+        if stdin_path: stdin.close()
+    try:
+        out_b, err_b = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        # 超时即取消: 杀掉卡住的 adb 进程
+        proc.kill()
+        await proc.wait()
+        raise subprocess.TimeoutExpired(full_cmd, timeout)
+    return (out_b.decode('utf-8', 'replace'), err_b.decode('utf-8', 'replace'), proc.returncode), "subprocess"
+
+async def run_adb_async(device_id, command_list, timeout=None, check=False, logger=None, retries=None,
+                        stdin_path=None):
+    """
+    run_adb 的 asyncio 版本: 后端选择、参数、超时 / 重试策略与返回值与 run_adb 一致。
+    起 adb 进程时用 asyncio 子进程，等待期间不占用线程；socket 协议与常驻会话的调用是阻塞的，
+    在默认线程池中执行 (同时进行的调用数受线程池大小限制)。
+    """
+    full_cmd = [ADB_PATH, "-s", device_id] + command_list
+    cls = tracing.command_class(command_list)
+    attempts = adb_policy.max_attempts(retries)
+    nbytes = os.path.getsize(stdin_path) if stdin_path else None
+
+    try:
+        if logger and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("EXEC: %s", ' '.join(full_cmd))
+
+        for attempt in range(attempts):
+            limit = timeout if timeout is not None else adb_policy.timeout_for(cls, command_list, nbytes)
+            last = attempt == attempts - 1
+            try:
+                with tracing.span(device_id, cls, cat="adb", attempt=attempt) as sp:
+                    start_time = time.time()
+                    result, backend = await _exec_once_async(device_id, command_list, full_cmd, limit, stdin_path)
+                    duration = time.time() - start_time
+                    tracing.record_adb(sp, command_list, result, backend, nbytes)
+            except subprocess.TimeoutExpired:
+                if last or not adb_policy.retry_on_timeout(cls): raise
+                delay = adb_policy.backoff(attempt)
+                _log_attempt_error(logger, f"超时 ({limit:.1f}s)", attempt, attempts, delay)
+                await asyncio.sleep(delay)
+                continue
+            except (adb_client.AdbError, OSError) as e:
+                if last or not adb_policy.is_transient(str(e)): raise
+                delay = adb_policy.backoff(attempt)
+                _log_attempt_error(logger, e, attempt, attempts, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            if result[2] != 0 and not last and adb_policy.is_transient(result[1]):
+                delay = adb_policy.backoff(attempt)
+                _log_attempt_error(logger, (result[1] or "").strip(), attempt, attempts, delay)
+                await asyncio.sleep(delay)
+                continue
+            adb_policy.observe(cls, duration)
+            return _finish_result(device_id, command_list, full_cmd, result, duration, check, logger)
+
+    except subprocess.CalledProcessError as e:
+        err_msg = e.stderr.strip() if e.stderr else str(e)
+        if logger: logger.error(f"ADB CHECK ERROR: {err_msg}")
+        raise e
+    except Exception as e:
+        if logger: logger.error(f"EXCEPTION: {e}")
+        return None, str(e)
+
+async def run_blocking(func, *args):
+    """在默认线程池中执行主机端的阻塞操作 (本地 SQLite、打包、复制大文件)，不阻塞驱动其他设备的事件循环"""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)